@@ -9,8 +9,11 @@ https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+from planetary_systems.streaming import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'nasa_datasetcsv_django_mysql.settings')
+# The async views of the catalog, see planetary_systems/async_views.py, and
+# the handler that sends their streamed bodies (planetary_systems/streaming.py)
+os.environ.setdefault('PLANETARY_SYSTEMS_ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
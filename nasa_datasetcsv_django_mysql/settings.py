@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -47,6 +48,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so it measures the whole request (see planetary_systems/metrics.py)
+    'planetary_systems.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -56,6 +59,15 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Share of the requests measured by the metrics middleware, from 0 to 1
+METRICS_SAMPLE_RATE = 1
+
+# Addresses allowed to read /metrics (the SQL counts and times of every URL),
+# e.g. ['127.0.0.1'] for a Prometheus on the same host. Behind a proxy every
+# request comes from the address of the proxy: leave it empty then, or keep
+# /metrics out of the proxy
+METRICS_ALLOWED_IPS = []
+
 ROOT_URLCONF = 'nasa_datasetcsv_django_mysql.urls'
 
 TEMPLATES = [
@@ -90,11 +102,42 @@ DATABASES = {
         'PORT': '3306',
         'OPTIONS': {
             'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
+            # No local_infile here: the loader engine=infile opens its own
+            # connection with it (see planetary_systems/loader/infile.py)
         },
     }
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/3.1/topics/cache/
+# File based so the loader script can invalidate the pages cached by the
+# server processes (planetary_systems/caching.py), any shared backend works
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+    }
+}
+
+# Cache alias and seconds a rendered catalog page is kept
+CATALOG_CACHE = 'default'
+CATALOG_CACHE_TIMEOUT = 24 * 60 * 60
+
+
+# Async views
+# https://docs.djangoproject.com/en/3.1/topics/async/
+# The catalog page and the API are served by planetary_systems/async_views.py,
+# asgi.py turns them on. Their queries run in ASYNC_DB_THREADS threads, each
+# one with its own database connection, kept while it is used at least every
+# ASYNC_DB_CONN_MAX_AGE seconds (see planetary_systems/asyncdb.py)
+
+ASYNC_VIEWS = os.environ.get('PLANETARY_SYSTEMS_ASYNC_VIEWS', '0') == '1'
+ASYNC_DB_THREADS = 10
+ASYNC_DB_CONN_MAX_AGE = 60
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
 
@@ -133,7 +176,28 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 
+# Columnar snapshot of the numeric columns, rebuilt after every load
+SNAPSHOT_DIR = BASE_DIR / 'snapshot'
+
+# Synthetic archive files and results of the loader benchmarks (scripts/benchmark_load.py)
+BENCHMARK_DIR = BASE_DIR / 'benchmark'
+
 import sys
+
+# The tests run on SQLite, no MySQL server is needed
+if (len(sys.argv) >= 2 and sys.argv[1] == 'test'):
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+        }
+    }
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 if (len(sys.argv) >= 2 and sys.argv[1] == 'runserver'):
     print('Running locally')
     LOGGING = {
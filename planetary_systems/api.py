@@ -0,0 +1,262 @@
+"""
+Read-only JSON API of the planetary systems, stars and planets
+
+    /api/planetary_systems/  /api/planetary_systems/<id>/
+    /api/stars/              /api/stars/<id>/
+    /api/planets/            /api/planets/<id>/
+    /api/planetary_systems/cone/?ra=285&dec=40&radius=1
+    /api/stats/
+
+?fields=id,name selects the fields (all of them by default), the lists are
+paginated with the ?after= cursor of their `next` link and ?page_size=, and
+filtered with the filters of filters.py:
+
+    /api/planets/?planet_orbital_period__lt=10&star_effective_temperature__range=5000,6000
+
+The data only changes with a load, so the ETag is the dataset version and
+the URL: a matching If-None-Match is answered 304 without any query.
+The responses are gzipped for the clients that accept it.
+"""
+
+import hashlib
+import json
+import math
+
+from django.db.models import Q
+from django.http import HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.decorators import method_decorator
+from django.views.decorators.gzip import gzip_page
+from django.views.generic import View
+
+from .caching import page_key
+from .exports import json_default
+from .filters import FilterError, filter_conditions
+from .models import (
+    PlanetarySystem,
+    Star,
+    Planet,
+    PlanetsPerMethodYear,
+    PlanetarySystemsPerFacility,
+    PlanetarySystemsPerPlanetCount
+)
+from .pagination import KeysetPaginator
+from .sky import angular_distance, cone_cells
+
+
+def model_fields(model, lookups=None):
+    """API field name -> ORM path: the columns of the model and the names of its lookups"""
+    fields = {field.attname: field.attname for field in model._meta.concrete_fields}
+    fields.update({'%s_name' % lookup: '%s__name' % lookup for lookup in lookups or ()})
+    return fields
+
+
+class BadRequest(Exception):
+    pass
+
+
+@method_decorator(gzip_page, name='dispatch')
+class ApiView(View):
+    model = None
+    lookups = ()
+
+    def get(self, request, *args, **kwargs):
+        etag = self.get_etag(request)
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+
+        try:
+            data = self.get_data(request, *args, **kwargs)
+        except BadRequest as error:
+            return self.error_response(error)
+        return self.json_response(data, etag)
+
+    def get_etag(self, request):
+        return '"%s"' % hashlib.md5(page_key(request).encode()).hexdigest()
+
+    def error_response(self, error):
+        return JsonResponse({'error': str(error)}, status=400)
+
+    def json_response(self, data, etag):
+        response = HttpResponse(
+            json.dumps(data, default=json_default, ensure_ascii=False),
+            content_type='application/json'
+        )
+        response['ETag'] = etag
+        return response
+
+    def get_fields(self, request):
+        """The selected field name -> ORM path, in the order asked for"""
+        fields = model_fields(self.model, self.lookups)
+        selected = request.GET.get('fields')
+        if not selected:
+            return fields
+        names = selected.split(',')
+        unknown = [name for name in names if name not in fields]
+        if unknown:
+            raise BadRequest('Unknown fields: %s' % ', '.join(unknown))
+        return {name: fields[name] for name in names}
+
+    def get_conditions(self, request, exclude=()):
+        """The conditions of the filters of the query string, see filters.py"""
+        parameters = request.GET.copy()
+        for name in exclude:
+            parameters.pop(name, None)
+        try:
+            return filter_conditions(self.model, parameters)
+        except FilterError as error:
+            raise BadRequest(str(error))
+
+    def serialize(self, fields, row):
+        return {name: row[path] for name, path in fields.items()}
+
+
+class ApiListView(ApiView):
+    # Rows per page, ?page_size= changes it up to max_paginate_by
+    paginate_by = 100
+    max_paginate_by = 1000
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.GET.get('page_size', self.paginate_by))
+        except ValueError:
+            raise BadRequest('Invalid page_size')
+        return max(1, min(page_size, self.max_paginate_by))
+
+    def get_queryset(self, request):
+        """The rows selected by the filters of the query string, see filters.py"""
+        return self.model.objects.filter(*self.get_conditions(request))
+
+    def get_data(self, request):
+        fields = self.get_fields(request)
+        # The id is always read, the pages seek on it
+        queryset = self.get_queryset(request).values(*dict.fromkeys(['id', *fields.values()]))
+        paginator = KeysetPaginator(queryset, ('id',), self.get_page_size(request))
+        page = paginator.page(after=request.GET.get('after'), before=request.GET.get('before'))
+        return self.page_data(request, fields, page)
+
+    def page_data(self, request, fields, page):
+        return {
+            'results': [self.serialize(fields, row) for row in page],
+            'next': self.page_url(request, 'after', page.next_cursor),
+            'previous': self.page_url(request, 'before', page.previous_cursor),
+        }
+
+    def page_url(self, request, name, cursor):
+        if cursor is None:
+            return None
+        parameters = request.GET.copy()
+        parameters.pop('after', None)
+        parameters.pop('before', None)
+        parameters[name] = cursor
+        return request.build_absolute_uri('%s?%s' % (request.path, parameters.urlencode()))
+
+
+class ApiDetailView(ApiView):
+
+    def get_data(self, request, pk):
+        fields = self.get_fields(request)
+        row = get_object_or_404(self.model.objects.values(*dict.fromkeys(fields.values())), pk=pk)
+        return self.serialize(fields, row)
+
+
+class ConeSearchView(ApiView):
+    """
+    Planetary systems within ?radius= degrees of the ?ra= and ?dec= position
+    (degrees), nearest first with their angular_distance. The sky index
+    selects the candidates, see sky.py
+    """
+    model = PlanetarySystem
+
+    # Degrees
+    max_radius = 10
+
+    # Systems returned, ?limit= changes it up to max_limit
+    limit = 100
+    max_limit = 1000
+
+    def get_position(self, request):
+        try:
+            ra = float(request.GET['ra'])
+            dec = float(request.GET['dec'])
+            radius = float(request.GET['radius'])
+            limit = int(request.GET.get('limit', self.limit))
+        except (KeyError, ValueError):
+            raise BadRequest('ra, dec and radius are numbers of degrees')
+        # float() reads nan and inf too
+        if not all(math.isfinite(value) for value in (ra, dec, radius)):
+            raise BadRequest('ra, dec and radius are numbers of degrees')
+        if not (-90 <= dec <= 90 and 0 < radius <= self.max_radius):
+            raise BadRequest('dec is between -90 and 90, radius between 0 and %s' % self.max_radius)
+        return ra % 360, dec, radius, max(1, min(limit, self.max_limit))
+
+    def get_data(self, request):
+        ra, dec, radius, limit = self.get_position(request)
+        fields = self.get_fields(request)
+        cells = Q()
+        for first, last in cone_cells(ra, dec, radius):
+            cells |= Q(sky_cell__range=(first, last))
+
+        conditions = self.get_conditions(request, exclude=('ra', 'dec', 'radius', 'limit'))
+        candidates = PlanetarySystem.objects.filter(cells, *conditions).values(
+            *dict.fromkeys(['right_ascension_decimal', 'declination_decimal', *fields.values()])
+        )
+
+        results = []
+        for row in candidates:
+            distance = angular_distance(ra, dec, row['right_ascension_decimal'], row['declination_decimal'])
+            if distance <= radius:
+                results.append((distance, row))
+        results.sort(key=lambda result: result[0])
+
+        return {'results': [
+            dict(self.serialize(fields, row), angular_distance=distance)
+            for distance, row in results[:limit]
+        ]}
+
+
+class StatsView(ApiView):
+    """The summary tables of the dashboards, computed by the loader (see summaries.py)"""
+
+    def get_data(self, request):
+        return {
+            'planets_per_method_year': list(PlanetsPerMethodYear.objects.order_by(
+                'discovery_year', 'discovery_method'
+            ).values('discovery_method', 'discovery_year', 'planets')),
+            'planetary_systems_per_facility': list(PlanetarySystemsPerFacility.objects.order_by(
+                'discovery_facility'
+            ).values('discovery_facility', 'planetary_systems')),
+            'planetary_systems_per_planet_count': list(PlanetarySystemsPerPlanetCount.objects.order_by(
+                'number_of_planets'
+            ).values('number_of_planets', 'planetary_systems')),
+        }
+
+
+class PlanetarySystemApiListView(ApiListView):
+    model = PlanetarySystem
+
+
+class PlanetarySystemApiDetailView(ApiDetailView):
+    model = PlanetarySystem
+
+
+class StarApiListView(ApiListView):
+    model = Star
+    lookups = ('spectral_type',)
+
+
+class StarApiDetailView(ApiDetailView):
+    model = Star
+    lookups = ('spectral_type',)
+
+
+class PlanetApiListView(ApiListView):
+    model = Planet
+    lookups = ('discovery_method', 'discovery_facility', 'solution_type')
+
+
+class PlanetApiDetailView(ApiDetailView):
+    model = Planet
+    lookups = ('discovery_method', 'discovery_facility', 'solution_type')
@@ -0,0 +1,244 @@
+"""
+Async versions of the catalog pages, of the exports and of the list and
+detail views of the API, served instead of the sync ones under ASGI
+(settings.ASYNC_VIEWS, see asgi.py)
+
+A request awaits its queries instead of holding a thread while they run:
+they run in the thread pool of asyncdb.py, and the ones that do not depend
+on each other at the same time with asyncio.gather. The catalog page reads
+
+    the planetary systems of the page  |  the 4 lookup tables
+    their stars                        |  their planets
+
+in two rounds instead of three queries one after the other. Every query
+reads one table, the lookup names are set on the rows in python (see
+queries.attach_tree), so a slow query of one table does not hold the others.
+The pages, JSON documents and cache keys are the ones of the sync views.
+
+The streamed pages and exports read their body in the pool too, a chunk of
+rows at a time, and are sent by the ASGI handler of streaming.py.
+
+Source: https://docs.djangoproject.com/en/3.1/topics/async/#async-views
+Source: https://docs.python.org/3/library/asyncio-task.html#running-tasks-concurrently
+"""
+
+import asyncio
+
+from django.http import HttpResponse, HttpResponseBadRequest
+from django.shortcuts import get_object_or_404
+from django.template.response import TemplateResponse
+from django.utils.cache import get_conditional_response
+from django.utils.decorators import classonlymethod
+from django.views.decorators.gzip import gzip_page
+from django.views.generic import View
+
+from . import api, catalog, views
+from .asyncdb import iterate_in_thread, run_in_thread
+from .caching import cache_page, catalog_cache, page_key
+from .filters import FilterError, filter_conditions
+from .models import PlanetarySystem
+from .pagination import KeysetPaginator
+from .streaming import AsyncStreamingHttpResponse
+from .queries import (
+    STAR_LOOKUPS,
+    PLANET_LOOKUPS,
+    attach_tree,
+    lookup_names,
+    lookup_table,
+    system_planets,
+    system_stars
+)
+
+LOOKUP_MODELS = (*STAR_LOOKUPS.values(), *PLANET_LOOKUPS.values())
+
+
+class AsyncView(View):
+    """
+    Base of the async views. Django 3.1 awaits the views that are coroutine
+    functions, as_view() marks the view as one like Django 4.1 does for the
+    classes with async handlers.
+    """
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        view._is_coroutine = asyncio.coroutines._is_coroutine
+        return view
+
+    async def dispatch(self, request, *args, **kwargs):
+        # View.dispatch, not the gzip_page one of ApiView: the response is
+        # compressed once awaited
+        response = View.dispatch(self, request, *args, **kwargs)
+        if asyncio.iscoroutine(response):
+            response = await response
+        return response
+
+
+def cached_page(request):
+    """The cache key of the page and its cached content, None when it is not cached"""
+    key = page_key(request)
+    return key, catalog_cache().get(key)
+
+
+def compress(request, response):
+    """The gzip_page decorator of the sync API views, on a response already built"""
+    return gzip_page(lambda request: response)(request)
+
+
+class AsyncPlanetarySystemsListView(AsyncView, views.PlanetarySystemsListView):
+    """The catalog page of PlanetarySystemsListView, same template, page sizes and cached pages"""
+
+    async def get(self, request, *args, **kwargs):
+        key, content = await run_in_thread(cached_page, request)
+        if content is not None:
+            return HttpResponse(content)
+
+        try:
+            queryset = PlanetarySystem.objects.filter(*filter_conditions(PlanetarySystem, request.GET))
+        except FilterError as error:
+            return HttpResponseBadRequest(str(error))
+
+        paginator = KeysetPaginator(queryset, self.keyset, self.get_paginate_by(queryset))
+        page, *tables = await asyncio.gather(
+            run_in_thread(paginator.page, after=request.GET.get('after'), before=request.GET.get('before')),
+            *(run_in_thread(lookup_table, model) for model in LOOKUP_MODELS)
+        )
+
+        systems = page.object_list
+        stars, planets = [], []
+        if systems:
+            system_ids = [system.id for system in systems]
+            stars, planets = await asyncio.gather(
+                run_in_thread(system_stars, system_ids),
+                run_in_thread(system_planets, system_ids)
+            )
+        attach_tree(systems, stars, planets, dict(zip(LOOKUP_MODELS, tables)))
+
+        response = TemplateResponse(request, self.template_name, {
+            'paginator': paginator,
+            'page_obj': page,
+            'is_paginated': page.has_other_pages(),
+            'object_list': systems,
+            'filter_query': views.filter_query(request),
+            'view': self,
+        })
+        # Rendered by Django after the middleware, in the thread of the sync
+        # code (the context processors may read the session and the user),
+        # and stored then like the pages of the sync view
+        if response.status_code == 200:
+            response.add_post_render_callback(lambda response: cache_page(key, response.content))
+        return response
+
+
+class AsyncStreamingView(AsyncView):
+    """
+    A streaming view of views.py, its body read batch_size parts at a time in
+    the pool. get() of the sync view only checks the request, the queries
+    run once the body is read.
+    """
+    batch_size = 1
+
+    async def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+    def streaming_response(self, content, **kwargs):
+        return AsyncStreamingHttpResponse(self.read_batches(content), **kwargs)
+
+    async def read_batches(self, content):
+        async for parts in iterate_in_thread(content, self.batch_size):
+            yield ''.join(parts)
+
+
+class AsyncPlanetarySystemsStreamView(AsyncStreamingView, views.PlanetarySystemsStreamView):
+    """The whole catalog page, a chunk of chunk_size planetary systems rendered at a time"""
+
+
+class AsyncCatalogExportView(AsyncStreamingView, views.CatalogExportView):
+    """The catalog exports, one chunk of rows (and lines) at a time"""
+    batch_size = catalog.CHUNK_SIZE
+
+
+class AsyncApiView(AsyncView):
+    """
+    get() of ApiView awaiting get_data(). The lookup names are read from
+    their tables at the same time as the rows, instead of joined to them.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        etag = await run_in_thread(self.get_etag, request)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            try:
+                response = self.json_response(await self.get_data(request, *args, **kwargs), etag)
+            except api.BadRequest as error:
+                response = self.error_response(error)
+        return compress(request, response)
+
+    def split_fields(self, fields):
+        """The columns to read for the selected fields, and the lookups of the selected names"""
+        lookups = [lookup for lookup in self.lookups if '%s__name' % lookup in fields.values()]
+        columns = [path for path in fields.values() if '__' not in path]
+        return columns + ['%s_id' % lookup for lookup in lookups], lookups
+
+    async def with_names(self, lookups, function, *args, **kwargs):
+        """Await the rows read by function and the names of the lookups, all at the same time"""
+        rows, *names = await asyncio.gather(
+            run_in_thread(function, *args, **kwargs),
+            *(run_in_thread(lookup_names, self.model._meta.get_field(lookup).related_model) for lookup in lookups)
+        )
+        return rows, names
+
+    def set_names(self, row, lookups, names):
+        for lookup, table in zip(lookups, names):
+            row['%s__name' % lookup] = table.get(row['%s_id' % lookup])
+
+
+class AsyncApiListView(AsyncApiView, api.ApiListView):
+
+    async def get_data(self, request):
+        fields = self.get_fields(request)
+        columns, lookups = self.split_fields(fields)
+        # The id is always read, the pages seek on it
+        queryset = self.get_queryset(request).values(*dict.fromkeys(['id', *columns]))
+        paginator = KeysetPaginator(queryset, ('id',), self.get_page_size(request))
+        page, names = await self.with_names(
+            lookups, paginator.page, after=request.GET.get('after'), before=request.GET.get('before')
+        )
+        for row in page:
+            self.set_names(row, lookups, names)
+        return self.page_data(request, fields, page)
+
+
+class AsyncApiDetailView(AsyncApiView, api.ApiDetailView):
+
+    async def get_data(self, request, pk):
+        fields = self.get_fields(request)
+        columns, lookups = self.split_fields(fields)
+        queryset = self.model.objects.values(*dict.fromkeys(columns))
+        row, names = await self.with_names(lookups, get_object_or_404, queryset, pk=pk)
+        self.set_names(row, lookups, names)
+        return self.serialize(fields, row)
+
+
+class AsyncPlanetarySystemApiListView(AsyncApiListView, api.PlanetarySystemApiListView):
+    pass
+
+
+class AsyncPlanetarySystemApiDetailView(AsyncApiDetailView, api.PlanetarySystemApiDetailView):
+    pass
+
+
+class AsyncStarApiListView(AsyncApiListView, api.StarApiListView):
+    pass
+
+
+class AsyncStarApiDetailView(AsyncApiDetailView, api.StarApiDetailView):
+    pass
+
+
+class AsyncPlanetApiListView(AsyncApiListView, api.PlanetApiListView):
+    pass
+
+
+class AsyncPlanetApiDetailView(AsyncApiDetailView, api.PlanetApiDetailView):
+    pass
@@ -0,0 +1,86 @@
+"""
+Database access of the async views (see async_views.py)
+
+The ORM of Django 3.1 is synchronous: a query on the event loop raises
+SynchronousOnlyOperation, and sync_to_async runs it by default in the one
+thread shared by the sync code of every request. The async views await their
+queries in a pool of settings.ASYNC_DB_THREADS threads instead, so
+independent queries run at the same time and a slow one only holds its
+thread, never the event loop.
+
+Every thread keeps its own database connection from one call to the next,
+so the pool size is also the most connections the async views open. With
+CONN_MAX_AGE = 0 a connection would be opened again for every query, several
+times per page: in the pool it lasts until it is idle for
+settings.ASYNC_DB_CONN_MAX_AGE seconds (well below the wait_timeout of
+MySQL) or until a query fails. A greater CONN_MAX_AGE applies as it is.
+
+The queries awaited together run on different connections, each one in its
+own snapshot: a load that commits between them can show in some and not in
+the others. The pages are not cached then (see caching.cache_page).
+
+Source: https://docs.djangoproject.com/en/3.1/topics/async/
+Source: https://docs.python.org/3/library/asyncio-eventloop.html#asyncio.loop.run_in_executor
+"""
+
+import asyncio
+import contextvars
+import functools
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+EXECUTOR = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'ASYNC_DB_THREADS', 10),
+    thread_name_prefix='planetary_systems_db'
+)
+
+
+def keep_connections():
+    """Push back the closing of the connections of the thread, they are reused by the next call"""
+    max_age = getattr(settings, 'ASYNC_DB_CONN_MAX_AGE', 60)
+    for connection in connections.all():
+        if connection.connection is not None and connection.settings_dict['CONN_MAX_AGE'] == 0:
+            connection.close_at = time.monotonic() + max_age
+
+
+def call_in_thread(function, *args, **kwargs):
+    # Closes the connections that failed or stayed idle too long
+    close_old_connections()
+    try:
+        return function(*args, **kwargs)
+    finally:
+        keep_connections()
+
+
+async def run_in_thread(function, *args, **kwargs):
+    """
+    Await a blocking call, a query or a cache read, run in the pool
+
+        page, names = await asyncio.gather(
+            run_in_thread(paginator.page),
+            run_in_thread(lookup_names, DiscoveryMethod)
+        )
+    """
+    # The context of the request goes with the call, its queries count in
+    # the metrics of the request (see metrics.py)
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, call_in_thread, function, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(EXECUTOR, call)
+
+
+async def iterate_in_thread(iterable, batch_size=1):
+    """
+    Async iteration of a blocking iterable, e.g. the body of a streaming
+    response that queries while it is read: batch_size items are read at a
+    time in the pool, and yielded as one list
+    """
+    iterator = iter(iterable)
+    while True:
+        batch = await run_in_thread(list, itertools.islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
@@ -0,0 +1,73 @@
+"""
+Cache of the rendered catalog pages
+
+The data only changes when the loader runs, so a page is cached until the
+next load: every key holds the dataset version, which the loader replaces
+when it finishes, and the entries of the previous version are never read
+again (they expire with CATALOG_CACHE_TIMEOUT).
+
+The cache is the CATALOG_CACHE alias of settings.CACHES, the file based
+default is shared by the server processes and the loader script.
+
+Source: https://docs.djangoproject.com/en/3.1/topics/cache/
+"""
+
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+VERSION_KEY = 'planetary_systems:dataset_version'
+
+
+def catalog_cache():
+    return caches[getattr(settings, 'CATALOG_CACHE', 'default')]
+
+
+def cache_timeout():
+    return getattr(settings, 'CATALOG_CACHE_TIMEOUT', 24 * 60 * 60)
+
+
+def new_version():
+    return '%x' % time.time_ns()
+
+
+def dataset_version():
+    """The current version, a new one if the cache lost it"""
+    cache = catalog_cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, new_version(), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_dataset_version():
+    """Called by the loader once the tables hold the new data"""
+    version = new_version()
+    catalog_cache().set(VERSION_KEY, version, None)
+    return version
+
+
+def version_prefix(version):
+    return 'planetary_systems:page:%s:' % version
+
+
+def page_key(request):
+    """The dataset version, the path and every query parameter (page, filters...)"""
+    parameters = sorted((name, sorted(values)) for name, values in request.GET.lists())
+    digest = hashlib.md5(repr(parameters).encode()).hexdigest()
+    return version_prefix(dataset_version()) + '%s:%s' % (request.path, digest)
+
+
+def cache_page(key, content):
+    """
+    Store a rendered page, unless a load finished since its key was made:
+    every query of the page reads its own snapshot, some may have read the
+    rows of the new version. A load that commits between the queries but
+    bumps the version after this check can still leave a mixed page, until
+    the bump a moment later.
+    """
+    if key.startswith(version_prefix(dataset_version())):
+        catalog_cache().set(key, content, cache_timeout())
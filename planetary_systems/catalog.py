@@ -0,0 +1,99 @@
+"""
+Denormalized catalog: one row per planet, with the columns of its planetary
+system, its lookup names and, when star columns are asked for, one row per
+star of the system (the rows of the planetary systems page).
+
+Column names are the aliases of the original page: planetary_system_<field>,
+star_<field> and planet_<field>.
+"""
+
+from django.db.models import Q
+
+from .models import (
+    PlanetarySystem,
+    Star,
+    Planet
+)
+from .pagination import seek
+
+# Audit columns of every table, not part of the catalog
+AUDIT_FIELDS = ('row_created_on', 'row_updated_on')
+
+# Rows read from the database at a time
+CHUNK_SIZE = 2000
+
+
+def model_columns(model, prefix, path):
+    """Catalog column name -> ORM path (from Planet) of every concrete field of the model"""
+    return {
+        '%s_%s' % (prefix, field.attname): path + field.attname
+        for field in model._meta.concrete_fields
+        if field.name not in AUDIT_FIELDS
+    }
+
+
+STAR_PATH = 'planetary_system__star_planetary_system__'
+
+COLUMNS = {
+    **model_columns(PlanetarySystem, 'planetary_system', 'planetary_system__'),
+    **model_columns(Star, 'star', STAR_PATH),
+    **model_columns(Planet, 'planet', ''),
+    'star_spectral_type_name': STAR_PATH + 'spectral_type__name',
+    'planet_discovery_method_name': 'discovery_method__name',
+    'planet_discovery_facility_name': 'discovery_facility__name',
+    'planet_solution_type_name': 'solution_type__name',
+}
+
+
+def is_star_column(column):
+    return COLUMNS[column].startswith(STAR_PATH)
+
+
+class CatalogRows:
+    """
+    Iterate the values of the columns for every catalog row matching the
+    conditions (of a Planet queryset, see filters.py).
+
+    Rows are read in chunks that seek on the planet (and star) ids, so memory
+    stays flat whatever the size of the catalog: MySQLdb buffers a whole
+    result set in the client, even for iterator().
+    """
+
+    def __init__(self, columns, conditions=(), chunk_size=CHUNK_SIZE):
+        self.columns = list(columns)
+        self.conditions = list(conditions)
+        self.chunk_size = chunk_size
+        self.keys = ['id']
+        if any(is_star_column(column) for column in self.columns):
+            # One row per current star of the planetary system, the join
+            # does not go through the manager that leaves the retired ones out
+            self.keys.append(STAR_PATH + 'id')
+            self.conditions.append(Q(**{STAR_PATH + 'retired_in__isnull': True}))
+
+    def queryset(self, last=None):
+        """
+        The rows after the keys of the last row. The seek goes in the
+        filter() call of the conditions, a second one could join the stars
+        again.
+        """
+        if last is None:
+            condition = Q()
+        elif last[-1] is None:
+            # The planet of a planetary system without stars has one row, its
+            # star id is NULL: the next rows are the ones of the next planets
+            condition = seek(self.keys[:1], last[:1])
+        else:
+            condition = seek(self.keys, last)
+        return Planet.objects.filter(condition, *self.conditions).order_by(*self.keys).values_list(
+            *self.keys, *(COLUMNS[column] for column in self.columns)
+        )
+
+    def __iter__(self):
+        last = None
+        while True:
+            rows = list(self.queryset(last)[:self.chunk_size])
+            for row in rows:
+                yield row[len(self.keys):]
+            if len(rows) < self.chunk_size:
+                return
+            last = rows[-1][:len(self.keys)]
@@ -0,0 +1,47 @@
+"""
+Incremental serialization of the catalog rows: every row is encoded and sent
+as soon as it is read, nothing is accumulated.
+
+Source: https://docs.djangoproject.com/en/3.1/howto/outputting-csv/#streaming-large-csv-files
+"""
+
+import csv  # https://docs.python.org/3/library/csv.html
+import datetime
+import decimal
+import json
+
+
+class Echo:
+    """File-like object whose write returns the value instead of storing it"""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(columns, rows):
+    """The header and one csv line per row"""
+    writer = csv.writer(Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def json_default(value):
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    raise TypeError('%r is not JSON serializable' % value)
+
+
+def jsonl_lines(columns, rows):
+    """One JSON object per line and row"""
+    encoder = json.JSONEncoder(default=json_default, ensure_ascii=False)
+    for row in rows:
+        yield encoder.encode(dict(zip(columns, row))) + '\n'
+
+
+FORMATS = {
+    'csv': (csv_lines, 'text/csv; charset=utf-8'),
+    'jsonl': (jsonl_lines, 'application/x-ndjson; charset=utf-8'),
+}
@@ -0,0 +1,148 @@
+"""
+Filters of the query string, shared by the list view, the API and the export
+
+Filters are named after the catalog columns (see catalog.py) with an optional
+lookup, and only the whitelisted columns can be filtered:
+
+    ?planet_discovery_year=2016
+    ?planet_orbital_period__lt=10
+    ?star_effective_temperature__range=5000,6000
+    ?planet_discovery_method_name__in=Transit,Imaging
+
+Every filter becomes a SQL predicate of the query. The columns of the model
+being listed or of its planetary system are filtered in place, the columns of
+the stars or planets of the system become an EXISTS subquery on their
+planetary_system_id index, so no row is repeated.
+"""
+
+from django.core.exceptions import ValidationError
+from django.db import models
+from django.db.models import Exists, OuterRef, Q
+
+from .models import (
+    PlanetarySystem,
+    Star,
+    Planet
+)
+
+# Query string parameters that are not filters
+RESERVED = ('fields', 'page_size', 'after', 'before', 'page')
+
+SEPARATOR = ','
+
+NUMBER_LOOKUPS = ('exact', 'gt', 'gte', 'lt', 'lte', 'range', 'in', 'isnull')
+NAME_LOOKUPS = ('exact', 'in', 'isnull')
+FLAG_LOOKUPS = ('exact',)
+
+# Catalog column prefix of each model
+PREFIXES = (
+    (PlanetarySystem, 'planetary_system'),
+    (Star, 'star'),
+    (Planet, 'planet'),
+)
+
+# The lookup tables, filtered by name
+LOOKUP_NAMES = {
+    Star: ('spectral_type',),
+    Planet: ('discovery_method', 'discovery_facility', 'solution_type'),
+}
+
+# Text columns that can be filtered, the others are free text
+NAME_FIELDS = ('name', 'planet_letter')
+
+
+class FilterError(ValueError):
+    pass
+
+
+def field_lookups(field):
+    """The lookups allowed on a field, None for the fields that can't be filtered"""
+    if isinstance(field, (models.AutoField, models.ForeignKey)):
+        return None
+    if isinstance(field, models.BooleanField):
+        return FLAG_LOOKUPS
+    if isinstance(field, (models.DecimalField, models.IntegerField)):
+        return NUMBER_LOOKUPS
+    if isinstance(field, models.DateField) and not isinstance(field, models.DateTimeField):
+        return NUMBER_LOOKUPS
+    if isinstance(field, models.CharField) and field.name in NAME_FIELDS:
+        return NAME_LOOKUPS
+    return None
+
+
+def build_whitelist():
+    """Column name -> (model, path in the model, model field, allowed lookups)"""
+    whitelist = {}
+    for model, prefix in PREFIXES:
+        for field in model._meta.concrete_fields:
+            lookups = field_lookups(field)
+            if lookups:
+                whitelist['%s_%s' % (prefix, field.name)] = (model, field.name, field, lookups)
+        for lookup in LOOKUP_NAMES.get(model, ()):
+            name_field = model._meta.get_field(lookup).related_model._meta.get_field('name')
+            whitelist['%s_%s_name' % (prefix, lookup)] = (model, '%s__name' % lookup, name_field, NAME_LOOKUPS)
+    return whitelist
+
+
+WHITELIST = build_whitelist()
+
+
+def parse_value(field, lookup, value):
+    """Convert the query string value for the lookup, as the database expects it"""
+    try:
+        if lookup == 'isnull':
+            if value not in ('true', 'false'):
+                raise ValidationError('isnull takes true or false')
+            return value == 'true'
+        if lookup in ('in', 'range'):
+            values = [field.to_python(item) for item in value.split(SEPARATOR)]
+            if lookup == 'range' and len(values) != 2:
+                raise ValidationError('range takes two values')
+            return values
+        if isinstance(field, models.BooleanField) and value in ('true', 'false'):
+            return value == 'true'
+        return field.to_python(value)
+    except ValidationError as error:
+        raise FilterError('Invalid value %r: %s' % (value, ' '.join(error.messages)))
+
+
+def parse_filters(parameters):
+    """Return [(model, ORM lookup in the model, value)] of the query string filters"""
+    filters = []
+    for name, values in parameters.lists():
+        if name in RESERVED:
+            continue
+        column, _, lookup = name.partition('__')
+        lookup = lookup or 'exact'
+        if column not in WHITELIST:
+            raise FilterError('Unknown filter %r' % name)
+        model, path, field, lookups = WHITELIST[column]
+        if lookup not in lookups:
+            raise FilterError('%s can be filtered with: %s' % (column, ', '.join(lookups)))
+        for value in values:
+            filters.append((model, '%s__%s' % (path, lookup), parse_value(field, lookup, value)))
+    return filters
+
+
+def filter_conditions(model, parameters):
+    """
+    The conditions of the query string filters for a queryset of the model,
+    to pass to filter(). Raises FilterError on an invalid filter.
+    """
+    grouped = {}
+    for filter_model, lookup, value in parse_filters(parameters):
+        grouped.setdefault(filter_model, []).append((lookup, value))
+
+    conditions = []
+    for filter_model, lookups in grouped.items():
+        if filter_model is model:
+            conditions.append(Q(*lookups))
+        elif filter_model is PlanetarySystem:
+            conditions.append(Q(*(('planetary_system__%s' % lookup, value) for lookup, value in lookups)))
+        else:
+            # Stars or planets of the same planetary system
+            system = 'pk' if model is PlanetarySystem else 'planetary_system_id'
+            conditions.append(Exists(
+                filter_model.objects.filter(Q(*lookups), planetary_system_id=OuterRef(system))
+            ))
+    return conditions
@@ -0,0 +1,6 @@
+"""
+Loading of the NASA planetary systems csv dataset into the database.
+
+The entry point is scripts/many_load.py, executed with:
+python3 manage.py runscript many_load
+"""
@@ -0,0 +1,158 @@
+"""
+Batched loader: every table is written with chunked bulk_create calls
+
+Source: https://docs.djangoproject.com/en/3.1/ref/models/querysets/#bulk-create
+"""
+
+from collections import defaultdict
+
+from django.db.models import Max
+
+from planetary_systems.models import (
+    PlanetarySystem,
+    SpectralType,
+    Star,
+    DiscoveryMethod,
+    DiscoveryFacility,
+    SolutionType,
+    Planet
+)
+from planetary_systems.sky import sky_cell
+from .dimensions import dimension_caches
+from .columns import (
+    SPECTRAL_TYPE_COLUMN,
+    DISCOVERY_METHOD_COLUMN,
+    DISCOVERY_FACILITY_COLUMN,
+    SOLUTION_TYPE_COLUMN,
+    PLANETARY_SYSTEM_COLUMNS,
+    STAR_COLUMNS,
+    PLANET_COLUMNS
+)
+
+DEFAULT_BATCH_SIZE = 2000
+
+# Parents first so the foreign keys of every batch already exist
+INSERT_ORDER = (
+    SpectralType,
+    DiscoveryMethod,
+    DiscoveryFacility,
+    SolutionType,
+    PlanetarySystem,
+    Star,
+    Planet,
+)
+
+
+def clear_tables():
+    """Delete all data from tables, every version, children first so the cascades are cheap"""
+    for model in reversed(INSERT_ORDER):
+        model._base_manager.all().delete()
+
+
+class BulkLoader:
+    """
+    Resolve the lookup tables, planetary systems and stars in memory and write
+    every table with chunked bulk_create calls.
+
+    Primary keys of the parent tables are assigned here instead of by the
+    database, because MySQL does not return them from a bulk insert, so the
+    planets can reference them without reading them back.
+
+    The new rows are stamped with the version, a LoadRun, when there is one.
+    """
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, version=None):
+        self.batch_size = batch_size
+        self.version = version
+        # Lookup tables: model -> DimensionCache
+        self.dimensions = dimension_caches()
+        # Model -> {natural key: primary key}
+        self.keys = defaultdict(dict)
+        # Model -> objects waiting to be inserted
+        self.pending = defaultdict(list)
+        self.next_ids = {}
+        # Model name -> number of inserted rows
+        self.counts = defaultdict(int)
+
+    def load(self, rows):
+        """Insert every row and return the number of inserted rows per model"""
+        for row in rows:
+            self.add_row(row)
+        self.flush()
+        return dict(self.counts)
+
+    def add_row(self, row):
+        """Resolve the foreign keys of a csv row and queue its planet"""
+        planetary_system_id = self.resolve(PlanetarySystem, PLANETARY_SYSTEM_COLUMNS, row)
+
+        spectral_type_id = self.dimensions[SpectralType].get(row[SPECTRAL_TYPE_COLUMN])
+
+        self.resolve(
+            Star,
+            STAR_COLUMNS,
+            row,
+            planetary_system_id=planetary_system_id,
+            spectral_type_id=spectral_type_id
+        )
+
+        planet = self.build(
+            Planet,
+            planetary_system_id=planetary_system_id,
+            discovery_method_id=self.dimensions[DiscoveryMethod].get(row[DISCOVERY_METHOD_COLUMN]),
+            discovery_facility_id=self.dimensions[DiscoveryFacility].get(row[DISCOVERY_FACILITY_COLUMN]),
+            solution_type_id=self.dimensions[SolutionType].get(row[SOLUTION_TYPE_COLUMN]),
+            **{field: row[index] for field, index in PLANET_COLUMNS}
+        )
+        self.queue_planet(planet)
+
+    def queue_planet(self, planet):
+        self.pending[Planet].append(planet)
+        if len(self.pending[Planet]) >= self.batch_size:
+            self.flush()
+
+    def resolve(self, model, columns, row, **foreign_keys):
+        """
+        Return the primary key of the object built from the row columns,
+        the same as get_or_create but without querying the database
+        """
+        key = tuple(row[index] for field, index in columns) + tuple(foreign_keys.values())
+        keys = self.keys[model]
+        if key not in keys:
+            keys[key] = self.next_id(model)
+            self.pending[model].append(self.build(
+                model,
+                id=keys[key],
+                **{field: row[index] for field, index in columns},
+                **foreign_keys
+            ))
+        return keys[key]
+
+    def build(self, model, **values):
+        """A new object, with the columns computed from the csv ones"""
+        obj = model(**values)
+        if self.version is not None:
+            obj.introduced_in_id = self.version.pk
+        if model is PlanetarySystem:
+            obj.sky_cell = sky_cell(obj.right_ascension_decimal, obj.declination_decimal)
+        return obj
+
+    def next_id(self, model):
+        if model not in self.next_ids:
+            # Retired rows keep their ids
+            last_id = model._base_manager.aggregate(last_id=Max('id'))['last_id']
+            self.next_ids[model] = (last_id or 0) + 1
+        self.next_ids[model] += 1
+        return self.next_ids[model] - 1
+
+    def flush(self):
+        """Insert the queued objects, parents first"""
+        for model in INSERT_ORDER:
+            if model in self.dimensions:
+                count = self.dimensions[model].flush()
+            else:
+                count = len(self.pending[model])
+                if count:
+                    model.objects.bulk_create(self.pending[model], batch_size=self.batch_size)
+                    self.pending[model] = []
+            if count:
+                self.counts[model.__name__] += count
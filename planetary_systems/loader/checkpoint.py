@@ -0,0 +1,139 @@
+"""
+Resumable loads: a full load commits its rows in batches, every batch in one
+transaction with the checkpoint of the run (see LoadRun), the byte offset and
+line of the csv file after its last row.
+
+When the load stops, the tables hold the rows before the checkpoint and
+many_load resume=1 continues from it, with the same version, instead of
+loading the whole file again. The file hash of the run tells it is the same
+file.
+
+The rows that can not be decoded or do not fit their model fields (see
+validation.py) go to a reject file, a csv file with the line, the column and
+the reason of every row followed by its values, and the load goes on.
+"""
+
+import csv  # https://docs.python.org/3/library/csv.html
+import os
+
+from django.db import transaction
+from django.utils import timezone
+
+from planetary_systems.models import (
+    PlanetarySystem,
+    Star
+)
+from .bulk import BulkLoader, DEFAULT_BATCH_SIZE, clear_tables
+from .columns import PLANETARY_SYSTEM_COLUMNS, STAR_COLUMNS
+
+REJECT_COLUMNS = ['line', 'column', 'reason']
+
+# The columns of the natural keys of the BulkLoader, after the csv ones
+KEYS = (
+    (PlanetarySystem, PLANETARY_SYSTEM_COLUMNS, ()),
+    (Star, STAR_COLUMNS, ('planetary_system_id', 'spectral_type_id')),
+)
+
+
+def reject_path(path):
+    """PS_2021.01.08_12.13.30.csv -> PS_2021.01.08_12.13.30.rejects.csv"""
+    return '%s.rejects.csv' % os.path.splitext(path)[0]
+
+
+class RejectFile:
+    """
+    Csv file of the rows that were not loaded. A resumed load keeps the
+    rejects up to the line of its checkpoint, the ones after it are read again.
+    """
+
+    def __init__(self, path, resume_line=None):
+        self.path = path
+        self.resume_line = resume_line
+        self.fhand = None
+        self.writer = None
+        self.count = 0
+
+    def __enter__(self):
+        kept = []
+        if self.resume_line is not None and os.path.exists(self.path):
+            with open(self.path, newline='', encoding='utf-8') as fhand:
+                reader = csv.reader(fhand)
+                next(reader, None)
+                kept = [row for row in reader if int(row[0]) <= self.resume_line]
+
+        self.fhand = open(self.path, 'w', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.fhand)
+        self.writer.writerow(REJECT_COLUMNS)
+        self.writer.writerows(kept)
+        self.count = len(kept)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.fhand.close()
+        # Only the header
+        if not self.count:
+            os.remove(self.path)
+
+    def write(self, error, row):
+        self.writer.writerow([error.line_number, error.column, str(error)] + row)
+        self.count += 1
+
+    def flush(self):
+        self.fhand.flush()
+
+
+def record_rows(run, rows_read, rejects=None, *checkpoint_fields):
+    """The rows read from the file and the ones rejected so far"""
+    run.rows_read = rows_read
+    run.rows_rejected = rejects.count if rejects is not None else 0
+    run.save(update_fields=['rows_read', 'rows_rejected', *checkpoint_fields])
+
+
+def save_checkpoint(run, reader):
+    """The position of the reader, saved in the transaction of the batch it ends"""
+    if reader.rejects is not None:
+        reader.rejects.flush()
+    run.byte_offset = reader.offset
+    run.line_number = reader.line_number
+    run.checkpointed_on = timezone.now()
+    record_rows(run, reader.rows_read, reader.rejects, 'byte_offset', 'line_number', 'checkpointed_on')
+
+
+class CheckpointedLoader(BulkLoader):
+    """
+    Full load with the BulkLoader, every flush is a transaction that ends
+    with a checkpoint. A run that has a checkpoint is resumed: the tables are
+    kept and the keys of their planetary systems and stars are read back, so
+    the next rows reference them instead of inserting them again.
+    """
+
+    def __init__(self, run, batch_size=DEFAULT_BATCH_SIZE):
+        super().__init__(batch_size=batch_size, version=run)
+        self.run = run
+        self.reader = None
+
+    def load(self, reader):
+        self.reader = reader
+        if self.run.checkpointed_on is None:
+            # The empty tables are the first checkpoint, at the start of the file
+            with transaction.atomic():
+                clear_tables()
+                save_checkpoint(self.run, reader)
+        else:
+            self.read_keys()
+            if self.run.byte_offset:
+                reader.resume(self.run.byte_offset, self.run.line_number, self.run.rows_read)
+        return super().load(reader)
+
+    def read_keys(self):
+        """The natural keys of the committed rows, the values compare equal to the decoded csv ones"""
+        for model, columns, foreign_keys in KEYS:
+            fields = [field for field, index in columns] + list(foreign_keys)
+            keys = self.keys[model]
+            for values in model._base_manager.values_list('id', *fields).iterator():
+                keys[values[1:]] = values[0]
+
+    def flush(self):
+        with transaction.atomic():
+            super().flush()
+            save_checkpoint(self.run, self.reader)
@@ -0,0 +1,116 @@
+"""
+Position of every model field in a row of the NASA planetary systems csv file
+
+Dataset columns info: https://exoplanetarchive.ipac.caltech.edu/docs/API_PS_columns.html
+"""
+
+# Number of columns of each data row
+COLUMN_COUNT = 97
+
+# Lookup tables, a single name column each
+SPECTRAL_TYPE_COLUMN = 55       # st_spectype
+DISCOVERY_METHOD_COLUMN = 10    # discoverymethod
+DISCOVERY_FACILITY_COLUMN = 12  # disc_facility
+SOLUTION_TYPE_COLUMN = 13       # soltype
+
+PLANETARY_SYSTEM_COLUMNS = (
+    ('name', 1),
+    ('number_of_stars', 8),
+    ('number_of_planets', 9),
+    ('publication_reference', 77),
+    ('right_ascension_sexagesimal', 78),
+    ('right_ascension_decimal', 79),
+    ('declination_sexagesimal', 80),
+    ('declination_decimal', 81),
+    ('distance', 82),
+    ('distance_err1', 83),
+    ('distance_err2', 84),
+    ('brightness_v_magnitude', 85),
+    ('brightness_v_magnitude_err1', 86),
+    ('brightness_v_magnitude_err2', 87),
+    ('brightness_ks_magnitude', 88),
+    ('brightness_ks_magnitude_err1', 89),
+    ('brightness_ks_magnitude_err2', 90),
+    ('brightness_gaia_magnitude', 91),
+    ('brightness_gaia_magnitude_err1', 92),
+    ('brightness_gaia_magnitude_err2', 93),
+)
+
+STAR_COLUMNS = (
+    ('hd_name', 3),
+    ('hip_name', 4),
+    ('tic_id', 5),
+    ('gaia_id', 6),
+    ('publication_reference', 54),
+    ('effective_temperature', 56),
+    ('effective_temperature_err1', 57),
+    ('effective_temperature_err2', 58),
+    ('effective_temperature_limit', 59),
+    ('radius', 60),
+    ('radius_err1', 61),
+    ('radius_err2', 62),
+    ('radius_limit', 63),
+    ('mass', 64),
+    ('mass_err1', 65),
+    ('mass_err2', 66),
+    ('mass_limit', 67),
+    ('measurement', 68),
+    ('measurement_err1', 69),
+    ('measurement_err2', 70),
+    ('measurement_limit', 71),
+    ('metallicity_ratio', 72),
+    ('surface_gravity', 73),
+    ('surface_gravity_err1', 74),
+    ('surface_gravity_err2', 75),
+    ('surface_gravity_limit', 76),
+)
+
+PLANET_COLUMNS = (
+    ('name', 0),
+    ('planet_letter', 2),
+    ('explicit', 7),
+    ('discovery_year', 11),
+    ('controversial_flag', 14),
+    ('publication_reference', 15),
+    ('orbital_period', 16),
+    ('orbital_period_err1', 17),
+    ('orbital_period_err2', 18),
+    ('orbital_period_limit', 19),
+    ('orbit_semi_major_axis', 20),
+    ('orbit_semi_major_axis_err1', 21),
+    ('orbit_semi_major_axis_err2', 22),
+    ('orbit_semi_major_axis_limit', 23),
+    ('earth_radius', 24),
+    ('earth_radius_err1', 25),
+    ('earth_radius_err2', 26),
+    ('earth_radius_limit', 27),
+    ('jupiter_radius', 28),
+    ('jupiter_radius_err1', 29),
+    ('jupiter_radius_err2', 30),
+    ('jupiter_radius_limit', 31),
+    ('earth_mass', 32),
+    ('earth_mass_err1', 33),
+    ('earth_mass_err2', 34),
+    ('earth_mass_limit', 35),
+    ('jupiter_mass', 36),
+    ('jupiter_mass_err1', 37),
+    ('jupiter_mass_err2', 38),
+    ('jupiter_mass_limit', 39),
+    ('mass_provenance', 40),
+    ('eccentricity', 41),
+    ('eccentricity_err1', 42),
+    ('eccentricity_err2', 43),
+    ('eccentricity_limit', 44),
+    ('insolation_flux', 45),
+    ('insolation_flux_err1', 46),
+    ('insolation_flux_err2', 47),
+    ('insolation_flux_limit', 48),
+    ('equilibrium_temperature', 49),
+    ('equilibrium_temperature_err1', 50),
+    ('equilibrium_temperature_err2', 51),
+    ('equilibrium_temperature_limit', 52),
+    ('transit_timing_variations', 53),
+    ('date_last_update', 94),
+    ('reference_date_publication', 95),
+    ('release_date', 96),
+)
@@ -0,0 +1,178 @@
+"""
+Incremental (delta) loader
+
+Instead of deleting every table and inserting the whole archive again, the
+incoming rows are compared with the planets already stored and only the new,
+changed and removed rows are written.
+
+With a version (a LoadRun, see versions.py) the removed rows are retired
+instead of deleted, and a changed planet is a new row that replaces the
+retired one, so every earlier version of the catalog can still be queried.
+"""
+
+from collections import defaultdict
+
+from django.utils import timezone
+
+from planetary_systems.models import (
+    PlanetarySystem,
+    Star,
+    Planet
+)
+from planetary_systems.summaries import SummaryChanges
+from .bulk import BulkLoader, DEFAULT_BATCH_SIZE
+from .columns import PLANETARY_SYSTEM_COLUMNS, STAR_COLUMNS, PLANET_COLUMNS
+
+# Fields compared to tell if a stored planet changed, NASA bumps the dates
+# of a row when it is updated. The foreign keys catch a row moved to another
+# planetary system or lookup name.
+PLANET_SIGNATURE_FIELDS = (
+    'date_last_update',
+    'release_date',
+    'planetary_system_id',
+    'discovery_method_id',
+    'discovery_facility_id',
+    'solution_type_id',
+)
+
+# Fields written when a stored planet changed
+PLANET_UPDATE_FIELDS = [field for field, index in PLANET_COLUMNS] + [
+    'planetary_system',
+    'discovery_method',
+    'discovery_facility',
+    'solution_type',
+    'row_updated_on',
+]
+
+
+def planet_key(planet):
+    """
+    A planet has one row per publication in the archive, the reference tells
+    the rows of the same planet apart
+    """
+    return planet.name, planet.publication_reference
+
+
+def chunks(items, size):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class DeltaLoader(BulkLoader):
+    """
+    Insert, update or delete only the planets that changed since the last load.
+
+    Planets are matched by name and publication reference, and a match is
+    rewritten when its date_last_update, release_date or foreign keys differ.
+    Planetary systems and stars that no row references anymore are deleted,
+    or retired when there is a version.
+    """
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, version=None):
+        super().__init__(batch_size=batch_size, version=version)
+        # Model -> primary keys referenced by the csv file
+        self.seen = defaultdict(set)
+        # (name, publication_reference) -> [(id, signature), ...] of stored planets
+        self.stored_planets = defaultdict(list)
+        self.updates = []
+        # Stored planets replaced by a new row of the version
+        self.replaced = []
+        self.updated = defaultdict(int)
+        self.deleted = defaultdict(int)
+        self.unchanged = 0
+        # Summary groups to compute again after the load
+        self.changes = SummaryChanges()
+        self.preload()
+
+    def preload(self):
+        """Read the natural keys of the stored rows, one query per table"""
+        for model, columns in (
+            (PlanetarySystem, PLANETARY_SYSTEM_COLUMNS),
+            (Star, STAR_COLUMNS + (('planetary_system_id', None), ('spectral_type_id', None))),
+        ):
+            fields = [field for field, index in columns]
+            self.keys[model] = {
+                tuple(values[1:]): values[0]
+                for values in model.objects.values_list('id', *fields).iterator()
+            }
+
+        for values in Planet.objects.values_list(
+            'id', 'name', 'publication_reference', *PLANET_SIGNATURE_FIELDS
+        ).iterator():
+            self.stored_planets[values[1:3]].append((values[0], values[3:]))
+
+    def resolve(self, model, columns, row, **foreign_keys):
+        pk = super().resolve(model, columns, row, **foreign_keys)
+        self.seen[model].add(pk)
+        return pk
+
+    def load(self, rows):
+        """Synchronize the stored rows with the csv rows, return the inserted rows per model"""
+        counts = super().load(rows)
+        self.delete_missing()
+        return counts
+
+    def queue_planet(self, planet):
+        stored = self.stored_planets.get(planet_key(planet))
+        if not stored:
+            self.changes.add_planet(planet.discovery_method_id, planet.discovery_year, planet.discovery_facility_id)
+            super().queue_planet(planet)
+            return
+
+        pk, signature = stored.pop()
+        if signature == tuple(getattr(planet, field) for field in PLANET_SIGNATURE_FIELDS):
+            self.unchanged += 1
+            return
+
+        self.changes.add_planet(planet.discovery_method_id, planet.discovery_year, planet.discovery_facility_id)
+        if self.version is not None:
+            self.replaced.append(pk)
+            super().queue_planet(planet)
+            return
+
+        planet.id = pk
+        # bulk_update does not fill auto_now fields
+        planet.row_updated_on = timezone.now()
+        self.updates.append(planet)
+        if len(self.updates) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        self.changes.planet_counts.update(system.number_of_planets for system in self.pending[PlanetarySystem])
+        if self.replaced:
+            self.changes.add_stored_planets(self.replaced)
+            self.retire(Planet, self.replaced)
+            self.updated[Planet.__name__] += len(self.replaced)
+            self.replaced = []
+        super().flush()
+        if self.updates:
+            self.changes.add_stored_planets([planet.id for planet in self.updates])
+            Planet.objects.bulk_update(self.updates, PLANET_UPDATE_FIELDS, batch_size=self.batch_size)
+            self.updated[Planet.__name__] += len(self.updates)
+            self.updates = []
+
+    def delete_missing(self):
+        """Delete the stored rows that are not in the csv file anymore, children first"""
+        missing_planets = [pk for stored in self.stored_planets.values() for pk, signature in stored]
+        self.delete(Planet, missing_planets)
+
+        for model in (Star, PlanetarySystem):
+            missing = set(self.keys[model].values()) - self.seen[model]
+            self.delete(model, missing)
+
+    def delete(self, model, pks):
+        for batch in chunks(pks, self.batch_size):
+            if model is Planet:
+                self.changes.add_stored_planets(batch)
+            elif model is PlanetarySystem:
+                self.changes.add_stored_planetary_systems(batch)
+            if self.version is not None:
+                self.retire(model, batch)
+            else:
+                model.objects.filter(id__in=batch).delete()
+            self.deleted[model.__name__] += len(batch)
+
+    def retire(self, model, pks):
+        """Stamp the stored rows with the version, they are kept but not current anymore"""
+        model.objects.filter(id__in=pks).update(retired_in=self.version, row_updated_on=timezone.now())
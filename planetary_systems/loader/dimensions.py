@@ -0,0 +1,76 @@
+"""
+In-memory name -> primary key cache for the lookup tables
+
+SpectralType, DiscoveryMethod, DiscoveryFacility and SolutionType only have a
+few dozen distinct names, so each table is read once per run and the new
+names are inserted together instead of one get_or_create per csv row.
+"""
+
+from planetary_systems.models import (
+    SpectralType,
+    DiscoveryMethod,
+    DiscoveryFacility,
+    SolutionType
+)
+
+DIMENSION_MODELS = (
+    SpectralType,
+    DiscoveryMethod,
+    DiscoveryFacility,
+    SolutionType,
+)
+
+
+class DimensionCache:
+    """Name -> primary key map of one lookup table"""
+
+    def __init__(self, model):
+        self.model = model
+        self.ids = None
+        self.next_id = None
+        # Objects of the new names, waiting for flush()
+        self.pending = []
+        self.hits = 0
+        self.misses = 0
+
+    def preload(self):
+        """Read every existing name of the table with a single query"""
+        self.ids = dict(self.model.objects.values_list('name', 'id'))
+        self.next_id = max(self.ids.values(), default=0) + 1
+
+    def get(self, name):
+        """
+        Return the primary key of the name, None for an empty name.
+        A new name gets its primary key right away and is inserted on flush()
+        """
+        if name is None:
+            return None
+        if self.ids is None:
+            self.preload()
+
+        pk = self.ids.get(name)
+        if pk is not None:
+            self.hits += 1
+            return pk
+
+        self.misses += 1
+        pk = self.ids[name] = self.next_id
+        self.next_id += 1
+        self.pending.append(self.model(id=pk, name=name))
+        return pk
+
+    def flush(self):
+        """Insert the new names with one bulk_create, return how many"""
+        count = len(self.pending)
+        if count:
+            self.model.objects.bulk_create(self.pending)
+            self.pending = []
+        return count
+
+    def stats(self):
+        return '%s: %d hits, %d misses' % (self.model.__name__, self.hits, self.misses)
+
+
+def dimension_caches():
+    """Return a fresh cache for every lookup table, keyed by model"""
+    return {model: DimensionCache(model) for model in DIMENSION_MODELS}
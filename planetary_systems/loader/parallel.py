@@ -0,0 +1,205 @@
+"""
+Parallel loader: the csv file is split in byte ranges that a pool of processes
+parses, decodes and validates, while a bounded pool of writer processes inserts the
+rows, each one with its own database connection. Building the INSERT
+statements is CPU bound, so threads would wait for each other.
+
+The coordinating process resolves the planetary systems, stars and lookup
+tables in file order with the same code as the serial BulkLoader, so both
+produce the same rows and primary keys.
+"""
+
+import csv  # https://docs.python.org/3/library/csv.html
+import io
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.db import connection
+
+from planetary_systems.models import Planet
+from .bulk import BulkLoader, DEFAULT_BATCH_SIZE, INSERT_ORDER
+from .delta import chunks
+from .reader import COMMENT_PREFIX, DecodeError, decode_row, parse_header
+from .validation import default_validator
+
+# Bytes of csv parsed by a worker at a time
+CHUNK_SIZE = 4 * 1024 * 1024
+
+
+def data_offset(path):
+    """
+    Return the byte offset of the first data row, after the comment header and
+    the column names, and the number of lines before it
+    """
+    with open(path, 'rb') as fhand:
+        lines = 0
+        while True:
+            line = fhand.readline()
+            if not line:
+                raise ValueError('%s has no column names after the comment header' % path)
+            lines += 1
+            if not line.startswith(COMMENT_PREFIX.encode()):
+                parse_header(line.decode('utf-8'), path)
+                return fhand.tell(), lines
+
+
+def split_ranges(path, start, chunk_size=CHUNK_SIZE):
+    """
+    Return (start, end) byte ranges of about chunk_size bytes that cover the
+    file from start, every range ends at the end of a row.
+
+    A quoted value may span several lines (see reader.py), so a line break
+    only ends a row outside the quotes: the quotes of the lines are counted
+    from start, an escaped "" counts twice and leaves the state as it was.
+    """
+    ranges = []
+    end = start
+    quoted = False
+    with open(path, 'rb') as fhand:
+        fhand.seek(start)
+        for line in fhand:
+            end += len(line)
+            if line.count(b'"') % 2:
+                quoted = not quoted
+            if not quoted and end - start >= chunk_size:
+                ranges.append((start, end))
+                start = end
+    if end > start:
+        ranges.append((start, end))
+    return ranges
+
+
+def parse_range(path, start, end):
+    """
+    Decode and validate the rows of a byte range, return (rows, (DecodeError,
+    csv row) of the invalid rows, number of lines)
+    """
+    with open(path, 'rb') as fhand:
+        fhand.seek(start)
+        data = fhand.read(end - start).decode('utf-8')
+
+    reader = csv.reader(io.StringIO(data, newline=''))
+    decoded = []
+    rejected = []
+    for row in reader:
+        try:
+            decoded.append((decode_row(row, reader.line_num), row, reader.line_num))
+        except DecodeError as error:
+            rejected.append((error, row))
+
+    # The whole range is one batch of the validation
+    invalid = default_validator().errors([values for values, row, line_number in decoded])
+    rows = []
+    for index, (values, row, line_number) in enumerate(decoded):
+        if index in invalid:
+            rejected.append((DecodeError(line_number, *invalid[index]), row))
+        else:
+            rows.append(values)
+    rejected.sort(key=lambda reject: reject[0].line_number)
+    return rows, rejected, reader.line_num
+
+
+def write_objects(model, objects):
+    """Insert a batch of objects from a writer process"""
+    model.objects.bulk_create(objects)
+    return len(objects)
+
+
+def process_pool(size):
+    """
+    Processes are spawned, not forked, so they never share the database
+    connection of the coordinator. Django is set up before the first task.
+    """
+    return ProcessPoolExecutor(
+        size,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=django.setup
+    )
+
+
+class ParallelLoader(BulkLoader):
+    """
+    Parse the csv file with `workers` processes and insert the rows with
+    `writers` processes. The few lookup table names are inserted by the
+    coordinating process, and the planetary systems and stars of a flush are
+    stored before the planets that reference them are handed over.
+
+    The invalid rows are written to rejects (see checkpoint.py), without it
+    the first one stops the load.
+    """
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, workers=2, writers=None, version=None, rejects=None,
+                 chunk_size=CHUNK_SIZE):
+        super().__init__(batch_size=batch_size, version=version)
+        self.rejects = rejects
+        self.chunk_size = chunk_size
+        self.rows_read = 0
+        self.workers = workers
+        self.writers = writers or workers
+        # SQLite only has one writer at a time
+        if connection.vendor == 'sqlite':
+            self.writers = 1
+        self.writer_pool = None
+        self.writes = deque()
+
+    def load_file(self, path):
+        """Insert every row of the csv file and return the inserted rows per model"""
+        # Lines read before the current range, to report decode errors
+        start, lines = data_offset(path)
+        ranges = deque(split_ranges(path, start, self.chunk_size))
+
+        with process_pool(self.workers) as parsers, process_pool(self.writers) as self.writer_pool:
+            # Keep a few ranges ahead of the coordinator, in file order
+            parsing = deque()
+            while ranges or parsing:
+                while ranges and len(parsing) < 2 * self.workers:
+                    parsing.append(parsers.submit(parse_range, path, *ranges.popleft()))
+
+                rows, rejected, line_count = parsing.popleft().result()
+                for error, row in rejected:
+                    error = DecodeError(lines + error.line_number, error.column, error.value, error.error)
+                    if self.rejects is None:
+                        raise error
+                    self.rejects.write(error, row)
+                lines += line_count
+                self.rows_read += len(rows) + len(rejected)
+
+                for row in rows:
+                    self.add_row(row)
+
+            self.flush()
+            while self.writes:
+                self.writes.popleft().result()
+
+        return dict(self.counts)
+
+    def flush(self):
+        for model in INSERT_ORDER:
+            if model in self.dimensions:
+                count = self.dimensions[model].flush()
+            else:
+                count = self.submit(model)
+            if count:
+                self.counts[model.__name__] += count
+
+    def submit(self, model):
+        """Split the queued objects of the model between the writers"""
+        objects = self.pending[model]
+        self.pending[model] = []
+
+        writes = []
+        for batch in chunks(objects, self.batch_size):
+            # Bound the objects waiting in memory
+            while len(self.writes) >= 2 * self.writers:
+                self.writes.popleft().result()
+            writes.append(self.writer_pool.submit(write_objects, model, batch))
+            self.writes.append(writes[-1])
+
+        # Parents must be stored before the next model references them
+        if model is not Planet:
+            for write in writes:
+                write.result()
+
+        return len(objects)
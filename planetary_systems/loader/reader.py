@@ -0,0 +1,237 @@
+"""
+Streaming reader of the NASA planetary systems csv file
+
+Rows are read lazily and every column is decoded once to the python type of
+its model field, so memory does not grow with the file size and Django does
+not coerce strings field by field on save. The decoded rows are validated
+before they reach the loaders.
+"""
+
+import csv  # https://docs.python.org/3/library/csv.html
+import datetime
+import decimal
+
+from django.db import models
+
+from planetary_systems.models import (
+    PlanetarySystem,
+    Star,
+    Planet
+)
+from .validation import default_validator
+from .columns import (
+    COLUMN_COUNT,
+    SPECTRAL_TYPE_COLUMN,
+    DISCOVERY_METHOD_COLUMN,
+    DISCOVERY_FACILITY_COLUMN,
+    SOLUTION_TYPE_COLUMN,
+    PLANETARY_SYSTEM_COLUMNS,
+    STAR_COLUMNS,
+    PLANET_COLUMNS
+)
+
+# Lines of the comment header start with this prefix
+COMMENT_PREFIX = '#'
+
+# Rows decoded and validated at a time
+VALIDATION_BATCH_SIZE = 1000
+
+BOOLEANS = {
+    '0': False,
+    '1': True,
+    'False': False,
+    'True': True,
+}
+
+
+class DecodeError(ValueError):
+    """A csv value that can not be converted to the type of its model field, or that does not fit it"""
+
+    def __init__(self, line_number, column, value, error):
+        self.line_number = line_number
+        self.column = column
+        self.value = value
+        self.error = error
+        super().__init__('Line %d, column %d: invalid value %r (%s)' % (line_number, column, value, error))
+
+    def __reduce__(self):
+        # Sent back from the processes of the parallel loader
+        return DecodeError, (self.line_number, self.column, self.value, self.error)
+
+
+def decode_boolean(value):
+    return BOOLEANS[value]
+
+
+def field_converter(field):
+    """Return the function that turns a csv string into the python value of the field"""
+    if isinstance(field, models.DecimalField):
+        return decimal.Decimal
+    if isinstance(field, models.IntegerField):
+        return int
+    if isinstance(field, models.BooleanField):
+        return decode_boolean
+    if isinstance(field, models.DateField):
+        return datetime.date.fromisoformat
+    return str
+
+
+def build_converters():
+    """Return the converter of every csv column, indexed like the row"""
+    converters = [str] * COLUMN_COUNT
+    for model, columns in (
+        (PlanetarySystem, PLANETARY_SYSTEM_COLUMNS),
+        (Star, STAR_COLUMNS),
+        (Planet, PLANET_COLUMNS),
+    ):
+        for field, index in columns:
+            converters[index] = field_converter(model._meta.get_field(field))
+
+    # Lookup tables are names
+    for index in (SPECTRAL_TYPE_COLUMN, DISCOVERY_METHOD_COLUMN, DISCOVERY_FACILITY_COLUMN, SOLUTION_TYPE_COLUMN):
+        converters[index] = str
+
+    return converters
+
+
+CONVERTERS = build_converters()
+
+
+class ArchiveReader:
+    """
+    Iterate over the data rows of a csv file as lists of typed values,
+    an empty column is None.
+
+    with ArchiveReader('PS_2021.01.08_12.13.30.csv') as reader:
+        for row in reader:
+            ...
+
+    The rows are decoded and checked against the constraints of their model
+    fields (see validation.py) a batch at a time. offset and line_number are
+    the position after the last row, a checkpoint of the loader:
+    resume(offset, line_number) continues from it. With a rejects file (see
+    checkpoint.py) the invalid rows are written there instead of stopping
+    the load.
+    """
+
+    def __init__(self, path, converters=CONVERTERS, rejects=None, validator=None, batch_size=VALIDATION_BATCH_SIZE):
+        self.path = path
+        self.converters = converters
+        self.rejects = rejects
+        self.validator = validator or default_validator()
+        self.batch_size = batch_size
+        self.fhand = None
+        self.header = None
+        self.comment_lines = 0
+        self.line_number = 0
+        self.offset = 0
+        self.rows_read = 0
+        # Bytes read, the file is read in binary to know it. The batch being
+        # checked is ahead of the offset of the last row
+        self.read_offset = 0
+        self.start = None
+
+    def __enter__(self):
+        self.fhand = open(self.path, 'rb')
+        return self
+
+    def __exit__(self, *exc_info):
+        self.fhand.close()
+
+    def lines(self):
+        """The lines of the file from the offset, with their line breaks like newline=''"""
+        for line in self.fhand:
+            self.read_offset += len(line)
+            yield line.decode('utf-8')
+
+    def resume(self, offset, line_number, rows_read=0):
+        """Skip the rows before the checkpoint, before the iteration starts"""
+        self.start = (offset, line_number, rows_read)
+
+    def read_header(self):
+        """Skip the # comment lines and return a csv reader positioned after the column names"""
+        lines = self.lines()
+        for line in lines:
+            self.line_number += 1
+            if not line.startswith(COMMENT_PREFIX):
+                break
+            self.comment_lines += 1
+        else:
+            raise ValueError('%s has no column names after the comment header' % self.path)
+
+        self.header = parse_header(line, self.path)
+        if self.start is not None:
+            self.offset, self.line_number, self.rows_read = self.start
+            self.read_offset = self.offset
+            self.fhand.seek(self.offset)
+        return csv.reader(lines)
+
+    def __iter__(self):
+        reader = self.read_header()
+        header_lines = self.line_number
+        rows_read = self.rows_read
+        batch = []
+        for row in reader:
+            rows_read += 1
+            # A quoted value may span several lines
+            batch.append((row, header_lines + reader.line_num, self.read_offset, rows_read))
+            if len(batch) == self.batch_size:
+                yield from self.check(batch)
+                batch = []
+        yield from self.check(batch)
+
+    def check(self, batch):
+        """Decode and validate a batch of csv rows, yield the valid ones with the position after each"""
+        decoded = []
+        for row, line_number, offset, rows_read in batch:
+            try:
+                decoded.append(decode_row(row, line_number, self.converters))
+            except DecodeError as error:
+                self.reject(error, row)
+                decoded.append(None)
+
+        invalid = self.validator.errors([values for values in decoded if values is not None])
+        index = 0
+        for (row, line_number, offset, rows_read), values in zip(batch, decoded):
+            self.offset, self.line_number, self.rows_read = offset, line_number, rows_read
+            if values is None:
+                continue
+            if index in invalid:
+                self.reject(DecodeError(line_number, *invalid[index]), row)
+            else:
+                yield values
+            index += 1
+
+    def reject(self, error, row):
+        if self.rejects is None:
+            raise error
+        self.rejects.write(error, row)
+
+
+def parse_header(line, path):
+    """Return the column names of the header line"""
+    header = next(csv.reader([line]))
+    if len(header) != COLUMN_COUNT:
+        raise ValueError('%s has %d columns, expected %d' % (path, len(header), COLUMN_COUNT))
+    return header
+
+
+def decode_row(row, line_number, converters=CONVERTERS):
+    """Return the typed values of a csv row, an empty column is None"""
+    if len(row) != COLUMN_COUNT:
+        raise DecodeError(line_number, len(row), None, 'expected %d columns' % COLUMN_COUNT)
+    try:
+        return [convert(value) if value else None for convert, value in zip(converters, row)]
+    except (ValueError, KeyError, decimal.InvalidOperation) as error:
+        raise find_decode_error(row, line_number, converters, error) from error
+
+
+def find_decode_error(row, line_number, converters, error):
+    """Find the column that failed to decode, only on the error path"""
+    for column, (convert, value) in enumerate(zip(converters, row)):
+        try:
+            if value:
+                convert(value)
+        except (ValueError, KeyError, decimal.InvalidOperation) as column_error:
+            return DecodeError(line_number, column, value, column_error)
+    return DecodeError(line_number, -1, None, error)
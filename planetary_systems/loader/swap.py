@@ -0,0 +1,160 @@
+"""
+Zero-downtime load: the archive is written into shadow copies of the tables,
+which then replace the live tables in a single atomic rename.
+
+The site keeps reading the previous data while the load runs and never sees
+empty or partial tables.
+
+MySQL: https://dev.mysql.com/doc/refman/8.0/en/rename-table.html
+Other databases (SQLite in the tests) rename the tables one by one inside a
+transaction, their DDL is transactional.
+"""
+
+import time
+from contextlib import contextmanager
+
+from django.db import connection, transaction
+
+from .bulk import BulkLoader, DEFAULT_BATCH_SIZE, INSERT_ORDER
+
+
+def table_names(suffix):
+    """Live table name -> the same name with the suffix, for every loaded model"""
+    return {
+        model._meta.db_table: '%s_%s' % (model._meta.db_table, suffix)
+        for model in INSERT_ORDER
+    }
+
+
+@contextmanager
+def use_tables(tables):
+    """
+    Point the models to other tables while the block runs, the ORM (and the
+    foreign key constraints created by the schema editor) use these names
+    """
+    originals = {model: model._meta.db_table for model in INSERT_ORDER}
+    try:
+        for model in INSERT_ORDER:
+            set_db_table(model, tables[originals[model]])
+        yield
+    finally:
+        for model, db_table in originals.items():
+            set_db_table(model, db_table)
+
+
+def set_db_table(model, db_table):
+    model._meta.db_table = db_table
+    # Field.cached_col keeps the table name of the first query
+    for field in model._meta.concrete_fields:
+        field.__dict__.pop('cached_col', None)
+
+
+@contextmanager
+def without_indexes():
+    """Leave the Meta.indexes of the models out of the tables created in the block"""
+    originals = {model: model._meta.indexes for model in INSERT_ORDER}
+    try:
+        for model in INSERT_ORDER:
+            model._meta.indexes = []
+        yield
+    finally:
+        for model, indexes in originals.items():
+            model._meta.indexes = indexes
+
+
+def create_tables(tables):
+    """
+    Create the tables without their Meta.indexes: the rows are inserted
+    faster, and outside MySQL index names are unique per database, so the
+    shadow indexes would clash with the live ones
+    """
+    with use_tables(tables), without_indexes(), connection.schema_editor() as schema_editor:
+        for model in INSERT_ORDER:
+            schema_editor.create_model(model)
+
+
+def create_indexes(tables):
+    """
+    Build the Meta.indexes of the models on the tables. The schema editor only
+    writes the statements: SQLite can't enter it inside a transaction.
+    """
+    schema_editor = connection.schema_editor()
+    with use_tables(tables), connection.cursor() as cursor:
+        for model in INSERT_ORDER:
+            for index in model._meta.indexes:
+                cursor.execute(str(index.create_sql(model, schema_editor)))
+
+
+def drop_tables(names):
+    """Drop the tables, children first"""
+    with connection.cursor() as cursor:
+        for name in reversed(names):
+            cursor.execute('DROP TABLE IF EXISTS %s' % connection.ops.quote_name(name))
+
+
+def rename_tables(renames):
+    """Rename every (old name, new name) pair at once"""
+    quote_name = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute('RENAME TABLE ' + ', '.join(
+                '%s TO %s' % (quote_name(old), quote_name(new)) for old, new in renames
+            ))
+        else:
+            with transaction.atomic():
+                for old, new in renames:
+                    cursor.execute('ALTER TABLE %s RENAME TO %s' % (quote_name(old), quote_name(new)))
+
+
+class ShadowLoad:
+    """
+    Load the rows into shadow tables and swap them with the live tables.
+
+    The suffix of the shadow tables changes every run, so the names of their
+    foreign key constraints never clash with the live ones. The named
+    Meta.indexes are built once the rows are inserted.
+    """
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, suffix=None, version=None):
+        self.batch_size = batch_size
+        self.version = version
+        self.suffix = suffix or '%x' % int(time.time())
+        self.shadow_tables = table_names(self.suffix)
+        self.old_tables = table_names('old_%s' % self.suffix)
+        self.loader = None
+
+    def load(self, rows):
+        """Fill the shadow tables, swap them in and return the inserted rows per model"""
+        live_tables = list(self.shadow_tables)
+        shadow_tables = list(self.shadow_tables.values())
+
+        create_tables(self.shadow_tables)
+        try:
+            with use_tables(self.shadow_tables):
+                self.loader = BulkLoader(batch_size=self.batch_size, version=self.version)
+                counts = self.loader.load(rows)
+        except BaseException:
+            drop_tables(shadow_tables)
+            raise
+
+        old_tables = [self.old_tables[name] for name in live_tables]
+        if connection.vendor == 'mysql':
+            # Index names are per table, the shadow tables get theirs before the swap
+            create_indexes(self.shadow_tables)
+            self.swap(live_tables)
+            drop_tables(old_tables)
+        else:
+            # The live index names are free once the old tables are dropped,
+            # all in the transaction of the swap
+            with transaction.atomic():
+                self.swap(live_tables)
+                drop_tables(old_tables)
+                create_indexes({name: name for name in live_tables})
+        return counts
+
+    def swap(self, live_tables):
+        """live -> old and shadow -> live in one statement"""
+        rename_tables(
+            [(name, self.old_tables[name]) for name in live_tables]
+            + [(self.shadow_tables[name], name) for name in live_tables]
+        )
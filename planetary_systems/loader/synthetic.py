@@ -0,0 +1,311 @@
+"""
+Synthetic NASA planetary systems csv files, for the loader benchmarks
+
+The files have the 97 columns of the archive (see columns.py) and the shape of
+the 2021 file: a planetary system has one or a few planets, a planet one row
+per publication, the star columns come from one of a few references of the
+system, the lookup tables have a few to a few hundred names and the
+measurements are often empty. The values are valid for the model fields, so
+every engine of the loader accepts the files.
+
+The same seed writes the same file.
+
+Dataset columns info: https://exoplanetarchive.ipac.caltech.edu/docs/API_PS_columns.html
+"""
+
+import csv  # https://docs.python.org/3/library/csv.html
+import datetime
+import random
+
+from django.db import models
+
+from planetary_systems.models import (
+    PlanetarySystem,
+    Star,
+    Planet
+)
+from .columns import (
+    COLUMN_COUNT,
+    SPECTRAL_TYPE_COLUMN,
+    DISCOVERY_METHOD_COLUMN,
+    DISCOVERY_FACILITY_COLUMN,
+    SOLUTION_TYPE_COLUMN,
+    PLANETARY_SYSTEM_COLUMNS,
+    STAR_COLUMNS,
+    PLANET_COLUMNS
+)
+
+# Names of the lookup tables, the first ones are the most frequent
+DISCOVERY_METHODS = (
+    'Transit',
+    'Radial Velocity',
+    'Microlensing',
+    'Imaging',
+    'Transit Timing Variations',
+    'Eclipse Timing Variations',
+    'Orbital Brightness Modulation',
+    'Pulsar Timing',
+    'Astrometry',
+    'Pulsation Timing Variations',
+    'Disk Kinematics',
+)
+SOLUTION_TYPES = (
+    'Published Confirmed',
+    'Kepler DR25',
+    'Kepler DR24',
+    'TESS Project Candidate',
+    'Published Candidate',
+    'Kepler DR12',
+    'Microlensing Solution',
+)
+DISCOVERY_FACILITIES = 70
+SPECTRAL_TYPES = 400
+SPECTRAL_CLASSES = 'OBAFGKM'
+MASS_PROVENANCES = ('Mass', 'Msini', 'M-R relationship', 'Msin(i)/sin(i)')
+METALLICITY_RATIOS = ('[Fe/H]', '[M/H]', '[m/H]')
+
+# Share of the systems with 1, 2, 3... planets
+PLANET_COUNT_WEIGHTS = (75, 14, 6, 3, 1, 1)
+
+# Rows of a planet, one per publication: 1 to twice the average
+ROWS_PER_PLANET = 7
+
+# Star references of a planetary system
+STAR_REFERENCES = 3
+
+# Share of empty values of the measurements, about the ones of the archive.
+# The errors and limits of a measurement are empty when it is.
+NULL_RATES = {
+    'hd_name': 0.85,
+    'hip_name': 0.8,
+    'tic_id': 0.05,
+    'gaia_id': 0.1,
+    'distance': 0.02,
+    'brightness_v_magnitude': 0.05,
+    'brightness_ks_magnitude': 0.03,
+    'brightness_gaia_magnitude': 0.04,
+    'effective_temperature': 0.1,
+    'radius': 0.15,
+    'mass': 0.2,
+    'measurement': 0.45,
+    'metallicity_ratio': 0.45,
+    'surface_gravity': 0.3,
+    'orbital_period': 0.05,
+    'orbit_semi_major_axis': 0.45,
+    'earth_radius': 0.3,
+    'jupiter_radius': 0.3,
+    'earth_mass': 0.7,
+    'jupiter_mass': 0.7,
+    'mass_provenance': 0.7,
+    'eccentricity': 0.6,
+    'insolation_flux': 0.75,
+    'equilibrium_temperature': 0.75,
+}
+# Share of empty errors of a known measurement
+ERROR_NULL_RATE = 0.15
+SPECTRAL_TYPE_NULL_RATE = 0.7
+
+# (lowest, highest) value of the measurements, drawn on a log scale when
+# both are positive
+RANGES = {
+    'distance': (1, 8000),
+    'brightness_v_magnitude': (3, 20),
+    'brightness_ks_magnitude': (2, 18),
+    'brightness_gaia_magnitude': (3, 20),
+    'effective_temperature': (2500, 10000),
+    'radius': (0.1, 20),
+    'mass': (0.1, 5),
+    'measurement': (-1, 0.5),
+    'surface_gravity': (3, 5),
+    'orbital_period': (0.3, 10000),
+    'orbit_semi_major_axis': (0.01, 20),
+    'earth_radius': (0.3, 25),
+    'jupiter_radius': (0.03, 2.2),
+    'earth_mass': (0.1, 5000),
+    'jupiter_mass': (0.0003, 15),
+    'eccentricity': (0, 0.9),
+    'insolation_flux': (0.01, 9000),
+    'equilibrium_temperature': (100, 3000),
+}
+
+SUFFIXES = ('_err1', '_err2', '_limit')
+
+FIRST_DISCOVERY_YEAR = 1992
+LAST_DISCOVERY_YEAR = 2021
+
+
+def measurement_name(field_name):
+    """distance_err1 -> distance"""
+    for suffix in SUFFIXES:
+        if field_name.endswith(suffix):
+            return field_name[:-len(suffix)]
+    return field_name
+
+
+def column_fields():
+    """(csv index, model field) of every model column"""
+    return sorted(
+        (index, model._meta.get_field(field))
+        for model, columns in (
+            (PlanetarySystem, PLANETARY_SYSTEM_COLUMNS),
+            (Star, STAR_COLUMNS),
+            (Planet, PLANET_COLUMNS),
+        )
+        for field, index in columns
+    )
+
+
+def header():
+    """Column names of the synthetic files, the model field of each column"""
+    names = ['column%d' % index for index in range(COLUMN_COUNT)]
+    for index, field in column_fields():
+        names[index] = '%s_%s' % (field.model._meta.model_name, field.name)
+    names[SPECTRAL_TYPE_COLUMN] = 'st_spectype'
+    names[DISCOVERY_METHOD_COLUMN] = 'discoverymethod'
+    names[DISCOVERY_FACILITY_COLUMN] = 'disc_facility'
+    names[SOLUTION_TYPE_COLUMN] = 'soltype'
+    return names
+
+
+def skewed_weights(count):
+    """Zipf-like weights, the first names are the most frequent as in the archive"""
+    return [1 / (rank + 1) for rank in range(count)]
+
+
+class SyntheticArchive:
+    """
+    Iterate over count csv rows of strings, as csv.reader would read them
+
+    for row in SyntheticArchive(100000, seed=1):
+        ...
+    """
+
+    def __init__(self, count, seed=0):
+        self.count = count
+        self.random = random.Random(seed)
+        self.facilities = ['Facility %d' % number for number in range(DISCOVERY_FACILITIES)]
+        self.spectral_types = [
+            '%s%d %s' % (SPECTRAL_CLASSES[number % 7], number // 7 % 10, ('V', 'IV', 'III', 'II', 'I', 'V-IV')[number // 70])
+            for number in range(SPECTRAL_TYPES)
+        ]
+        fields = column_fields()
+        self.system_fields = [(index, field) for index, field in fields if field.model is PlanetarySystem]
+        self.star_fields = [(index, field) for index, field in fields if field.model is Star]
+        self.planet_measurements = [
+            (index, field) for index, field in fields
+            if field.model is Planet and (measurement_name(field.name) in RANGES or field.name == 'mass_provenance')
+        ]
+
+    def __iter__(self):
+        rows = 0
+        system = 0
+        while rows < self.count:
+            for row in self.system_rows(system):
+                yield row
+                rows += 1
+                if rows == self.count:
+                    return
+            system += 1
+
+    def system_rows(self, system):
+        """The rows of every planet of the planetary system"""
+        rng = self.random
+        number_of_planets = rng.choices(range(1, len(PLANET_COUNT_WEIGHTS) + 1), PLANET_COUNT_WEIGHTS)[0]
+        host = 'Host %d' % system
+
+        row = [''] * COLUMN_COUNT
+        self.fill(row, self.system_fields)
+        row[1] = host
+        row[8] = str(rng.choices((1, 2, 3), (90, 9, 1))[0])
+        row[9] = str(number_of_planets)
+        row[77] = 'System reference %d' % system
+        ra = rng.uniform(0, 360)
+        dec = rng.uniform(-90, 90)
+        row[78] = '%02dh%02dm%05.2fs' % (ra / 15, ra * 4 % 60, ra * 240 % 60)
+        row[79] = '%.7f' % ra
+        row[80] = '%s%02dd%02dm%04.1fs' % ('-' if dec < 0 else '+', abs(dec), abs(dec) * 60 % 60, abs(dec) * 3600 % 60)
+        row[81] = '%.7f' % dec
+
+        # The star columns of every reference of the system
+        stars = []
+        for reference in range(rng.randint(1, STAR_REFERENCES)):
+            star = row[:]
+            self.fill(star, self.star_fields)
+            star[5] = 'TIC %d' % system if star[5] else ''
+            star[6] = 'Gaia DR2 %d' % system if star[6] else ''
+            star[3] = 'HD %d' % system if star[3] else ''
+            star[4] = 'HIP %d' % system if star[4] else ''
+            star[54] = 'Star reference %d-%d' % (system, reference)
+            if rng.random() >= SPECTRAL_TYPE_NULL_RATE:
+                star[SPECTRAL_TYPE_COLUMN] = rng.choices(self.spectral_types, skewed_weights(SPECTRAL_TYPES))[0]
+            stars.append(star)
+
+        for letter in 'bcdefgh'[:number_of_planets]:
+            name = '%s %s' % (host, letter)
+            method = rng.choices(DISCOVERY_METHODS, skewed_weights(len(DISCOVERY_METHODS)))[0]
+            facility = rng.choices(self.facilities, skewed_weights(DISCOVERY_FACILITIES))[0]
+            year = rng.randint(FIRST_DISCOVERY_YEAR, LAST_DISCOVERY_YEAR)
+            for publication in range(rng.randint(1, 2 * ROWS_PER_PLANET - 1)):
+                planet = rng.choice(stars)[:]
+                planet[0] = name
+                planet[2] = letter
+                planet[7] = '1' if publication == 0 else '0'
+                planet[DISCOVERY_METHOD_COLUMN] = method
+                planet[11] = str(year)
+                planet[DISCOVERY_FACILITY_COLUMN] = facility
+                planet[SOLUTION_TYPE_COLUMN] = rng.choices(SOLUTION_TYPES, skewed_weights(len(SOLUTION_TYPES)))[0]
+                planet[14] = '1' if rng.random() < 0.01 else '0'
+                planet[15] = 'Reference %s %d' % (name, publication)
+                planet[53] = '1' if rng.random() < 0.03 else '0'
+                self.fill(planet, self.planet_measurements)
+                published = datetime.date(year, 1, 1) + datetime.timedelta(days=rng.randrange(365 * 2))
+                planet[94] = published.isoformat()
+                planet[95] = published.strftime('%Y-%m')
+                planet[96] = published.isoformat()
+                yield planet
+
+    def fill(self, row, fields):
+        """Draw the measurements of the fields, with their errors and limits"""
+        known = {}
+        for index, field in fields:
+            name = measurement_name(field.name)
+            if name not in known:
+                known[name] = self.random.random() >= NULL_RATES.get(name, 0)
+            row[index] = self.value(field, name) if known[name] else ''
+
+    def value(self, field, name):
+        rng = self.random
+        if field.name.endswith('_limit'):
+            return '1' if rng.random() < 0.03 else '0'
+        if isinstance(field, models.CharField):
+            if name == 'mass_provenance':
+                return rng.choice(MASS_PROVENANCES)
+            if name == 'metallicity_ratio':
+                return rng.choice(METALLICITY_RATIOS)
+            return 'x'
+        if name not in RANGES:
+            return '1'
+
+        error = field.name != name
+        if error and rng.random() < ERROR_NULL_RATE:
+            return ''
+        low, high = RANGES[name]
+        if low > 0:
+            number = low * (high / low) ** rng.random()
+        else:
+            number = rng.uniform(low, high)
+        if error:
+            number = number * rng.uniform(0.01, 0.1) * (1 if field.name.endswith('1') else -1)
+        if isinstance(field, models.DecimalField):
+            return '%.*f' % (field.decimal_places, number)
+        return str(int(number))
+
+
+def write_synthetic_archive(path, count, seed=0):
+    """Write count synthetic rows after a comment header, like the archive files"""
+    with open(path, 'w', newline='', encoding='utf-8') as fhand:
+        fhand.write('# Synthetic planetary systems archive: %d rows, seed %d\n' % (count, seed))
+        writer = csv.writer(fhand)
+        writer.writerow(header())
+        writer.writerows(SyntheticArchive(count, seed=seed))
+    return path
@@ -0,0 +1,175 @@
+"""
+Validation stage between the reader and the loaders: the decoded rows are
+checked against the constraints of their model fields before they are
+written, a batch at a time and column by column, so a bad value is never
+found by the database (MySQL strict mode rejects the whole INSERT).
+
+The constraints come from the field definitions in models.py:
+
+null=False      the column can not be empty
+max_digits      the integer digits of a DecimalField, max_digits - decimal_places
+                (MySQL rounds the extra decimal places, that is not an error)
+IntegerField    the range of the field in the database, a Positive field can
+                not be negative
+max_length      the characters of a CharField
+
+Most batches are clean: a column is checked with a min() and a max() over
+its values, the values are only looked at one by one when the column breaks
+a constraint.
+
+Source: https://dev.mysql.com/doc/refman/8.0/en/sql-mode.html#sql-mode-strict
+"""
+
+import decimal
+import functools
+
+from django.db import connection, models
+
+from planetary_systems.models import (
+    PlanetarySystem,
+    SpectralType,
+    Star,
+    DiscoveryMethod,
+    DiscoveryFacility,
+    SolutionType,
+    Planet
+)
+from .columns import (
+    SPECTRAL_TYPE_COLUMN,
+    DISCOVERY_METHOD_COLUMN,
+    DISCOVERY_FACILITY_COLUMN,
+    SOLUTION_TYPE_COLUMN,
+    PLANETARY_SYSTEM_COLUMNS,
+    STAR_COLUMNS,
+    PLANET_COLUMNS
+)
+
+POSITIVE_FIELDS = (
+    models.PositiveBigIntegerField,
+    models.PositiveIntegerField,
+    models.PositiveSmallIntegerField,
+)
+
+
+class ColumnCheck:
+    """The constraints of the model field of a csv column"""
+
+    def __init__(self, column, field, lowest=None, highest=None, max_length=None):
+        self.column = column
+        self.field = field
+        self.null = field.null
+        self.lowest = lowest
+        self.highest = highest
+        self.max_length = max_length
+
+    def errors(self, values):
+        """(row index, value, reason) of the values of the column that break a constraint"""
+        present = [value for value in values if value is not None]
+        if (self.null or len(present) == len(values)) and self.fits(present):
+            return []
+        return [
+            (index, value, reason)
+            for index, value in enumerate(values)
+            for reason in (self.reason(value),) if reason
+        ]
+
+    def fits(self, present):
+        """Whether every value of the column fits, in one pass per constraint"""
+        if not present:
+            return True
+        try:
+            if self.lowest is not None and min(present) < self.lowest:
+                return False
+            if self.highest is not None and max(present) > self.highest:
+                return False
+        except decimal.InvalidOperation:
+            # NaN can not be compared
+            return False
+        if self.max_length is not None and max(map(len, present)) > self.max_length:
+            return False
+        return True
+
+    def reason(self, value):
+        """Why the value does not fit, None when it does"""
+        if value is None:
+            return None if self.null else 'the column is required'
+        if isinstance(value, decimal.Decimal) and not value.is_finite():
+            return 'not a finite number'
+        if self.lowest is not None and value < self.lowest:
+            return 'less than %s' % self.lowest
+        if self.highest is not None and value > self.highest:
+            return 'more than %s' % self.highest
+        if self.max_length is not None and len(value) > self.max_length:
+            return 'more than %d characters' % self.max_length
+        return None
+
+
+def column_check(column, field, connection=connection):
+    """The check of a csv column from the definition of its model field"""
+    if isinstance(field, models.DecimalField):
+        places = decimal.Decimal(10) ** -field.decimal_places
+        highest = decimal.Decimal(10) ** (field.max_digits - field.decimal_places) - places
+        return ColumnCheck(column, field, lowest=-highest, highest=highest)
+    if isinstance(field, models.IntegerField):
+        lowest, highest = connection.ops.integer_field_range(field.get_internal_type())
+        # SQLite has no integer ranges, but a CHECK constraint on the Positive fields
+        if lowest is None and isinstance(field, POSITIVE_FIELDS):
+            lowest = 0
+        return ColumnCheck(column, field, lowest=lowest, highest=highest)
+    if isinstance(field, models.CharField):
+        return ColumnCheck(column, field, max_length=field.max_length)
+    return ColumnCheck(column, field)
+
+
+class RowValidator:
+    """
+    Check batches of decoded csv rows against the constraints of the model
+    fields of their columns
+
+    invalid = RowValidator().errors(rows)
+    """
+
+    def __init__(self, connection=connection):
+        self.checks = []
+        for model, columns in (
+            (PlanetarySystem, PLANETARY_SYSTEM_COLUMNS),
+            (Star, STAR_COLUMNS),
+            (Planet, PLANET_COLUMNS),
+        ):
+            for field, index in columns:
+                self.checks.append(column_check(index, model._meta.get_field(field), connection))
+
+        # Lookup tables are names, the planets need the ones that are not null
+        for model, index, foreign_key in (
+            (SpectralType, SPECTRAL_TYPE_COLUMN, Star._meta.get_field('spectral_type')),
+            (DiscoveryMethod, DISCOVERY_METHOD_COLUMN, Planet._meta.get_field('discovery_method')),
+            (DiscoveryFacility, DISCOVERY_FACILITY_COLUMN, Planet._meta.get_field('discovery_facility')),
+            (SolutionType, SOLUTION_TYPE_COLUMN, Planet._meta.get_field('solution_type')),
+        ):
+            check = column_check(index, model._meta.get_field('name'), connection)
+            check.null = foreign_key.null
+            self.checks.append(check)
+
+        self.checks.sort(key=lambda check: check.column)
+
+    def errors(self, rows):
+        """
+        Check the rows column by column, return row index -> (column, value,
+        reason) of the first column that breaks a constraint, for the invalid
+        rows only
+        """
+        if not rows:
+            return {}
+        columns = list(zip(*rows))
+        invalid = {}
+        for check in self.checks:
+            for index, value, reason in check.errors(columns[check.column]):
+                # The checks are sorted, the first column of a row is kept
+                invalid.setdefault(index, (check.column, value, reason))
+        return invalid
+
+
+@functools.lru_cache(maxsize=None)
+def default_validator():
+    """The validator of the default database, built on first use"""
+    return RowValidator()
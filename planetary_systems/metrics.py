@@ -0,0 +1,262 @@
+"""
+Per request instrumentation: SQL query count, database time, template render
+time, response size and total time, kept as histograms per URL name in the
+process and exported in the Prometheus text format by MetricsView.
+
+Source: https://prometheus.io/docs/instrumenting/exposition_formats/
+Source: https://docs.djangoproject.com/en/3.1/topics/db/instrumentation/
+
+Only a sample of the requests is measured, settings.METRICS_SAMPLE_RATE
+(0 to 1, 1 by default). Every server process keeps its own histograms.
+
+Under ASGI the middleware is async like the views below it (see
+async_views.py), the queries they run in the threads of asyncdb.py are
+counted through the context of the request, see record_query.
+"""
+
+import asyncio
+import bisect
+import contextvars
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+# Seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+# Bytes
+SIZE_BUCKETS = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8)
+
+# URL name of the requests whose URL has no name
+UNNAMED = '<unnamed>'
+
+# RequestRecorder of the request being measured
+current_recorder = contextvars.ContextVar('current_recorder', default=None)
+
+
+class Histogram:
+    """Cumulative buckets, sum and count of the observed values per view"""
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.views = {}
+        self.lock = threading.Lock()
+
+    def observe(self, view, value):
+        with self.lock:
+            if view not in self.views:
+                self.views[view] = {'buckets': [0] * len(self.buckets), 'sum': 0, 'count': 0}
+            series = self.views[view]
+            # Values above the last bound only count in +Inf
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series['buckets'][index] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def render(self):
+        lines = [
+            '# HELP %s %s' % (self.name, self.help_text),
+            '# TYPE %s histogram' % self.name,
+        ]
+        with self.lock:
+            for view, series in sorted(self.views.items()):
+                label = 'view="%s"' % view.replace('\\', '\\\\').replace('"', '\\"')
+                cumulative = 0
+                for bound, count in zip(self.buckets, series['buckets']):
+                    cumulative += count
+                    lines.append('%s_bucket{%s,le="%s"} %d' % (self.name, label, format_bound(bound), cumulative))
+                lines.append('%s_bucket{%s,le="+Inf"} %d' % (self.name, label, series['count']))
+                lines.append('%s_sum{%s} %s' % (self.name, label, repr(float(series['sum']))))
+                lines.append('%s_count{%s} %d' % (self.name, label, series['count']))
+        return '\n'.join(lines)
+
+
+def format_bound(bound):
+    return repr(float(bound)) if bound != int(bound) else str(int(bound))
+
+
+REQUEST_DURATION = Histogram(
+    'planetary_systems_request_duration_seconds', 'Time to serve the request', DURATION_BUCKETS
+)
+DB_QUERIES = Histogram(
+    'planetary_systems_db_queries', 'SQL statements executed by the request', QUERY_BUCKETS
+)
+DB_DURATION = Histogram(
+    'planetary_systems_db_duration_seconds', 'Time spent in SQL statements', DURATION_BUCKETS
+)
+TEMPLATE_DURATION = Histogram(
+    'planetary_systems_template_render_seconds', 'Time to render the template response', DURATION_BUCKETS
+)
+RESPONSE_SIZE = Histogram(
+    'planetary_systems_response_size_bytes', 'Size of the response body', SIZE_BUCKETS
+)
+
+HISTOGRAMS = (REQUEST_DURATION, DB_QUERIES, DB_DURATION, TEMPLATE_DURATION, RESPONSE_SIZE)
+
+
+def render_metrics():
+    return '\n'.join(histogram.render() for histogram in HISTOGRAMS) + '\n'
+
+
+class RequestRecorder:
+    """
+    Count the SQL statements and their time while it is entered, on every
+    thread that runs code of the request (see record_query)
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.db_duration = 0
+        self.template_duration = None
+        self.size = 0
+        self.token = None
+        # The queries of an async view run in several threads at once
+        self.lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            with self.lock:
+                self.db_duration += time.perf_counter() - start
+                self.queries += 1
+
+    def __enter__(self):
+        # The connections opened later are wrapped by the connection_created signal
+        for connection in connections.all():
+            wrap_connection(connection)
+        self.token = current_recorder.set(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        current_recorder.reset(self.token)
+
+    def observe(self, view):
+        REQUEST_DURATION.observe(view, time.perf_counter() - self.start)
+        DB_QUERIES.observe(view, self.queries)
+        DB_DURATION.observe(view, self.db_duration)
+        if self.template_duration is not None:
+            TEMPLATE_DURATION.observe(view, self.template_duration)
+        RESPONSE_SIZE.observe(view, self.size)
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Execute wrapper of every connection: the statement counts for the request
+    of the context. The context goes with the code of the request to the
+    other threads (sync_to_async, asyncdb.py), their connections are not the
+    ones of the request thread.
+    """
+    recorder = current_recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+def wrap_connection(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+connection_created.connect(wrap_connection)
+
+
+def url_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return (match and match.url_name) or UNNAMED
+
+
+class RequestMetricsMiddleware:
+    """
+    Measure a sample of the requests. Streaming responses are measured until
+    their last chunk is sent, with the queries run while they stream.
+
+    Sync and async: with only sync middleware in the chain, Django runs every
+    async view of an ASGI server through the one thread of the sync code.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Awaited by the handler, like the MiddlewareMixin of Django
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    @property
+    def sample_rate(self):
+        return getattr(settings, 'METRICS_SAMPLE_RATE', 1)
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        recorder = RequestRecorder()
+        request.metrics_recorder = recorder
+        with recorder:
+            response = self.get_response(request)
+        return self.measure(request, response, recorder)
+
+    async def __acall__(self, request):
+        if random.random() >= self.sample_rate:
+            return await self.get_response(request)
+
+        recorder = RequestRecorder()
+        request.metrics_recorder = recorder
+        with recorder:
+            response = await self.get_response(request)
+        return self.measure(request, response, recorder)
+
+    def measure(self, request, response, recorder):
+        if getattr(response, 'is_async', False):
+            response.streaming_content = self.astream(response.streaming_content, recorder, url_name(request))
+        elif response.streaming:
+            response.streaming_content = self.stream(response.streaming_content, recorder, url_name(request))
+        else:
+            recorder.size = len(response.content)
+            recorder.observe(url_name(request))
+        return response
+
+    def stream(self, content, recorder, view):
+        try:
+            with recorder:
+                for chunk in content:
+                    recorder.size += len(chunk)
+                    yield chunk
+        finally:
+            recorder.observe(view)
+
+    async def astream(self, content, recorder, view):
+        """stream() of the async streaming responses, see streaming.py"""
+        try:
+            with recorder:
+                async for chunk in content:
+                    recorder.size += len(chunk)
+                    yield chunk
+        finally:
+            recorder.observe(view)
+
+    def process_template_response(self, request, response):
+        """Runs just before the response is rendered, the callback right after"""
+        recorder = getattr(request, 'metrics_recorder', None)
+        if recorder is not None:
+            start = time.perf_counter()
+
+            def rendered(response):
+                recorder.template_duration = time.perf_counter() - start
+
+            response.add_post_render_callback(rendered)
+        return response
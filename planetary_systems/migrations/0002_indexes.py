@@ -0,0 +1,53 @@
+# Generated by Django 3.1.5 on 2026-10-18 16:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planetary_systems', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='discoveryfacility',
+            name='name',
+            field=models.CharField(max_length=255, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='discoverymethod',
+            name='name',
+            field=models.CharField(max_length=255, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='solutiontype',
+            name='name',
+            field=models.CharField(max_length=255, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='spectraltype',
+            name='name',
+            field=models.CharField(max_length=20, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='planet',
+            index=models.Index(fields=['name', 'publication_reference'], name='planet_name_reference_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='planet',
+            index=models.Index(fields=['discovery_year', 'discovery_method'], name='planet_year_method_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='planet',
+            index=models.Index(fields=['orbital_period'], name='planet_orbital_period_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='planetarysystem',
+            index=models.Index(fields=['name'], name='planetarysystem_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='planetarysystem',
+            index=models.Index(fields=['distance'], name='planetarysystem_distance_idx'),
+        ),
+    ]
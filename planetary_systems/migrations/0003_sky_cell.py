@@ -0,0 +1,60 @@
+# Generated by Django 3.1.5 on 2026-10-18 16:59
+
+import math
+
+from django.db import migrations, models
+
+# A frozen copy of the cell numbering of planetary_systems/sky.py: the
+# migration must not change when sky.py does
+
+BAND_HEIGHT = 1.0
+
+BANDS = int(round(180 / BAND_HEIGHT))
+
+
+def band_cells(band):
+    center = math.radians(-90 + (band + 0.5) * BAND_HEIGHT)
+    return max(1, int(round(360 * math.cos(center) / BAND_HEIGHT)))
+
+
+CELLS = [band_cells(band) for band in range(BANDS)]
+
+OFFSETS = [sum(CELLS[:band]) for band in range(BANDS)]
+
+
+def sky_cell(ra, dec):
+    if ra is None or dec is None:
+        return None
+    band = min(BANDS - 1, max(0, int((float(dec) + 90) // BAND_HEIGHT)))
+    cells = CELLS[band]
+    index = min(cells - 1, int(float(ra) % 360 / 360 * cells))
+    return OFFSETS[band] + index
+
+
+def compute_sky_cells(apps, schema_editor):
+    """The sky cell of the planetary systems already loaded"""
+    PlanetarySystem = apps.get_model('planetary_systems', 'PlanetarySystem')
+    systems = list(PlanetarySystem.objects.only('id', 'right_ascension_decimal', 'declination_decimal'))
+    for system in systems:
+        system.sky_cell = sky_cell(system.right_ascension_decimal, system.declination_decimal)
+    PlanetarySystem.objects.bulk_update(systems, ['sky_cell'], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planetary_systems', '0002_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='planetarysystem',
+            name='sky_cell',
+            field=models.PositiveIntegerField(help_text='Cell of the sky index, for cone searches', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='planetarysystem',
+            index=models.Index(fields=['sky_cell'], name='planetarysystem_sky_cell_idx'),
+        ),
+        migrations.RunPython(compute_sky_cells, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 3.1.5 on 2026-10-18 17:00
+
+from django.db import migrations, models
+import planetary_systems.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planetary_systems', '0003_sky_cell'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlanetarySystemsPerFacility',
+            fields=[
+                ('id', planetary_systems.models.UnsignedAutoField(primary_key=True, serialize=False, unique=True)),
+                ('discovery_facility', models.CharField(max_length=255, unique=True)),
+                ('planetary_systems', models.PositiveIntegerField()),
+                ('row_updated_on', models.DateTimeField(auto_now=True, help_text='Date and time when the register was updated')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PlanetarySystemsPerPlanetCount',
+            fields=[
+                ('id', planetary_systems.models.UnsignedAutoField(primary_key=True, serialize=False, unique=True)),
+                ('number_of_planets', models.PositiveSmallIntegerField(unique=True)),
+                ('planetary_systems', models.PositiveIntegerField()),
+                ('row_updated_on', models.DateTimeField(auto_now=True, help_text='Date and time when the register was updated')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PlanetsPerMethodYear',
+            fields=[
+                ('id', planetary_systems.models.UnsignedAutoField(primary_key=True, serialize=False, unique=True)),
+                ('discovery_method', models.CharField(max_length=255)),
+                ('discovery_year', models.PositiveSmallIntegerField()),
+                ('planets', models.PositiveIntegerField()),
+                ('row_updated_on', models.DateTimeField(auto_now=True, help_text='Date and time when the register was updated')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='planetspermethodyear',
+            constraint=models.UniqueConstraint(fields=('discovery_method', 'discovery_year'), name='method_year_unique'),
+        ),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 3.1.5 on 2026-10-18 17:11
+
+from django.db import migrations, models
+import django.db.models.deletion
+import planetary_systems.models
+
+
+def update_statistics(apps, schema_editor):
+    """
+    The planner statistics of the new retired_in indexes. A frozen copy of
+    versions.update_statistics on the historical models: the migration must
+    not change when versions.py does.
+    """
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute('ANALYZE TABLE ' + ', '.join(
+                connection.ops.quote_name(apps.get_model('planetary_systems', name)._meta.db_table)
+                for name in ('PlanetarySystem', 'Star', 'Planet')
+            ))
+            cursor.fetchall()
+        else:
+            cursor.execute('ANALYZE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planetary_systems', '0004_summaries'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoadRun',
+            fields=[
+                ('id', planetary_systems.models.UnsignedAutoField(primary_key=True, serialize=False, unique=True)),
+                ('file', models.CharField(max_length=255)),
+                ('file_sha256', models.CharField(max_length=64)),
+                ('mode', models.CharField(max_length=10)),
+                ('engine', models.CharField(max_length=10)),
+                ('started_on', models.DateTimeField(help_text='Date and time when the load started')),
+                ('loaded_on', models.DateTimeField(help_text='Date and time when the rows were written', null=True)),
+                ('finished_on', models.DateTimeField(help_text='Date and time when the summaries and the snapshot were rebuilt', null=True)),
+                ('planetary_systems', models.PositiveIntegerField(null=True)),
+                ('stars', models.PositiveIntegerField(null=True)),
+                ('planets', models.PositiveIntegerField(null=True)),
+                ('planets_introduced', models.PositiveIntegerField(null=True)),
+                ('planets_retired', models.PositiveIntegerField(null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='planet',
+            name='introduced_in',
+            field=models.ForeignKey(help_text='Load that inserted the row, empty before the first recorded load', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='planet_introduced_in', to='planetary_systems.loadrun'),
+        ),
+        migrations.AddField(
+            model_name='planet',
+            name='retired_in',
+            field=models.ForeignKey(help_text='Load that removed or replaced the row, empty while it is current', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='planet_retired_in', to='planetary_systems.loadrun'),
+        ),
+        migrations.AddField(
+            model_name='planetarysystem',
+            name='introduced_in',
+            field=models.ForeignKey(help_text='Load that inserted the row, empty before the first recorded load', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='planetary_system_introduced_in', to='planetary_systems.loadrun'),
+        ),
+        migrations.AddField(
+            model_name='planetarysystem',
+            name='retired_in',
+            field=models.ForeignKey(help_text='Load that removed or replaced the row, empty while it is current', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='planetary_system_retired_in', to='planetary_systems.loadrun'),
+        ),
+        migrations.AddField(
+            model_name='star',
+            name='introduced_in',
+            field=models.ForeignKey(help_text='Load that inserted the row, empty before the first recorded load', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='star_introduced_in', to='planetary_systems.loadrun'),
+        ),
+        migrations.AddField(
+            model_name='star',
+            name='retired_in',
+            field=models.ForeignKey(help_text='Load that removed or replaced the row, empty while it is current', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='star_retired_in', to='planetary_systems.loadrun'),
+        ),
+        migrations.RunPython(update_statistics, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 3.1.5 on 2026-10-18 17:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planetary_systems', '0005_versions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='loadrun',
+            name='byte_offset',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='loadrun',
+            name='checkpointed_on',
+            field=models.DateTimeField(help_text='Date and time of the last committed batch', null=True),
+        ),
+        migrations.AddField(
+            model_name='loadrun',
+            name='line_number',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='loadrun',
+            name='reject_file',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='loadrun',
+            name='rows_read',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='loadrun',
+            name='rows_rejected',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -7,13 +7,120 @@ from django.db import models
 # Generate custom field for primary key
 # https://docs.djangoproject.com/en/3.1/howto/custom-model-fields/#custom-database-types
 # https://stackoverflow.com/a/56306262/9655579
+# Other databases (SQLite in the tests) keep the default AutoField types
 class UnsignedAutoField(models.AutoField):
     def db_type(self, connection):
+        if connection.vendor != 'mysql':
+            return super().db_type(connection)
         return 'INT(10) UNSIGNED ZEROFILL AUTO_INCREMENT'
 
     def rel_db_type(self, connection):
+        if connection.vendor != 'mysql':
+            return super().rel_db_type(connection)
         return 'INT(10) UNSIGNED ZEROFILL'
 
+# Dataset versions: every load is a LoadRun, the rows of the catalog are
+# stamped with the run that introduced them and the one that retired them.
+# A retired row is kept, so the catalog of any version can be queried.
+class LoadRun(models.Model):
+
+    # The version number of the dataset
+    id = UnsignedAutoField(
+        unique=True,
+        primary_key=True
+    )
+
+    file = models.CharField(
+        max_length=255
+    )
+
+    file_sha256 = models.CharField(
+        max_length=64
+    )
+
+    # many_load options
+    mode = models.CharField(
+        max_length=10
+    )
+
+    engine = models.CharField(
+        max_length=10
+    )
+
+    started_on = models.DateTimeField(
+        help_text="Date and time when the load started"
+    )
+
+    loaded_on = models.DateTimeField(
+        null=True,
+        help_text="Date and time when the rows were written"
+    )
+
+    # Empty while the load runs or when it failed
+    finished_on = models.DateTimeField(
+        null=True,
+        help_text="Date and time when the summaries and the snapshot were rebuilt"
+    )
+
+    # Current rows after the load
+    planetary_systems = models.PositiveIntegerField(
+        null=True
+    )
+
+    stars = models.PositiveIntegerField(
+        null=True
+    )
+
+    planets = models.PositiveIntegerField(
+        null=True
+    )
+
+    # Planets introduced and retired by the load, a changed planet is both
+    planets_introduced = models.PositiveIntegerField(
+        null=True
+    )
+
+    planets_retired = models.PositiveIntegerField(
+        null=True
+    )
+
+    # Checkpoint: the rows of the file before it are committed, a resumed
+    # load continues from there
+    byte_offset = models.PositiveBigIntegerField(
+        default=0
+    )
+
+    line_number = models.PositiveIntegerField(
+        default=0
+    )
+
+    rows_read = models.PositiveIntegerField(
+        default=0
+    )
+
+    rows_rejected = models.PositiveIntegerField(
+        default=0
+    )
+
+    checkpointed_on = models.DateTimeField(
+        null=True,
+        help_text="Date and time of the last committed batch"
+    )
+
+    # Csv file of the rows that could not be loaded, with the reasons
+    reject_file = models.CharField(
+        max_length=255,
+        blank=True
+    )
+
+
+class CurrentManager(models.Manager):
+    """The rows of the latest version, the retired ones are left out"""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(retired_in__isnull=True)
+
+
 class PlanetarySystem(models.Model):
 
     id = UnsignedAutoField(
@@ -59,6 +166,12 @@ class PlanetarySystem(models.Model):
         decimal_places=10
     )
 
+    # Cell of the sky index, computed from ra and dec by the loader (see sky.py)
+    sky_cell = models.PositiveIntegerField(
+        null=True,
+        help_text="Cell of the sky index, for cone searches"
+    )
+
     # sy_dist
     distance = models.DecimalField(
         max_digits=23,
@@ -143,6 +256,27 @@ class PlanetarySystem(models.Model):
         null=True
     )
 
+    # Dataset versions, see LoadRun
+    introduced_in = models.ForeignKey(
+        LoadRun,
+        on_delete=models.PROTECT,
+        related_name='planetary_system_introduced_in',
+        null=True,
+        help_text="Load that inserted the row, empty before the first recorded load"
+    )
+
+    retired_in = models.ForeignKey(
+        LoadRun,
+        on_delete=models.PROTECT,
+        related_name='planetary_system_retired_in',
+        null=True,
+        help_text="Load that removed or replaced the row, empty while it is current"
+    )
+
+    # The default manager only sees the current rows
+    objects = CurrentManager()
+    all_versions = models.Manager()
+
     row_created_on = models.DateTimeField(
         auto_now_add=True,
         help_text="Date and time when the register was created"
@@ -153,6 +287,27 @@ class PlanetarySystem(models.Model):
         help_text="Date and time when the register was updated"
     )
 
+    # Source: https://docs.djangoproject.com/en/3.1/ref/models/indexes/
+    class Meta:
+        indexes = [
+            # A name has a row per publication, not unique
+            models.Index(fields=['name'], name='planetarysystem_name_idx'),
+            # Range filters
+            models.Index(fields=['distance'], name='planetarysystem_distance_idx'),
+            # Cone searches
+            models.Index(fields=['sky_cell'], name='planetarysystem_sky_cell_idx'),
+        ]
+
+    @property
+    def catalog_rows(self):
+        """
+        (star, planet) of every row of the catalog pages, from the stars and
+        planets lists of the planetary system tree (see queries.py). A
+        planetary system without stars or planets keeps a row, with None on
+        the missing side, like the LEFT JOIN of the original page.
+        """
+        return [(star, planet) for planet in self.planets or [None] for star in self.stars or [None]]
+
 class SpectralType(models.Model):
 
     id = UnsignedAutoField(
@@ -162,7 +317,8 @@ class SpectralType(models.Model):
 
     # st_spectype
     name = models.CharField(
-        max_length=20
+        max_length=20,
+        unique=True
     )
 
     row_created_on = models.DateTimeField(
@@ -366,6 +522,27 @@ class Star(models.Model):
         null=True
     )
 
+    # Dataset versions, see LoadRun
+    introduced_in = models.ForeignKey(
+        LoadRun,
+        on_delete=models.PROTECT,
+        related_name='star_introduced_in',
+        null=True,
+        help_text="Load that inserted the row, empty before the first recorded load"
+    )
+
+    retired_in = models.ForeignKey(
+        LoadRun,
+        on_delete=models.PROTECT,
+        related_name='star_retired_in',
+        null=True,
+        help_text="Load that removed or replaced the row, empty while it is current"
+    )
+
+    # The default manager only sees the current rows
+    objects = CurrentManager()
+    all_versions = models.Manager()
+
     row_created_on = models.DateTimeField(
         auto_now_add=True,
         help_text="Date and time when the register was created"
@@ -385,7 +562,8 @@ class DiscoveryMethod(models.Model):
 
     # discoverymethod
     name = models.CharField(
-        max_length=255
+        max_length=255,
+        unique=True
     )
 
     row_created_on = models.DateTimeField(
@@ -407,7 +585,8 @@ class DiscoveryFacility(models.Model):
 
     # disc_facility
     name = models.CharField(
-        max_length=255
+        max_length=255,
+        unique=True
     )
 
     row_created_on = models.DateTimeField(
@@ -429,7 +608,8 @@ class SolutionType(models.Model):
 
     # soltype
     name = models.CharField(
-        max_length=255
+        max_length=255,
+        unique=True
     )
 
     row_created_on = models.DateTimeField(
@@ -754,6 +934,27 @@ class Planet(models.Model):
         related_name='planet_solution_type'
     )
 
+    # Dataset versions, see LoadRun
+    introduced_in = models.ForeignKey(
+        LoadRun,
+        on_delete=models.PROTECT,
+        related_name='planet_introduced_in',
+        null=True,
+        help_text="Load that inserted the row, empty before the first recorded load"
+    )
+
+    retired_in = models.ForeignKey(
+        LoadRun,
+        on_delete=models.PROTECT,
+        related_name='planet_retired_in',
+        null=True,
+        help_text="Load that removed or replaced the row, empty while it is current"
+    )
+
+    # The default manager only sees the current rows
+    objects = CurrentManager()
+    all_versions = models.Manager()
+
     row_created_on = models.DateTimeField(
         auto_now_add=True,
         help_text="Date and time when the register was created"
@@ -763,3 +964,82 @@ class Planet(models.Model):
         auto_now=True,
         help_text="Date and time when the register was updated"
     )
+
+    # Source: https://docs.djangoproject.com/en/3.1/ref/models/indexes/
+    class Meta:
+        indexes = [
+            # Natural key matched by the delta loader, a planet has a row per
+            # solution so it is not unique
+            models.Index(fields=['name', 'publication_reference'], name='planet_name_reference_idx'),
+            # Year filters, and covering for the planets per year and method
+            models.Index(fields=['discovery_year', 'discovery_method'], name='planet_year_method_idx'),
+            # Range filters
+            models.Index(fields=['orbital_period'], name='planet_orbital_period_idx'),
+        ]
+
+# Summary tables, computed from the tables above after every load (see summaries.py)
+# The lookup names are copied, not referenced, so the loader can replace
+# the lookup tables
+
+class PlanetsPerMethodYear(models.Model):
+
+    id = UnsignedAutoField(
+        unique=True,
+        primary_key=True
+    )
+
+    discovery_method = models.CharField(
+        max_length=255
+    )
+
+    discovery_year = models.PositiveSmallIntegerField()
+
+    planets = models.PositiveIntegerField()
+
+    row_updated_on = models.DateTimeField(
+        auto_now=True,
+        help_text="Date and time when the register was updated"
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['discovery_method', 'discovery_year'], name='method_year_unique'),
+        ]
+
+class PlanetarySystemsPerFacility(models.Model):
+
+    id = UnsignedAutoField(
+        unique=True,
+        primary_key=True
+    )
+
+    discovery_facility = models.CharField(
+        max_length=255,
+        unique=True
+    )
+
+    # Planetary systems with at least one planet discovered by the facility
+    planetary_systems = models.PositiveIntegerField()
+
+    row_updated_on = models.DateTimeField(
+        auto_now=True,
+        help_text="Date and time when the register was updated"
+    )
+
+class PlanetarySystemsPerPlanetCount(models.Model):
+
+    id = UnsignedAutoField(
+        unique=True,
+        primary_key=True
+    )
+
+    number_of_planets = models.PositiveSmallIntegerField(
+        unique=True
+    )
+
+    planetary_systems = models.PositiveIntegerField()
+
+    row_updated_on = models.DateTimeField(
+        auto_now=True,
+        help_text="Date and time when the register was updated"
+    )
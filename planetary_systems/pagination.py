@@ -0,0 +1,111 @@
+"""
+Keyset (seek) pagination
+
+A page starts after the keys of the last row of the previous page, so the
+database seeks on an index instead of counting OFFSET rows, and every page
+costs the same whatever the size of the table.
+
+Source: https://use-the-index-luke.com/no-offset
+"""
+
+from django.db.models import Q
+from django.http import Http404
+
+CURSOR_SEPARATOR = '-'
+
+
+def encode_cursor(values):
+    return CURSOR_SEPARATOR.join(str(value) for value in values)
+
+
+def decode_cursor(cursor, length):
+    """Cursors are the integer keys of a row, an invalid cursor is a 404 like an invalid page"""
+    try:
+        values = [int(value) for value in cursor.split(CURSOR_SEPARATOR)]
+    except ValueError:
+        raise Http404('Invalid cursor %r' % cursor)
+    if len(values) != length:
+        raise Http404('Invalid cursor %r' % cursor)
+    return values
+
+
+def seek(keys, values, after=True):
+    """
+    Rows after (or before) the values in the keys order:
+    k1 > v1 OR (k1 = v1 AND k2 > v2) OR ...
+    """
+    lookup = 'gt' if after else 'lt'
+    condition = Q()
+    for position, key in enumerate(keys):
+        equal = {previous: values[index] for index, previous in enumerate(keys[:position])}
+        condition |= Q(**equal, **{'%s__%s' % (key, lookup): values[position]})
+    return condition
+
+
+class KeysetPage:
+
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """
+    Paginate a queryset ordered by the keys, which together must be unique
+    for every row. Rows are dicts (values() querysets) or model instances.
+    """
+
+    def __init__(self, queryset, keys, page_size):
+        self.queryset = queryset
+        self.keys = tuple(keys)
+        self.page_size = page_size
+
+    def row_keys(self, row):
+        if isinstance(row, dict):
+            return [row[key] for key in self.keys]
+        return [getattr(row, key) for key in self.keys]
+
+    def page(self, after=None, before=None):
+        """The page after the `after` cursor, before the `before` cursor or the first page"""
+        queryset = self.queryset
+        backwards = before is not None
+
+        if backwards:
+            queryset = queryset.filter(seek(self.keys, decode_cursor(before, len(self.keys)), after=False))
+            queryset = queryset.order_by(*('-%s' % key for key in self.keys))
+        else:
+            if after is not None:
+                queryset = queryset.filter(seek(self.keys, decode_cursor(after, len(self.keys))))
+            queryset = queryset.order_by(*self.keys)
+
+        # One more row tells if there is a page further on
+        rows = list(queryset[:self.page_size + 1])
+        more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if backwards:
+            rows.reverse()
+
+        if not rows:
+            return KeysetPage(rows, None, None)
+
+        first = encode_cursor(self.row_keys(rows[0]))
+        last = encode_cursor(self.row_keys(rows[-1]))
+        if backwards:
+            return KeysetPage(rows, next_cursor=last, previous_cursor=first if more else None)
+        return KeysetPage(rows, next_cursor=last if more else None, previous_cursor=first if after else None)
@@ -0,0 +1,129 @@
+"""
+Query layer of the planetary systems pages
+
+Source: https://docs.djangoproject.com/en/3.1/ref/models/querysets/#prefetch-objects
+"""
+
+from django.db.models import Prefetch, prefetch_related_objects
+
+from .models import (
+    PlanetarySystem,
+    SpectralType,
+    Star,
+    DiscoveryMethod,
+    DiscoveryFacility,
+    SolutionType,
+    Planet
+)
+
+# Lookup tables of the foreign keys of the stars and planets
+STAR_LOOKUPS = {'spectral_type': SpectralType}
+PLANET_LOOKUPS = {
+    'discovery_method': DiscoveryMethod,
+    'discovery_facility': DiscoveryFacility,
+    'solution_type': SolutionType,
+}
+
+
+def stars_with_lookups():
+    return Star.objects.select_related('spectral_type').order_by('id')
+
+
+def planets_with_lookups():
+    return Planet.objects.select_related(
+        'discovery_method',
+        'discovery_facility',
+        'solution_type'
+    ).order_by('id')
+
+
+def tree_prefetches():
+    """system.stars and system.planets lists, with the lookup names joined to their rows"""
+    return (
+        Prefetch('star_planetary_system', queryset=stars_with_lookups(), to_attr='stars'),
+        Prefetch('planet_planetary_system', queryset=planets_with_lookups(), to_attr='planets'),
+    )
+
+
+def planetary_system_tree(queryset=None):
+    """
+    Planetary systems with their stars and planets, as a tree:
+    system.stars and system.planets are lists, and the lookup names are joined
+    to the star and planet rows.
+
+    Three queries (systems, stars, planets) whatever the number of rows,
+    instead of joining stars and planets together and grouping the
+    cartesian product away.
+    """
+    if queryset is None:
+        queryset = PlanetarySystem.objects.all()
+
+    return queryset.prefetch_related(*tree_prefetches())
+
+
+def planetary_system_tree_chunks(chunk_size, queryset=None):
+    """
+    Yield the planetary system tree in lists of chunk_size systems, to walk
+    the whole catalog with flat memory. Every chunk seeks after the id of the
+    last system of the previous one (iterator() does not bound memory on
+    MySQL, mysqlclient buffers the whole result) and is prefetched on its
+    own: three queries per chunk.
+    """
+    if queryset is None:
+        queryset = PlanetarySystem.objects.all()
+
+    queryset = queryset.order_by('id')
+    last = None
+    while True:
+        chunk = list((queryset if last is None else queryset.filter(id__gt=last))[:chunk_size])
+        if not chunk:
+            return
+        prefetch_related_objects(chunk, *tree_prefetches())
+        yield chunk
+        if len(chunk) < chunk_size:
+            return
+        last = chunk[-1].id
+
+def lookup_table(model):
+    """id -> row of a lookup table, a few hundred names at most"""
+    return model.objects.in_bulk()
+
+
+def lookup_names(model):
+    """id -> name of a lookup table"""
+    return dict(model.objects.values_list('id', 'name'))
+
+
+def system_stars(system_ids):
+    return list(Star.objects.filter(planetary_system_id__in=system_ids).order_by('id'))
+
+
+def system_planets(system_ids):
+    return list(Planet.objects.filter(planetary_system_id__in=system_ids).order_by('id'))
+
+
+def attach_tree(systems, stars, planets, lookups):
+    """
+    The planetary system tree of rows read apart, the same as
+    planetary_system_tree(): system.stars and system.planets lists, and the
+    rows of lookups (model -> id -> row) set on the stars and planets.
+    Each query reads one table, so they can run at the same time (see
+    async_views.py).
+    """
+    by_id = {}
+    for system in systems:
+        system.stars = []
+        system.planets = []
+        by_id[system.id] = system
+
+    for children, attribute, foreign_keys in (
+        (stars, 'stars', STAR_LOOKUPS),
+        (planets, 'planets', PLANET_LOOKUPS),
+    ):
+        for child in children:
+            system = by_id[child.planetary_system_id]
+            child.planetary_system = system
+            for name, model in foreign_keys.items():
+                setattr(child, name, lookups[model].get(getattr(child, '%s_id' % name)))
+            getattr(system, attribute).append(child)
+    return systems
@@ -0,0 +1,102 @@
+"""
+Sky index of the planetary systems for cone searches
+
+The sky is cut in declination bands of BAND_HEIGHT degrees, and every band
+in right ascension cells of about the same width, so all the cells cover
+about the same area (HEALPix-like, without the dependency). Cells are
+numbered band after band from the south pole, so the cells of a cone are a
+few ranges of numbers, one or two per band, matched on the indexed
+PlanetarySystem.sky_cell column. The exact angular distance is then checked
+on those candidates only.
+
+Changing BAND_HEIGHT renumbers the cells, the sky_cell column has to be
+computed again by a new migration (the one that added it keeps a frozen copy
+of this numbering).
+
+Source: https://en.wikipedia.org/wiki/Haversine_formula
+"""
+
+import bisect
+import math
+
+# Degrees
+BAND_HEIGHT = 1.0
+
+BANDS = int(round(180 / BAND_HEIGHT))
+
+
+def band_cells(band):
+    """Number of right ascension cells of a band, fewer near the poles"""
+    center = math.radians(-90 + (band + 0.5) * BAND_HEIGHT)
+    return max(1, int(round(360 * math.cos(center) / BAND_HEIGHT)))
+
+
+CELLS = [band_cells(band) for band in range(BANDS)]
+
+# First cell number of every band
+OFFSETS = [sum(CELLS[:band]) for band in range(BANDS)]
+
+
+def band_of(dec):
+    return min(BANDS - 1, max(0, int((dec + 90) // BAND_HEIGHT)))
+
+
+def sky_cell(ra, dec):
+    """Cell of a position in degrees, None when the position is unknown"""
+    if ra is None or dec is None:
+        return None
+    band = band_of(float(dec))
+    cells = CELLS[band]
+    index = min(cells - 1, int(float(ra) % 360 / 360 * cells))
+    return OFFSETS[band] + index
+
+
+def cell_center(cell):
+    """(ra, dec) of the center of a cell, to check the numbering"""
+    band = bisect.bisect_right(OFFSETS, cell) - 1
+    index = cell - OFFSETS[band]
+    return (index + 0.5) * 360 / CELLS[band], -90 + (band + 0.5) * BAND_HEIGHT
+
+
+def cone_cells(ra, dec, radius):
+    """
+    (first, last) cell ranges that cover the cone of radius degrees around the
+    position, some cells hold no point of the cone but no point is left out
+    """
+    # Right ascension half width of the cone, whole bands when it holds a pole
+    if abs(dec) + radius >= 90:
+        half_width = 180
+    else:
+        half_width = math.degrees(math.asin(
+            math.sin(math.radians(radius)) / math.cos(math.radians(dec))
+        ))
+
+    ranges = []
+    for band in range(band_of(dec - radius), band_of(dec + radius) + 1):
+        cells = CELLS[band]
+        offset = OFFSETS[band]
+        if half_width >= 180:
+            ranges.append((offset, offset + cells - 1))
+            continue
+
+        start = (ra - half_width) % 360
+        end = (ra + half_width) % 360
+        first = min(cells - 1, int(start / 360 * cells))
+        last = min(cells - 1, int(end / 360 * cells))
+        if start <= end:
+            ranges.append((offset + first, offset + last))
+        else:
+            # Across right ascension 0
+            ranges.append((offset + first, offset + cells - 1))
+            ranges.append((offset, offset + last))
+    return ranges
+
+
+def angular_distance(ra1, dec1, ra2, dec2):
+    """Great circle distance between two positions, in degrees"""
+    ra1, dec1, ra2, dec2 = (math.radians(float(value)) for value in (ra1, dec1, ra2, dec2))
+    haversine = (
+        math.sin((dec2 - dec1) / 2) ** 2
+        + math.cos(dec1) * math.cos(dec2) * math.sin((ra2 - ra1) / 2) ** 2
+    )
+    return math.degrees(2 * math.asin(min(1, math.sqrt(haversine))))
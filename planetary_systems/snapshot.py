@@ -0,0 +1,286 @@
+"""
+Columnar snapshot of the numeric columns of the planetary systems, stars and
+planets: one .npy file per column, memory-mapped when it is read, so the
+analytical queries run vectorized numpy filters and aggregates without
+going through the ORM, Decimal objects or the database.
+
+Source: https://numpy.org/doc/stable/reference/generated/numpy.load.html
+
+Nullable columns have a null mask next to their values, <column>.null.npy,
+True where the value is NULL. The *_err1, *_err2 and *_limit companions are
+columns like any other, measurement() returns them together.
+
+The snapshot is rebuilt by the loader after every load. numpy is optional,
+install it to build and read snapshots (see requirements.txt).
+"""
+
+import json
+import os
+import shutil
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import models
+from django.utils import timezone
+
+from .models import (
+    PlanetarySystem,
+    Star,
+    Planet
+)
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+SNAPSHOT_MODELS = (PlanetarySystem, Star, Planet)
+
+# File with the name of the current build, replaced atomically
+CURRENT = 'CURRENT'
+
+MANIFEST = 'manifest.json'
+
+# Rows read from the database at a time
+CHUNK_SIZE = 5000
+
+# Companions of a measurement column
+COMPANIONS = ('err1', 'err2', 'limit')
+
+LOOKUPS = ('exact', 'gt', 'gte', 'lt', 'lte', 'in', 'isnull')
+
+
+def require_numpy():
+    if numpy is None:
+        raise ImproperlyConfigured('The columnar snapshot needs numpy, pip install numpy')
+
+
+def snapshot_directory():
+    return str(getattr(settings, 'SNAPSHOT_DIR', settings.BASE_DIR / 'snapshot'))
+
+
+def column_dtype(field):
+    """numpy type of a field in the snapshot, None for the fields left out"""
+    if isinstance(field, models.DecimalField):
+        return 'float64'
+    if isinstance(field, models.BooleanField):
+        return 'bool'
+    if isinstance(field, (models.IntegerField, models.ForeignKey, models.AutoField)):
+        return 'int64'
+    return None
+
+
+def snapshot_fields(model):
+    return [field for field in model._meta.concrete_fields if column_dtype(field)]
+
+
+def read_columns(model, fields):
+    """
+    Read the fields of every row in id order, in chunks that seek on the id.
+    Return {attname: (values, nulls)}, nulls is None for NOT NULL fields.
+    """
+    names = [field.attname for field in fields]
+    chunks = {name: ([], []) for name in names}
+    queryset = model.objects.order_by('id').values_list(*names)
+
+    last = None
+    while True:
+        rows = list((queryset if last is None else queryset.filter(id__gt=last))[:CHUNK_SIZE])
+        if not rows:
+            break
+        for field, values in zip(fields, zip(*rows)):
+            dtype = column_dtype(field)
+            nulls = numpy.fromiter((value is None for value in values), 'bool', len(values))
+            chunks[field.attname][0].append(numpy.array(
+                [0 if value is None else value for value in values], dtype=dtype
+            ))
+            chunks[field.attname][1].append(nulls)
+        last = rows[-1][0]
+
+    columns = {}
+    for field in fields:
+        values, nulls = chunks[field.attname]
+        dtype = column_dtype(field)
+        values = numpy.concatenate(values) if values else numpy.zeros(0, dtype=dtype)
+        nulls = numpy.concatenate(nulls) if nulls else numpy.zeros(0, dtype='bool')
+        columns[field.attname] = (values, nulls if field.null else None)
+    return columns
+
+
+def write_table(model, path):
+    """Write the columns of a model to the path directory, return its manifest entry"""
+    os.makedirs(path)
+    fields = snapshot_fields(model)
+    # id is the first field of every model, read_columns seeks on it
+    columns = read_columns(model, fields)
+
+    manifest = {'rows': len(columns['id'][0]), 'columns': {}}
+    for field in fields:
+        values, nulls = columns[field.attname]
+        numpy.save(os.path.join(path, '%s.npy' % field.attname), values)
+        if nulls is not None:
+            numpy.save(os.path.join(path, '%s.null.npy' % field.attname), nulls)
+        manifest['columns'][field.attname] = {'dtype': str(values.dtype), 'null': nulls is not None}
+    return manifest
+
+
+def current_build(directory):
+    """The name of the current build, None before the first one"""
+    try:
+        with open(os.path.join(directory, CURRENT)) as fhand:
+            return fhand.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def build_snapshot(directory=None):
+    """
+    Write a new build of the snapshot and make it the current one.
+
+    A Snapshot loads its columns when they are first read, so the previous
+    build is kept for the readers opened before this one: only the older
+    builds are removed, a reader must not live across two rebuilds.
+    """
+    require_numpy()
+    directory = directory or snapshot_directory()
+    os.makedirs(directory, exist_ok=True)
+    previous = current_build(directory)
+
+    build = '%x' % time.time_ns()
+    path = os.path.join(directory, build)
+    try:
+        manifest = {'built_on': timezone.now().isoformat(), 'tables': {}}
+        for model in SNAPSHOT_MODELS:
+            name = model._meta.model_name
+            manifest['tables'][name] = write_table(model, os.path.join(path, name))
+        with open(os.path.join(path, MANIFEST), 'w') as fhand:
+            json.dump(manifest, fhand, indent=2)
+
+        current = os.path.join(directory, CURRENT)
+        with open(current + '.tmp', 'w') as fhand:
+            fhand.write(build)
+        os.replace(current + '.tmp', current)
+    except BaseException:
+        shutil.rmtree(path, ignore_errors=True)
+        raise
+
+    for entry in os.listdir(directory):
+        if entry not in (build, previous, CURRENT) and os.path.isdir(os.path.join(directory, entry)):
+            shutil.rmtree(os.path.join(directory, entry), ignore_errors=True)
+    return manifest
+
+
+class SnapshotTable:
+    """
+    Columns of one model. Filters return boolean arrays over the rows, which
+    the aggregates take as `where`; a NULL value never matches a comparison.
+    """
+
+    def __init__(self, path, manifest):
+        self.path = path
+        self.rows = manifest['rows']
+        self.columns = manifest['columns']
+        self.arrays = {}
+
+    def column(self, name):
+        """The values of a column as a masked array, NULL values are masked"""
+        if name not in self.columns:
+            raise KeyError('Unknown snapshot column %r' % name)
+        if name not in self.arrays:
+            values = numpy.load(os.path.join(self.path, '%s.npy' % name), mmap_mode='r')
+            mask = numpy.ma.nomask
+            if self.columns[name]['null']:
+                mask = numpy.load(os.path.join(self.path, '%s.null.npy' % name), mmap_mode='r')
+            self.arrays[name] = numpy.ma.MaskedArray(values, mask=mask)
+        return self.arrays[name]
+
+    def measurement(self, name):
+        """A column with its err1, err2 and limit companions, by suffix"""
+        arrays = {'value': self.column(name)}
+        for companion in COMPANIONS:
+            column = '%s_%s' % (name, companion)
+            if column in self.columns:
+                arrays[companion] = self.column(column)
+        return arrays
+
+    def where(self, **lookups):
+        """
+        Rows matching every lookup, written like the ORM ones:
+        where(orbital_period__lt=10, earth_mass__isnull=False)
+        """
+        selected = numpy.ones(self.rows, dtype='bool')
+        for lookup, value in lookups.items():
+            name, _, operator = lookup.partition('__')
+            operator = operator or 'exact'
+            if operator not in LOOKUPS:
+                raise ValueError('Unknown lookup %r' % lookup)
+
+            column = self.column(name)
+            nulls = numpy.ma.getmaskarray(column)
+            if operator == 'isnull':
+                selected &= nulls if value else ~nulls
+                continue
+
+            values = column.data
+            if operator == 'exact':
+                matches = values == value
+            elif operator == 'in':
+                matches = numpy.isin(values, list(value))
+            elif operator == 'gt':
+                matches = values > value
+            elif operator == 'gte':
+                matches = values >= value
+            elif operator == 'lt':
+                matches = values < value
+            else:
+                matches = values <= value
+            selected &= matches & ~nulls
+        return selected
+
+    def values(self, name, where=None):
+        """The not NULL values of a column in the selected rows"""
+        column = self.column(name)
+        if where is not None:
+            column = column[where]
+        return column.compressed()
+
+    def aggregate(self, name, where=None):
+        """count, sum, mean, min, max and std of the not NULL values of a column"""
+        values = self.values(name, where)
+        if not len(values):
+            return {'count': 0, 'sum': None, 'mean': None, 'min': None, 'max': None, 'std': None}
+        return {
+            'count': int(len(values)),
+            'sum': values.sum().item(),
+            'mean': values.mean().item(),
+            'min': values.min().item(),
+            'max': values.max().item(),
+            'std': values.std().item(),
+        }
+
+
+class Snapshot:
+    """
+    The current build of the snapshot, one table per model name:
+    Snapshot()['planet'].aggregate('earth_mass', where=...)
+    """
+
+    def __init__(self, directory=None):
+        require_numpy()
+        directory = directory or snapshot_directory()
+        build = current_build(directory)
+        if build is None:
+            raise FileNotFoundError('No snapshot in %s, run a load first' % directory)
+
+        self.path = os.path.join(directory, build)
+        with open(os.path.join(self.path, MANIFEST)) as fhand:
+            manifest = json.load(fhand)
+        self.built_on = manifest['built_on']
+        self.tables = {
+            name: SnapshotTable(os.path.join(self.path, name), table)
+            for name, table in manifest['tables'].items()
+        }
+
+    def __getitem__(self, name):
+        return self.tables[name]
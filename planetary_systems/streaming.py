@@ -0,0 +1,88 @@
+"""
+Streaming responses of the async views (see async_views.py) under the ASGI
+handler of Django 3.1
+
+Django 3.1 reads the body of a StreamingHttpResponse on the event loop: a
+body that queries while it is read raises SynchronousOnlyOperation there, and
+would hold the loop anyway. The body of AsyncStreamingHttpResponse is an async
+iterator whose parts are awaited, read in the thread pool of asyncdb.py, and
+the ASGIHandler of this module sends it. Django 4.2 does both by itself: its
+StreamingHttpResponse accepts async iterators and tells them apart with
+is_async, like the classes below.
+
+Source: https://docs.djangoproject.com/en/4.2/ref/request-response/#streaminghttpresponse-objects
+"""
+
+import django
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.handlers import asgi
+from django.http import StreamingHttpResponse
+
+
+class AsyncStreamingHttpResponse(StreamingHttpResponse):
+    """A StreamingHttpResponse of an async iterator of strings or bytes"""
+    is_async = True
+
+    @property
+    def streaming_content(self):
+        return self.encode(self._iterator)
+
+    @streaming_content.setter
+    def streaming_content(self, value):
+        # A middleware that wraps the content wraps it in an async iterator
+        # too (see metrics.py)
+        self._iterator = value.__aiter__()
+
+    async def encode(self, parts):
+        async for part in parts:
+            yield self.make_bytes(part)
+
+    async def read(self):
+        return [part async for part in self.streaming_content]
+
+    def __iter__(self):
+        # Read by sync code, the WSGI handler or the test client: the whole
+        # body at once
+        return iter(async_to_sync(self.read)())
+
+    def getvalue(self):
+        return b''.join(self)
+
+
+def response_headers(response):
+    """The headers and cookies of the response, as ASGI sends them"""
+    headers = []
+    for header, value in response.items():
+        if isinstance(header, str):
+            header = header.encode('ascii')
+        if isinstance(value, str):
+            value = value.encode('latin1')
+        headers.append((bytes(header), bytes(value)))
+    for cookie in response.cookies.values():
+        headers.append((b'Set-Cookie', cookie.output(header='').encode('ascii').strip()))
+    return headers
+
+
+class ASGIHandler(asgi.ASGIHandler):
+    """The ASGI handler of Django, awaiting the parts of AsyncStreamingHttpResponse"""
+
+    async def send_response(self, response, send):
+        if not getattr(response, 'is_async', False):
+            return await super().send_response(response, send)
+
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': response_headers(response),
+        })
+        async for part in response.streaming_content:
+            for chunk, _ in self.chunk_bytes(part):
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body'})
+        await sync_to_async(response.close, thread_sensitive=True)()
+
+
+def get_asgi_application():
+    """django.core.asgi.get_asgi_application() with the handler above"""
+    django.setup(set_prefix=False)
+    return ASGIHandler()
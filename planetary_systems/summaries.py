@@ -0,0 +1,156 @@
+"""
+Summary tables of the dashboards, refreshed by the loader after every load:
+
+    PlanetsPerMethodYear            planets per discovery method and year
+    PlanetarySystemsPerFacility     planetary systems per discovery facility
+    PlanetarySystemsPerPlanetCount  planetary systems per number_of_planets
+
+A planetary system has a row per publication, the systems are counted by
+name. A full load computes every summary again, a delta load only the
+groups of the rows it inserted, updated or deleted (SummaryChanges).
+"""
+
+from django.db import transaction
+from django.db.models import Count
+
+from .models import (
+    PlanetarySystem,
+    DiscoveryMethod,
+    DiscoveryFacility,
+    Planet,
+    PlanetsPerMethodYear,
+    PlanetarySystemsPerFacility,
+    PlanetarySystemsPerPlanetCount
+)
+
+
+class SummaryChanges:
+    """The summary groups touched by a delta load, before and after its writes"""
+
+    def __init__(self):
+        # (discovery_method_id, discovery_year)
+        self.method_years = set()
+        # discovery_facility_id
+        self.facilities = set()
+        # number_of_planets
+        self.planet_counts = set()
+
+    def add_planet(self, discovery_method_id, discovery_year, discovery_facility_id):
+        self.method_years.add((discovery_method_id, discovery_year))
+        self.facilities.add(discovery_facility_id)
+
+    def add_stored_planets(self, pks):
+        """The groups of stored planets, before they are updated or deleted"""
+        for values in Planet.objects.filter(id__in=pks).values_list(
+            'discovery_method_id', 'discovery_year', 'discovery_facility_id'
+        ):
+            self.add_planet(*values)
+
+    def add_stored_planetary_systems(self, pks):
+        """The groups of stored planetary systems, before they are deleted"""
+        self.planet_counts.update(
+            PlanetarySystem.objects.filter(id__in=pks).values_list('number_of_planets', flat=True)
+        )
+
+    def __bool__(self):
+        return bool(self.method_years or self.facilities or self.planet_counts)
+
+
+def planets_per_method_year(planets):
+    return [
+        PlanetsPerMethodYear(
+            discovery_method=row['discovery_method__name'],
+            discovery_year=row['discovery_year'],
+            planets=row['planets']
+        )
+        for row in planets.values('discovery_method__name', 'discovery_year').annotate(
+            planets=Count('id')
+        ).order_by()
+    ]
+
+
+def planetary_systems_per_facility(planets):
+    return [
+        PlanetarySystemsPerFacility(
+            discovery_facility=row['discovery_facility__name'],
+            planetary_systems=row['planetary_systems']
+        )
+        for row in planets.values('discovery_facility__name').annotate(
+            planetary_systems=Count('planetary_system__name', distinct=True)
+        ).order_by()
+    ]
+
+
+def planetary_systems_per_planet_count(systems):
+    return [
+        PlanetarySystemsPerPlanetCount(
+            number_of_planets=row['number_of_planets'],
+            planetary_systems=row['planetary_systems']
+        )
+        for row in systems.values('number_of_planets').annotate(
+            planetary_systems=Count('name', distinct=True)
+        ).order_by()
+    ]
+
+
+@transaction.atomic
+def refresh_summaries(changes=None):
+    """
+    Compute the summaries again, only the groups of the changes when given.
+    Return the number of summary rows written.
+    """
+    if changes is None:
+        summaries = (
+            (PlanetsPerMethodYear.objects.all(), planets_per_method_year(Planet.objects.all())),
+            (PlanetarySystemsPerFacility.objects.all(), planetary_systems_per_facility(Planet.objects.all())),
+            (PlanetarySystemsPerPlanetCount.objects.all(),
+             planetary_systems_per_planet_count(PlanetarySystem.objects.all())),
+        )
+    else:
+        summaries = changed_summaries(changes)
+
+    written = 0
+    for stale, rows in summaries:
+        stale.delete()
+        if rows:
+            type(rows[0]).objects.bulk_create(rows)
+            written += len(rows)
+    return written
+
+
+def changed_summaries(changes):
+    """(stale summary rows, fresh summary rows) of the changed groups"""
+    method_names = dict(DiscoveryMethod.objects.filter(
+        id__in={method_id for method_id, year in changes.method_years}
+    ).values_list('id', 'name'))
+    facility_names = list(DiscoveryFacility.objects.filter(
+        id__in=changes.facilities
+    ).values_list('name', flat=True))
+
+    # The groups of the changes, on the (discovery_year, discovery_method) index
+    method_years = {(method_names[method_id], year) for method_id, year in changes.method_years}
+    planets = Planet.objects.filter(
+        discovery_method_id__in=method_names,
+        discovery_year__in={year for method_id, year in changes.method_years}
+    )
+    fresh = [
+        row for row in planets_per_method_year(planets)
+        if (row.discovery_method, row.discovery_year) in method_years
+    ]
+    stale = PlanetsPerMethodYear.objects.none()
+    for name, year in method_years:
+        stale |= PlanetsPerMethodYear.objects.filter(discovery_method=name, discovery_year=year)
+
+    return (
+        (stale, fresh),
+        (
+            PlanetarySystemsPerFacility.objects.filter(discovery_facility__in=facility_names),
+            planetary_systems_per_facility(Planet.objects.filter(discovery_facility_id__in=changes.facilities)),
+        ),
+        (
+            PlanetarySystemsPerPlanetCount.objects.filter(number_of_planets__in=changes.planet_counts),
+            planetary_systems_per_planet_count(
+                PlanetarySystem.objects.filter(number_of_planets__in=changes.planet_counts)
+            ),
+        ),
+    )
@@ -1,3 +1,1252 @@
-from django.test import TestCase
+import csv
+import datetime
+import decimal
+import importlib.util
+import io
+import json
+import os
+import pathlib
+import shutil
+import tempfile
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+from unittest import mock
+
+from asgiref.sync import async_to_sync, sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.models import Count, Max
+from django.http import Http404, QueryDict
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.template.response import SimpleTemplateResponse
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from scripts import benchmark_load, benchmark_views, many_load
+
+from .async_views import (
+    AsyncCatalogExportView,
+    AsyncPlanetarySystemsListView,
+    AsyncPlanetApiListView,
+    AsyncStarApiDetailView
+)
+from .asyncdb import call_in_thread
+from .catalog import CatalogRows
+from .filters import filter_conditions
+from .sky import cone_cells
+from .caching import bump_dataset_version, cache_page, catalog_cache, page_key
+from .metrics import DB_QUERIES, TEMPLATE_DURATION, UNNAMED, RequestMetricsMiddleware
+from .loader import parallel
+from .loader.bulk import BulkLoader, INSERT_ORDER, clear_tables
+from .loader.checkpoint import CheckpointedLoader, RejectFile
+from .loader.columns import COLUMN_COUNT
+from .loader.delta import DeltaLoader
+from .loader.dimensions import DimensionCache
+from .loader.infile import StagingFile, infile_connection, infile_loader
+from .loader.reader import ArchiveReader, DecodeError
+from .loader.swap import ShadowLoad
+from .loader.synthetic import write_synthetic_archive
+from .pagination import KeysetPaginator
+from .models import (
+    PlanetarySystem,
+    DiscoveryMethod,
+    LoadRun,
+    Star,
+    Planet,
+    PlanetsPerMethodYear,
+    PlanetarySystemsPerFacility
+)
+from .snapshot import Snapshot, build_snapshot, numpy
+from .streaming import get_asgi_application
+from .summaries import refresh_summaries
+from .versions import as_of, introduced_since, record_load, resume_run, retired_since, start_run
+from .views import PlanetarySystemsStreamView
 
 # Create your tests here.
+
+
+def archive_row(number, system=None):
+    """A csv row of the planet number, filled with valid values"""
+    system = number if system is None else system
+    row = ['1'] * COLUMN_COUNT
+    row[0] = 'Planet %d b' % number
+    row[1] = 'Host %d' % system
+    row[2] = 'b'
+    row[3:7] = ['', '', 'TIC %d' % system, '']
+    row[10] = 'Transit'
+    row[11] = '2015'
+    row[12] = 'Kepler'
+    row[13] = 'Published Confirmed'
+    row[15] = 'Reference %d' % number
+    row[40] = 'Mass'
+    row[54] = 'Star reference %d' % system
+    row[55] = 'G2 V'
+    row[72] = '[Fe/H]'
+    row[77] = 'System reference %d' % system
+    row[78] = '19h00m00s'
+    row[79] = '285.0000000'
+    row[80] = '+40d00m00s'
+    row[81] = '40.0000000'
+    row[94] = '2020-01-01'
+    row[95] = '2020-01'
+    row[96] = '2020-01-01'
+    return row
+
+
+def write_archive(rows, comment_lines=1):
+    """Write the rows after a comment header, return the path of the file"""
+    fd, path = tempfile.mkstemp(suffix='.csv')
+    with os.fdopen(fd, 'w', newline='') as fhand:
+        fhand.write('# This file was produced by the NASA Exoplanet Archive\n')
+        for number in range(1, comment_lines):
+            fhand.write('# COLUMN column%d: description\n' % number)
+        writer = csv.writer(fhand)
+        writer.writerow(['column%d' % index for index in range(COLUMN_COUNT)])
+        writer.writerows(rows)
+    return path
+
+
+def load_archive(rows, loader=None):
+    """Load the rows from an archive file with the loader (a BulkLoader by default), return its counts"""
+    path = write_archive(rows)
+    try:
+        with ArchiveReader(path) as reader:
+            return (loader or BulkLoader()).load(reader)
+    finally:
+        os.remove(path)
+
+
+def load_synthetic_archive(planets, seed):
+    """Load a synthetic archive of the planets (see loader/synthetic.py), return the counts"""
+    fd, path = tempfile.mkstemp(suffix='.csv')
+    os.close(fd)
+    try:
+        write_synthetic_archive(path, planets, seed=seed)
+        with ArchiveReader(path) as reader:
+            return BulkLoader().load(reader)
+    finally:
+        os.remove(path)
+
+
+def inserts(queries, model):
+    """The INSERT statements of the model among the captured queries"""
+    table = connection.ops.quote_name(model._meta.db_table)
+    return [query for query in queries if query['sql'].startswith('INSERT INTO %s ' % table)]
+
+
+class BulkLoaderTest(TestCase):
+
+    def test_primary_keys_follow_the_stored_rows(self):
+        load_archive([archive_row(number) for number in range(2)])
+        last_id = PlanetarySystem.objects.aggregate(last_id=Max('id'))['last_id']
+
+        rows = [archive_row(number, system=10 + number // 2) for number in range(10, 15)]
+        with CaptureQueriesContext(connection) as queries:
+            counts = load_archive(rows, BulkLoader(batch_size=2))
+
+        self.assertEqual((counts['PlanetarySystem'], counts['Star'], counts['Planet']), (3, 3, 5))
+        self.assertEqual(
+            list(PlanetarySystem.objects.filter(id__gt=last_id).order_by('id').values_list('id', 'name')),
+            [(last_id + 1, 'Host 15'), (last_id + 2, 'Host 16'), (last_id + 3, 'Host 17')]
+        )
+        # The planets reference the keys assigned in memory
+        self.assertEqual(
+            sorted(Planet.objects.filter(planetary_system__name='Host 16').values_list('name', flat=True)),
+            ['Planet 12 b', 'Planet 13 b']
+        )
+        self.assertEqual(Star.objects.get(planetary_system__name='Host 17').planetary_system_id, last_id + 3)
+
+        # A flush every 2 planets, with the planetary systems they reference
+        self.assertEqual(len(inserts(queries, Planet)), 3)
+        self.assertEqual(len(inserts(queries, PlanetarySystem)), 3)
+
+
+class DimensionCacheTest(TestCase):
+
+    def test_names_are_read_once_and_new_ones_inserted_together(self):
+        transit = DiscoveryMethod.objects.create(name='Transit')
+        cache = DimensionCache(DiscoveryMethod)
+
+        # The table is read on the first name
+        with self.assertNumQueries(1):
+            ids = [cache.get(name) for name in ('Transit', 'Imaging', 'Transit', 'Imaging', None)]
+        self.assertEqual(ids[0], transit.pk)
+        self.assertEqual(ids[1], ids[3])
+        self.assertNotEqual(ids[1], transit.pk)
+        self.assertIsNone(ids[4])
+        self.assertEqual((cache.hits, cache.misses), (3, 1))
+        self.assertEqual(cache.stats(), 'DiscoveryMethod: 3 hits, 1 misses')
+
+        # Only the new name is inserted, with the key it was given
+        with self.assertNumQueries(1):
+            self.assertEqual(cache.flush(), 1)
+        self.assertEqual(
+            sorted(DiscoveryMethod.objects.values_list('name', 'id')),
+            [('Imaging', ids[1]), ('Transit', transit.pk)]
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(cache.flush(), 0)
+
+
+class ArchiveReaderTest(TestCase):
+
+    def test_rows_after_a_comment_header_of_any_length(self):
+        path = write_archive([archive_row(number) for number in range(2)], comment_lines=4)
+        self.addCleanup(os.remove, path)
+
+        with ArchiveReader(path) as reader:
+            rows = list(reader)
+            self.assertEqual(reader.comment_lines, 4)
+            self.assertEqual(reader.header[:2], ['column0', 'column1'])
+            # 4 comment lines, the column names and 2 rows
+            self.assertEqual((reader.line_number, reader.rows_read), (7, 2))
+
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][0], 'Planet 1 b')
+        self.assertEqual(rows[1][11], 2015)
+        self.assertEqual(rows[1][79], decimal.Decimal('285.0000000'))
+        self.assertEqual(rows[1][94], datetime.date(2020, 1, 1))
+        # An empty column is None
+        self.assertIsNone(rows[1][3])
+
+    def test_decode_error_has_the_line_and_column(self):
+        rows = [archive_row(number) for number in range(3)]
+        rows[1][11] = 'soon'
+        rows[2] = rows[2][:10]
+        path = write_archive(rows, comment_lines=3)
+        self.addCleanup(os.remove, path)
+
+        with ArchiveReader(path) as reader:
+            with self.assertRaisesMessage(DecodeError, "Line 6, column 11: invalid value 'soon'") as raised:
+                list(reader)
+        self.assertEqual((raised.exception.line_number, raised.exception.column), (6, 11))
+
+        rows[1] = archive_row(1)
+        path = write_archive(rows)
+        self.addCleanup(os.remove, path)
+        with ArchiveReader(path) as reader:
+            with self.assertRaisesMessage(DecodeError, 'expected %d columns' % COLUMN_COUNT):
+                list(reader)
+
+
+class DeltaLoaderTest(TestCase):
+
+    def test_only_the_changed_planets_are_written(self):
+        load_archive([archive_row(number) for number in range(4)])
+        unchanged = Planet.objects.get(name='Planet 0 b')
+
+        rows = [archive_row(number) for number in (0, 1, 3, 4)]
+        # Planet 1 b is updated, Planet 2 b removed and Planet 4 b added
+        rows[1][94] = '2021-01-01'
+        rows[2][10] = 'Imaging'
+        loader = DeltaLoader()
+        counts = load_archive(rows, loader)
+
+        self.assertEqual(loader.unchanged, 1)
+        self.assertEqual(loader.updated['Planet'], 2)
+        self.assertEqual(loader.deleted['Planet'], 1)
+        self.assertEqual(counts['Planet'], 1)
+        # The planetary system of the removed planet goes with it
+        self.assertEqual(loader.deleted['PlanetarySystem'], 1)
+
+        self.assertEqual(
+            sorted(Planet.objects.values_list('name', flat=True)),
+            ['Planet 0 b', 'Planet 1 b', 'Planet 3 b', 'Planet 4 b']
+        )
+        self.assertEqual(Planet.objects.get(name='Planet 0 b').row_updated_on, unchanged.row_updated_on)
+        self.assertEqual(Planet.objects.get(name='Planet 1 b').date_last_update, datetime.date(2021, 1, 1))
+        self.assertEqual(Planet.objects.get(name='Planet 3 b').discovery_method.name, 'Imaging')
+
+
+def table_rows():
+    """The rows of every table, without the timestamps of the load and the autoincrement keys of the planets"""
+    tables = {}
+    for model in INSERT_ORDER:
+        ordering = ('name', 'publication_reference') if model is Planet else ('id',)
+        rows = list(model._base_manager.order_by(*ordering).values())
+        for row in rows:
+            for field in ('row_created_on', 'row_updated_on'):
+                row.pop(field, None)
+            if model is Planet:
+                del row['id']
+        tables[model.__name__] = rows
+    return tables
+
+
+class ParallelLoaderTest(TransactionTestCase):
+    # The writers insert from other connections, the rows must be committed
+
+    def setUp(self):
+        rows = [archive_row(number, system=number // 3) for number in range(40)]
+        rows[5][10] = 'Imaging'
+        rows[7][55] = 'K1 V'
+        rows[9][15] = 'Reference, with a comma'
+        self.rows = rows
+        self.path = write_archive(rows)
+        self.addCleanup(os.remove, self.path)
+
+    def test_ranges_end_at_line_breaks(self):
+        start, lines = parallel.data_offset(self.path)
+        self.assertEqual(lines, 2)
+        with open(self.path, 'rb') as fhand:
+            data = fhand.read()
+
+        ranges = parallel.split_ranges(self.path, start, chunk_size=1000)
+        self.assertGreater(len(ranges), 5)
+        self.assertEqual((ranges[0][0], ranges[-1][1]), (start, len(data)))
+        for (first, end), (following, last) in zip(ranges, ranges[1:]):
+            self.assertEqual(end, following)
+            self.assertEqual(data[end - 1:end], b'\n')
+        # The 1000 bytes of the first range end inside a row, the range goes on to its end
+        self.assertNotEqual(data[start + 999:start + 1000], b'\n')
+        self.assertGreater(ranges[0][1], start + 1000)
+
+        parsed = [parallel.parse_range(self.path, first, end) for first, end in ranges]
+        self.assertEqual(
+            [row[0] for rows, rejected, line_count in parsed for row in rows],
+            ['Planet %d b' % number for number in range(40)]
+        )
+        self.assertEqual(sum(line_count for rows, rejected, line_count in parsed), 40)
+
+    def test_ranges_keep_quoted_line_breaks(self):
+        rows = [archive_row(number) for number in range(40)]
+        for row in rows[::2]:
+            row[15] = 'Reference\n' + 'over three lines, ' * 10 + '\nthe end'
+        path = write_archive(rows)
+        self.addCleanup(os.remove, path)
+
+        start, lines = parallel.data_offset(path)
+        ranges = parallel.split_ranges(path, start, chunk_size=500)
+        self.assertGreater(len(ranges), 5)
+        parsed = [parallel.parse_range(path, first, end) for first, end in ranges]
+
+        self.assertEqual([rejected for rows, rejected, line_count in parsed if rejected], [])
+        self.assertEqual(
+            [(row[0], row[15]) for rows, rejected, line_count in parsed for row in rows],
+            [('Planet %d b' % number, row[15]) for number, row in enumerate(rows)]
+        )
+        # A row over three lines
+        self.assertEqual(sum(line_count for rows, rejected, line_count in parsed), 80)
+
+    def test_same_rows_as_the_serial_loader(self):
+        with ArchiveReader(self.path) as reader:
+            BulkLoader(batch_size=7).load(reader)
+        serial = table_rows()
+        clear_tables()
+
+        # The parsers are processes, the writers threads of the test process:
+        # a writer process would open the SQLite file, not the in-memory test database
+        pools = [parallel.process_pool(2), ThreadPoolExecutor(1)]
+        with mock.patch.object(parallel, 'process_pool', side_effect=pools):
+            loader = parallel.ParallelLoader(batch_size=7, workers=2, chunk_size=1000)
+            counts = loader.load_file(self.path)
+
+        self.assertEqual(loader.rows_read, 40)
+        self.assertEqual((counts['PlanetarySystem'], counts['Planet']), (14, 40))
+        self.assertEqual(table_rows(), serial)
+
+
+class InfileLoaderTest(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def staged(self, model, objects):
+        """The values of the staging file lines of the objects"""
+        staging_file = StagingFile(model, self.directory)
+        staging_file.write(objects, '2021-01-08 12:13:30')
+        staging_file.close()
+        self.assertEqual(staging_file.count, len(objects))
+        with open(staging_file.path, newline='', encoding='utf-8') as fhand:
+            lines = fhand.read().split('\n')
+        self.assertEqual(lines.pop(), '')
+        return [dict(zip(staging_file.columns, line.split('\t'))) for line in lines]
+
+    def test_staging_file_escapes_and_nulls(self):
+        [method] = self.staged(DiscoveryMethod, [DiscoveryMethod(id=3, name='Tab\there\\back\nline\r')])
+        self.assertEqual(method['id'], '3')
+        self.assertEqual(method['name'], 'Tab\\there\\\\back\\nline\\r')
+        self.assertEqual(method['row_created_on'], '2021-01-08 12:13:30')
+
+        decimal_field = next(
+            field for field in Star._meta.concrete_fields if field.get_internal_type() == 'DecimalField'
+        )
+        star = Star(id=1, planetary_system_id=2, spectral_type_id=None, **{decimal_field.attname: decimal.Decimal('1E-5')})
+        [values] = self.staged(Star, [star])
+        self.assertEqual(values['spectral_type_id'], '\\N')
+        self.assertEqual(values[decimal_field.column], '0.00001')
+
+    def test_other_databases_use_the_bulk_loader(self):
+        self.assertEqual(connection.vendor, 'sqlite')
+        self.assertIs(type(infile_loader(batch_size=10)), BulkLoader)
+
+        path = write_archive([archive_row(number) for number in range(3)])
+        self.addCleanup(os.remove, path)
+        with ArchiveReader(path) as reader:
+            self.assertEqual(infile_loader().load(reader)['Planet'], 3)
+
+    def test_only_the_loader_connection_sends_local_files(self):
+        infile = infile_connection()
+        self.assertEqual(infile.settings_dict['OPTIONS']['local_infile'], 1)
+        self.assertNotIn('local_infile', connection.settings_dict['OPTIONS'])
+        self.assertIsNot(infile, connection)
+
+
+class ShadowLoadTest(TransactionTestCase):
+
+    def test_swap_replaces_the_live_tables(self):
+        loader = ShadowLoad(batch_size=4)
+        load_archive([archive_row(number, system=number // 2) for number in range(6)], loader)
+
+        self.assertEqual(PlanetarySystem.objects.count(), 3)
+        self.assertEqual(Star.objects.count(), 3)
+        self.assertEqual(Planet.objects.count(), 6)
+        self.assertEqual(
+            Planet.objects.filter(planetary_system__name='Host 2').count(), 2
+        )
+
+        # Only the live tables are left
+        tables = connection.introspection.table_names()
+        for model in INSERT_ORDER:
+            self.assertIn(model._meta.db_table, tables)
+            self.assertNotIn(loader.shadow_tables[model._meta.db_table], tables)
+            self.assertNotIn(loader.old_tables[model._meta.db_table], tables)
+
+        # With the indexes of the migrations
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, Planet._meta.db_table)
+        self.assertIn('planet_name_reference_idx', constraints)
+
+
+class KeysetPaginatorTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        load_archive([archive_row(number) for number in range(5)])
+
+    def test_cursors_of_the_first_and_last_pages(self):
+        ids = list(PlanetarySystem.objects.order_by('id').values_list('id', flat=True))
+        paginator = KeysetPaginator(PlanetarySystem.objects.values('id', 'name'), ('id',), 2)
+
+        first = paginator.page()
+        self.assertEqual([row['id'] for row in first], ids[:2])
+        self.assertEqual((first.next_cursor, first.previous_cursor), (str(ids[1]), None))
+        self.assertTrue(first.has_other_pages())
+
+        middle = paginator.page(after=first.next_cursor)
+        self.assertEqual([row['id'] for row in middle], ids[2:4])
+        self.assertEqual((middle.next_cursor, middle.previous_cursor), (str(ids[3]), str(ids[2])))
+
+        last = paginator.page(after=middle.next_cursor)
+        self.assertEqual([row['id'] for row in last], ids[4:])
+        self.assertEqual((last.next_cursor, last.previous_cursor), (None, str(ids[4])))
+
+        # Back from the last page, and to the first one that has no previous page
+        back = paginator.page(before=last.previous_cursor)
+        self.assertEqual([row['id'] for row in back], ids[2:4])
+        self.assertEqual((back.next_cursor, back.previous_cursor), (str(ids[3]), str(ids[2])))
+        back = paginator.page(before=back.previous_cursor)
+        self.assertEqual([row['id'] for row in back], ids[:2])
+        self.assertEqual((back.next_cursor, back.previous_cursor), (str(ids[1]), None))
+
+        # One page for everything
+        whole = KeysetPaginator(PlanetarySystem.objects.all(), ('id',), 10).page()
+        self.assertEqual((len(whole), whole.next_cursor, whole.previous_cursor), (5, None, None))
+        self.assertFalse(whole.has_other_pages())
+
+        for cursor in ('abc', '1-2'):
+            with self.subTest(cursor), self.assertRaises(Http404):
+                paginator.page(after=cursor)
+
+
+class CatalogExportTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        rows = [archive_row(number, system=number // 2) for number in range(5)]
+        rows[4][11] = '2016'
+        load_archive(rows)
+
+    def test_chunks_follow_the_whole_catalog(self):
+        rows = CatalogRows(['planet_name', 'star_tic_id'], chunk_size=2)
+        self.assertEqual(
+            list(rows),
+            [('Planet %d b' % number, 'TIC %d' % (number // 2)) for number in range(5)]
+        )
+
+    def test_chunk_ends_on_a_planetary_system_without_stars(self):
+        Star.objects.filter(planetary_system__name='Host 0').delete()
+        # The first chunk ends on Planet 1 b, its star id is NULL
+        rows = CatalogRows(['planet_name', 'star_tic_id'], chunk_size=2)
+        self.assertEqual(
+            list(rows),
+            [('Planet 0 b', None), ('Planet 1 b', None)]
+            + [('Planet %d b' % number, 'TIC %d' % (number // 2)) for number in range(2, 5)]
+        )
+
+    def test_csv_columns_and_filters(self):
+        response = self.client.get(
+            '/planetary_systems/export.csv?fields=planet_name,planetary_system_name&planet_discovery_year=2016'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            b''.join(response.streaming_content).decode(),
+            'planet_name,planetary_system_name\r\nPlanet 4 b,Host 2\r\n'
+        )
+
+    def test_jsonl_rows(self):
+        response = self.client.get('/planetary_systems/export.jsonl?fields=planet_name,planet_discovery_year')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(lines[0], '{"planet_name": "Planet 0 b", "planet_discovery_year": 2015}')
+
+    def test_unknown_column(self):
+        response = self.client.get('/planetary_systems/export.csv?fields=planet_mass')
+        self.assertEqual(response.status_code, 400)
+
+
+@unittest.skipIf(numpy is None, 'numpy is not installed')
+class SnapshotTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        rows = [archive_row(number) for number in range(4)]
+        # orbital_period, and a planet without it
+        for number, row in enumerate(rows):
+            row[16] = str(number + 0.5)
+        rows[3][16] = ''
+        load_archive(rows)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_filters_and_aggregates_skip_nulls(self):
+        build_snapshot(self.directory)
+        planets = Snapshot(self.directory)['planet']
+
+        self.assertEqual(planets.rows, 4)
+        self.assertEqual(planets.where(orbital_period__isnull=True).sum(), 1)
+        selected = planets.where(orbital_period__gte=1)
+        self.assertEqual(planets.aggregate('orbital_period', where=selected)['count'], 2)
+        self.assertEqual(planets.aggregate('orbital_period')['max'], 2.5)
+        self.assertEqual(set(planets.measurement('orbital_period')), {'value', 'err1', 'err2', 'limit'})
+
+    def test_rebuild_replaces_the_previous_build(self):
+        build_snapshot(self.directory)
+        reader = Snapshot(self.directory)
+        Planet.objects.filter(name='Planet 0 b').delete()
+        build_snapshot(self.directory)
+
+        self.assertEqual(Snapshot(self.directory)['planet'].rows, 3)
+        # The previous build stays for the reader opened before, its columns
+        # are loaded when they are first read
+        self.assertEqual(reader['planet'].aggregate('orbital_period')['count'], 3)
+        self.assertEqual(len(os.listdir(self.directory)), 3)
+
+        # The builds before it are removed
+        build_snapshot(self.directory)
+        self.assertEqual(len(os.listdir(self.directory)), 3)
+
+
+def full_scans(queryset):
+    """The steps of the query plan that read a whole table or index"""
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute('EXPLAIN ' + sql, params)
+            columns = [column[0] for column in cursor.description]
+            rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+            return ['%(table)s: %(type)s' % row for row in rows if row['type'] in ('ALL', 'index')]
+
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        return [row[-1] for row in cursor.fetchall() if row[-1].startswith('SCAN')]
+
+
+class QueryPlanTest(TestCase):
+    """The queries of the pages and the loaders must seek on an index"""
+
+    def test_hot_queries_use_an_index(self):
+        queries = {
+            'lookup table name': DiscoveryMethod.objects.filter(name='Transit'),
+            'planetary system name': PlanetarySystem.objects.filter(name='Host 1'),
+            'delta planet key': Planet.objects.filter(name='Planet 1 b', publication_reference='Reference 1'),
+            'planets per method of a year': Planet.objects.filter(discovery_year=2016).values(
+                'discovery_method'
+            ).annotate(planets=Count('id')),
+            'orbital period range': Planet.objects.filter(orbital_period__lt=10),
+            'distance range': PlanetarySystem.objects.filter(distance__range=(10, 20)),
+            'list page': PlanetarySystem.objects.filter(id__gt=20).order_by('id')[:21],
+            'stars of a page': Star.objects.filter(planetary_system_id__in=[1, 2]),
+            'planets of a page': Planet.objects.filter(planetary_system_id__in=[1, 2]),
+            'cone search': PlanetarySystem.objects.filter(
+                sky_cell__range=cone_cells(285, 40, 1)[0]
+            ),
+            'planets around filtered stars': Planet.objects.filter(*filter_conditions(Planet, QueryDict(
+                'planet_orbital_period__lt=10&star_effective_temperature__range=5000,6000'
+            ))),
+            'planets added since a version': introduced_since(Planet, 1),
+            'planets retired since a version': retired_since(Planet, 1),
+        }
+        for name, queryset in queries.items():
+            with self.subTest(name):
+                self.assertEqual(full_scans(queryset), [])
+
+
+class RequestMetricsTest(TestCase):
+
+    def setUp(self):
+        catalog_cache().clear()
+
+    def observed(self, histogram, view):
+        return dict(histogram.views.get(view, {'count': 0, 'sum': 0}))
+
+    def test_list_page_is_measured(self):
+        queries = self.observed(DB_QUERIES, 'planetary_systems')
+        renders = self.observed(TEMPLATE_DURATION, 'planetary_systems')
+
+        def slow_render(response):
+            time.sleep(0.05)
+            return 'page'
+
+        with mock.patch.object(SimpleTemplateResponse, 'rendered_content', property(slow_render)):
+            response = self.client.get('/planetary_systems/')
+        self.assertEqual(response.content, b'page')
+
+        # The planetary systems of the empty page, no stars or planets
+        self.assertEqual(self.observed(DB_QUERIES, 'planetary_systems')['count'], queries['count'] + 1)
+        self.assertEqual(self.observed(DB_QUERIES, 'planetary_systems')['sum'], queries['sum'] + 1)
+        # The whole render is timed
+        self.assertEqual(self.observed(TEMPLATE_DURATION, 'planetary_systems')['count'], renders['count'] + 1)
+        self.assertGreaterEqual(self.observed(TEMPLATE_DURATION, 'planetary_systems')['sum'], renders['sum'] + 0.05)
+        # And the rendered page is the one cached
+        self.assertEqual(self.client.get('/planetary_systems/').content, b'page')
+
+        with override_settings(METRICS_ALLOWED_IPS=['127.0.0.1']):
+            metrics = self.client.get('/metrics').content.decode()
+        self.assertIn('planetary_systems_db_queries_bucket{view="planetary_systems",le="1"}', metrics)
+
+    def test_metrics_are_only_served_to_the_allowed_addresses(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+        with override_settings(METRICS_ALLOWED_IPS=['10.0.0.5']):
+            self.assertEqual(self.client.get('/metrics').status_code, 404)
+            self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.0.0.5').status_code, 200)
+
+
+class CachedPageTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        load_archive([archive_row(number) for number in range(3)])
+
+    def setUp(self):
+        catalog_cache().clear()
+
+    def test_repeated_page_is_read_from_the_cache(self):
+        first = self.client.get('/planetary_systems/?page_size=2')
+        with self.assertNumQueries(0):
+            second = self.client.get('/planetary_systems/?page_size=2')
+        self.assertEqual(first.content, second.content)
+
+        # Other parameters are another page
+        with self.assertNumQueries(3):
+            self.client.get('/planetary_systems/?page_size=1')
+
+    def test_load_invalidates_the_pages(self):
+        self.client.get('/planetary_systems/')
+        PlanetarySystem.objects.filter(name='Host 0').update(name='Renamed host')
+        bump_dataset_version()
+
+        response = self.client.get('/planetary_systems/')
+        self.assertContains(response, 'Renamed host')
+
+    def test_page_of_a_load_finished_meanwhile_is_not_stored(self):
+        request = RequestFactory().get('/planetary_systems/')
+        key = page_key(request)
+        bump_dataset_version()
+        cache_page(key, b'page')
+        self.assertIsNone(catalog_cache().get(key))
+
+        key = page_key(request)
+        cache_page(key, b'page')
+        self.assertEqual(catalog_cache().get(key), b'page')
+
+
+class ApiTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        load_archive([archive_row(number, system=number // 2) for number in range(3)])
+
+    def test_pages_follow_the_next_link(self):
+        response = self.client.get('/api/planets/?fields=name,discovery_method_name&page_size=2')
+        data = json.loads(response.content)
+        self.assertEqual(data['results'], [
+            {'name': 'Planet 0 b', 'discovery_method_name': 'Transit'},
+            {'name': 'Planet 1 b', 'discovery_method_name': 'Transit'},
+        ])
+        self.assertIsNone(data['previous'])
+
+        data = json.loads(self.client.get(data['next']).content)
+        self.assertEqual(data['results'], [{'name': 'Planet 2 b', 'discovery_method_name': 'Transit'}])
+        self.assertIsNone(data['next'])
+
+    def test_detail(self):
+        system = PlanetarySystem.objects.get(name='Host 1')
+        response = self.client.get('/api/planetary_systems/%d/?fields=name,number_of_planets' % system.pk)
+        self.assertEqual(json.loads(response.content), {'name': 'Host 1', 'number_of_planets': 1})
+
+        self.assertEqual(self.client.get('/api/planetary_systems/0/').status_code, 404)
+        self.assertEqual(self.client.get('/api/stars/?fields=mass,weight').status_code, 400)
+
+    def test_etag_until_the_next_load(self):
+        etag = self.client.get('/api/stars/')['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/stars/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        bump_dataset_version()
+        self.assertEqual(self.client.get('/api/stars/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class AsyncViewTest(TransactionTestCase):
+    # The queries run in the threads of asyncdb.py, with their own
+    # connections: the rows must be committed
+
+    def setUp(self):
+        catalog_cache().clear()
+        rows = [archive_row(number, system=number // 2) for number in range(5)]
+        rows[3][10] = 'Radial Velocity'
+        load_archive(rows)
+
+    def rendered(self, view):
+        """The view, its template responses rendered like the handler of Django does"""
+
+        async def get(request, **kwargs):
+            response = await view(request, **kwargs)
+            if hasattr(response, 'render'):
+                await sync_to_async(response.render)()
+            return response
+
+        return get
+
+    def call(self, view, path, **kwargs):
+        return async_to_sync(self.rendered(view))(RequestFactory().get(path), **kwargs)
+
+    def test_catalog_pages_match_the_sync_view(self):
+        view = AsyncPlanetarySystemsListView.as_view()
+        first = self.client.get('/planetary_systems/?page_size=2')
+        second = self.client.get('/planetary_systems/?page_size=2&after=%s' % first.context['page_obj'].next_cursor)
+        catalog_cache().clear()
+
+        # The lookup names are set on the planets of the page
+        self.assertContains(first, 'Radial Velocity')
+        for expected in (first, second):
+            path = expected.wsgi_request.get_full_path()
+            self.assertEqual(self.call(view, path).content, expected.content)
+            # From the cache the second time
+            self.assertEqual(self.call(view, path).content, expected.content)
+
+    def test_api_matches_the_sync_views(self):
+        path = '/api/planets/?page_size=2&fields=name,discovery_method_name,solution_type_name,orbital_period'
+        response = self.call(AsyncPlanetApiListView.as_view(), path)
+        self.assertEqual(json.loads(response.content), json.loads(self.client.get(path).content))
+        self.assertEqual(response['ETag'], self.client.get(path)['ETag'])
+
+        star = Star.objects.get(planetary_system__name='Host 1')
+        path = '/api/stars/%d/' % star.pk
+        response = self.call(AsyncStarApiDetailView.as_view(), path, pk=star.pk)
+        self.assertEqual(json.loads(response.content), json.loads(self.client.get(path).content))
+
+        with self.assertRaises(Http404):
+            self.call(AsyncStarApiDetailView.as_view(), '/api/stars/0/', pk=0)
+        self.assertEqual(self.call(AsyncPlanetApiListView.as_view(), '/api/planets/?fields=weight').status_code, 400)
+
+    def test_queries_of_the_threads_are_measured(self):
+        middleware = RequestMetricsMiddleware(self.rendered(AsyncPlanetarySystemsListView.as_view()))
+        queries = dict(DB_QUERIES.views.get(UNNAMED, {'sum': 0}))
+
+        async_to_sync(middleware)(RequestFactory().get('/planetary_systems/'))
+
+        # The planetary systems and the 4 lookup tables, then the stars and the planets
+        self.assertEqual(DB_QUERIES.views[UNNAMED]['sum'], queries['sum'] + 7)
+
+    def test_threads_keep_their_connections(self):
+        connection = connections[DEFAULT_DB_ALIAS]
+        self.assertEqual(connection.settings_dict['CONN_MAX_AGE'], 0)
+        self.addCleanup(setattr, connection, 'close_at', connection.close_at)
+
+        call_in_thread(PlanetarySystem.objects.count)
+
+        # Not closed by the next call (SQLite never closes the in-memory
+        # test database, the closing time tells)
+        self.assertGreater(connection.close_at - time.monotonic(), settings.ASYNC_DB_CONN_MAX_AGE - 5)
+
+
+def async_urls():
+    """planetary_systems/urls.py as asgi.py routes it, with settings.ASYNC_VIEWS"""
+    spec = importlib.util.find_spec('planetary_systems.urls')
+    urls = importlib.util.module_from_spec(spec)
+    with override_settings(ASYNC_VIEWS=True):
+        spec.loader.exec_module(urls)
+    return urls
+
+
+@override_settings(METRICS_ALLOWED_IPS=['127.0.0.1'])
+class AsgiTest(TransactionTestCase):
+    # The requests go through the ASGI handler of asgi.py, to the async views
+
+    # Query strings of the URLs that need one
+    queries = {'api_cone_search': 'ra=10&dec=5&radius=1'}
+
+    def setUp(self):
+        catalog_cache().clear()
+        load_archive([archive_row(number, system=number // 2) for number in range(5)])
+        self.application = get_asgi_application()
+        self.urls = async_urls()
+
+    async def get(self, path, query=''):
+        communicator = ApplicationCommunicator(self.application, {
+            'type': 'http',
+            'method': 'GET',
+            'path': path,
+            'query_string': query.encode(),
+            'headers': [],
+            'server': ('testserver', 80),
+            'client': ('127.0.0.1', 40000),
+        })
+        await communicator.send_input({'type': 'http.request'})
+        start = await communicator.receive_output(timeout=10)
+        body = b''
+        while True:
+            message = await communicator.receive_output(timeout=10)
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                return start['status'], body
+
+    def asgi_get(self, path, query=''):
+        with override_settings(ROOT_URLCONF=self.urls):
+            return async_to_sync(self.get)(path, query)
+
+    def test_every_url(self):
+        for pattern in self.urls.urlpatterns:
+            with self.subTest(pattern.name):
+                kwargs = {}
+                if 'pk' in pattern.pattern.converters:
+                    kwargs['pk'] = pattern.callback.view_class.model.objects.order_by('pk').first().pk
+                path = reverse(pattern.name, urlconf=self.urls, kwargs=kwargs)
+                status, content = self.asgi_get(path, self.queries.get(pattern.name, ''))
+                self.assertEqual(status, 200, content[:200])
+
+    @mock.patch.object(PlanetarySystemsStreamView, 'chunk_size', 2)
+    @mock.patch.object(AsyncCatalogExportView, 'batch_size', 2)
+    def test_streamed_bodies_match_the_sync_views(self):
+        for path, query in (
+            ('/planetary_systems/all/', ''),
+            ('/planetary_systems/export.csv', ''),
+            ('/planetary_systems/export.jsonl', 'fields=planet_name,star_hd_name'),
+        ):
+            with self.subTest(path):
+                expected = b''.join(self.client.get(path + '?' + query).streaming_content)
+                self.assertEqual(self.asgi_get(path, query), (200, expected))
+
+    @mock.patch.object(PlanetarySystemsStreamView, 'chunk_size', 2)
+    def test_queries_of_the_streamed_page_are_measured(self):
+        queries = dict(DB_QUERIES.views.get('planetary_systems_all', {'sum': 0}))
+
+        self.asgi_get('/planetary_systems/all/')
+
+        # Two chunks of 3 queries, read in the threads of asyncdb.py
+        self.assertEqual(DB_QUERIES.views['planetary_systems_all']['sum'], queries['sum'] + 6)
+
+
+class FilterTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        rows = [archive_row(number) for number in range(4)]
+        for number, row in enumerate(rows):
+            # orbital_period, star effective_temperature
+            row[16] = str(5 * (number + 1))
+            row[56] = str(4500 + 500 * number)
+        load_archive(rows)
+
+    def setUp(self):
+        catalog_cache().clear()
+
+    def planet_names(self, query):
+        response = self.client.get('/api/planets/?fields=name&' + query)
+        self.assertEqual(response.status_code, 200)
+        return [row['name'] for row in json.loads(response.content)['results']]
+
+    def test_ranges_across_planets_and_stars(self):
+        self.assertEqual(
+            self.planet_names('planet_orbital_period__lt=15&star_effective_temperature__range=5000,6000'),
+            ['Planet 1 b']
+        )
+        self.assertEqual(
+            self.planet_names('planet_name__in=Planet 0 b,Planet 3 b&planet_discovery_method_name=Transit'),
+            ['Planet 0 b', 'Planet 3 b']
+        )
+
+    def test_list_view_selects_the_planetary_systems(self):
+        response = self.client.get('/planetary_systems/?planet_orbital_period__gte=15')
+        self.assertEqual([system.name for system in response.context['object_list']], ['Host 2', 'Host 3'])
+
+    def test_invalid_filters(self):
+        for query in ('planet_mass=1', 'planet_orbital_period__lt=short', 'planet_name__lt=a', 'star_radius__isnull=1'):
+            with self.subTest(query):
+                self.assertEqual(self.client.get('/api/planets/?' + query).status_code, 400)
+                self.assertEqual(self.client.get('/planetary_systems/?' + query).status_code, 400)
+
+
+class ConeSearchTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        positions = [(285, 40), (285.5, 40.2), (290, 40), (359.9, -10), (0.1, -10.05), (10, 89.9)]
+        rows = [archive_row(number) for number in range(len(positions))]
+        for row, (ra, dec) in zip(rows, positions):
+            row[79] = str(ra)
+            row[81] = str(dec)
+        load_archive(rows)
+
+    def cone(self, ra, dec, radius):
+        response = self.client.get(
+            '/api/planetary_systems/cone/?fields=name&ra=%s&dec=%s&radius=%s' % (ra, dec, radius)
+        )
+        self.assertEqual(response.status_code, 200)
+        return [row['name'] for row in json.loads(response.content)['results']]
+
+    def test_nearest_first(self):
+        self.assertEqual(self.cone(285.1, 40, 1), ['Host 0', 'Host 1'])
+        self.assertEqual(self.cone(285.1, 40, 5), ['Host 0', 'Host 1', 'Host 2'])
+
+    def test_across_right_ascension_zero_and_the_pole(self):
+        self.assertEqual(self.cone(0, -10, 0.5), ['Host 3', 'Host 4'])
+        self.assertEqual(self.cone(190, 89.95, 0.5), ['Host 5'])
+
+    def test_invalid_position(self):
+        self.assertEqual(self.client.get('/api/planetary_systems/cone/?ra=10&dec=95&radius=1').status_code, 400)
+        self.assertEqual(self.client.get('/api/planetary_systems/cone/?ra=10&dec=5').status_code, 400)
+        for position in ('ra=nan&dec=0&radius=1', 'ra=inf&dec=0&radius=1', 'ra=10&dec=-inf&radius=1',
+                         'ra=10&dec=0&radius=nan'):
+            with self.subTest(position):
+                self.assertEqual(self.client.get('/api/planetary_systems/cone/?' + position).status_code, 400)
+
+
+class SummaryTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        load_archive([archive_row(number, system=number // 2) for number in range(4)])
+        refresh_summaries()
+
+    def summaries(self):
+        return json.loads(self.client.get('/api/stats/').content)
+
+    def test_full_refresh(self):
+        self.assertEqual(self.summaries(), {
+            'planets_per_method_year': [{'discovery_method': 'Transit', 'discovery_year': 2015, 'planets': 4}],
+            'planetary_systems_per_facility': [{'discovery_facility': 'Kepler', 'planetary_systems': 2}],
+            'planetary_systems_per_planet_count': [{'number_of_planets': 1, 'planetary_systems': 2}],
+        })
+
+    def test_delta_load_refreshes_its_groups(self):
+        rows = [archive_row(number, system=number // 2) for number in range(3)]
+        rows[0][11] = '2016'
+        rows[0][94] = '2021-01-01'
+        rows[2][12] = 'TESS'
+        rows[2][94] = '2021-01-01'
+        loader = DeltaLoader()
+        load_archive(rows, loader)
+
+        refresh_summaries(loader.changes)
+        self.assertEqual(
+            sorted(PlanetsPerMethodYear.objects.values_list('discovery_method', 'discovery_year', 'planets')),
+            [('Transit', 2015, 2), ('Transit', 2016, 1)]
+        )
+        self.assertEqual(
+            sorted(PlanetarySystemsPerFacility.objects.values_list('discovery_facility', 'planetary_systems')),
+            [('Kepler', 1), ('TESS', 1)]
+        )
+
+        # The same as computing everything again
+        incremental = self.summaries()
+        bump_dataset_version()
+        refresh_summaries()
+        self.assertEqual(self.summaries(), incremental)
+
+
+class SyntheticArchiveTest(TestCase):
+
+    def test_generated_file_loads(self):
+        fd, path = tempfile.mkstemp(suffix='.csv')
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        write_synthetic_archive(path, 500, seed=3)
+
+        with ArchiveReader(path) as reader:
+            counts = BulkLoader().load(reader)
+        self.assertEqual(counts['Planet'], 500)
+        self.assertLess(counts['PlanetarySystem'], 200)
+        self.assertLessEqual(counts['DiscoveryMethod'], 11)
+        # Some measurements are empty
+        self.assertTrue(Planet.objects.filter(eccentricity__isnull=True).exists())
+        self.assertTrue(Planet.objects.filter(eccentricity__isnull=False).exists())
+
+        # The same seed writes the same file
+        with open(path, 'rb') as fhand:
+            first = fhand.read()
+        write_synthetic_archive(path, 500, seed=3)
+        with open(path, 'rb') as fhand:
+            self.assertEqual(fhand.read(), first)
+
+
+class BenchmarkLoadTest(SimpleTestCase):
+    # The loads run in spawned processes, on their own test database
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_small_load_is_measured(self):
+        output = os.path.join(self.directory, 'load.jsonl')
+        with override_settings(BENCHMARK_DIR=pathlib.Path(self.directory)), redirect_stdout(io.StringIO()):
+            benchmark_load.run('rows=200', 'databases=sqlite', 'output=%s' % output)
+
+        with open(output) as fhand:
+            results = [json.loads(line) for line in fhand]
+        self.assertEqual(len(results), 1)
+        self.assertEqual((results[0]['database'], results[0]['rows']), ('sqlite', 200))
+        self.assertEqual(results[0]['counts']['Planet'], 200)
+        self.assertEqual(set(results[0]['phases']), {'parse', 'resolve', 'insert'})
+
+
+class BenchmarkViewsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        load_archive([archive_row(number) for number in range(3)])
+
+    def setUp(self):
+        catalog_cache().clear()
+
+    def test_render_is_timed_with_its_queries(self):
+        seconds, queries = benchmark_views.timed_phases('page_size=2')
+        self.assertGreater(seconds['render'], 0)
+        self.assertEqual(queries, benchmark_views.QUERY_BOUNDS['first page'])
+
+        # A query of the template, as an N+1 in the rows would run
+        def querying_render(response):
+            PlanetarySystem.objects.count()
+            return 'page'
+
+        catalog_cache().clear()
+        with mock.patch.object(SimpleTemplateResponse, 'rendered_content', property(querying_render)):
+            seconds, queries = benchmark_views.timed_phases('page_size=2')
+        self.assertEqual(queries, benchmark_views.QUERY_BOUNDS['first page'] + 1)
+
+
+class ListViewQueryTest(TestCase):
+    """The queries of the catalog pages do not grow with the rows shown"""
+
+    @classmethod
+    def setUpTestData(cls):
+        load_synthetic_archive(600, seed=1)
+
+    def setUp(self):
+        catalog_cache().clear()
+
+    def test_page_queries(self):
+        middle = PlanetarySystem.objects.order_by('id').values_list('id', flat=True)[20]
+        for query_string in (
+            'page_size=5',
+            'page_size=50',
+            'page_size=20&after=%d' % middle,
+            'page_size=20&before=%d' % middle,
+            'page_size=20&planet_orbital_period__lt=10&star_effective_temperature__range=5000,6000',
+        ):
+            with self.subTest(query_string):
+                # The planetary systems, their stars and their planets
+                with self.assertNumQueries(3):
+                    response = self.client.get('/planetary_systems/?%s' % query_string)
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response.context['object_list'])
+
+    @mock.patch.object(PlanetarySystemsStreamView, 'chunk_size', 25)
+    def test_stream_queries(self):
+        systems = PlanetarySystem.objects.count()
+        chunks = -(-systems // PlanetarySystemsStreamView.chunk_size)
+        self.assertGreater(chunks, 1)
+        # The planetary systems, their stars and their planets for every
+        # chunk, one more empty chunk when the last one is full
+        with self.assertNumQueries(3 * chunks + (systems % PlanetarySystemsStreamView.chunk_size == 0)):
+            response = self.client.get('/planetary_systems/all/')
+            content = b''.join(response.streaming_content)
+        last = PlanetarySystem.objects.order_by('id').last()
+        self.assertIn(('<td>%s</td>' % last.name).encode(), content)
+
+
+class ListViewRowsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        load_archive([archive_row(number) for number in range(3)])
+        Star.objects.filter(planetary_system__name='Host 0').delete()
+        Planet.objects.filter(planetary_system__name='Host 1').delete()
+
+    def setUp(self):
+        catalog_cache().clear()
+
+    def test_planetary_systems_without_stars_or_planets_keep_a_row(self):
+        for path in ('/planetary_systems/', '/planetary_systems/all/'):
+            with self.subTest(path):
+                response = self.client.get(path)
+                content = b''.join(response.streaming_content) if response.streaming else response.content
+                for name in ('Host 0', 'Planet 0 b', 'Host 1', 'TIC 1', 'Host 2', 'Planet 2 b', 'TIC 2'):
+                    self.assertEqual(content.count(('<td>%s</td>' % name).encode()), 1, name)
+                self.assertEqual(content.count(b'<td>TIC 0</td>') + content.count(b'<td>Planet 1 b</td>'), 0)
+
+
+class VersionTest(TestCase):
+
+    def load(self, rows, loader_class):
+        path = write_archive(rows)
+        self.addCleanup(os.remove, path)
+        version = start_run(path, 'delta', 'bulk')
+        with ArchiveReader(path) as reader:
+            loader_class(version=version).load(reader)
+        record_load(version)
+        return version
+
+    def planet_names(self, queryset):
+        return sorted(queryset.values_list('name', flat=True))
+
+    def test_delta_load_keeps_the_previous_version(self):
+        first = self.load([archive_row(number) for number in range(3)], BulkLoader)
+
+        rows = [archive_row(number) for number in (0, 1, 3)]
+        # Planet 1 b is updated, Planet 2 b removed and Planet 3 b added
+        rows[1][94] = '2021-01-01'
+        second = self.load(rows, DeltaLoader)
+
+        self.assertEqual(self.planet_names(Planet.objects.all()), ['Planet 0 b', 'Planet 1 b', 'Planet 3 b'])
+        self.assertEqual(self.planet_names(introduced_since(Planet, first.pk)), ['Planet 1 b', 'Planet 3 b'])
+        self.assertEqual(self.planet_names(retired_since(Planet, first.pk)), ['Planet 1 b', 'Planet 2 b'])
+        self.assertEqual(self.planet_names(as_of(Planet, first.pk)), ['Planet 0 b', 'Planet 1 b', 'Planet 2 b'])
+        self.assertEqual(as_of(Planet, first.pk).get(name='Planet 1 b').date_last_update.year, 2020)
+
+        # The planetary system of the removed planet is retired with it
+        self.assertFalse(PlanetarySystem.objects.filter(name='Host 2').exists())
+        self.assertEqual(PlanetarySystem.all_versions.get(name='Host 2').retired_in, second)
+
+        second.refresh_from_db()
+        self.assertEqual((second.planets, second.planets_introduced, second.planets_retired), (3, 2, 2))
+
+        # The pages only show the current rows
+        data = json.loads(self.client.get('/api/planets/?fields=name').content)
+        self.assertEqual([row['name'] for row in data['results']], ['Planet 0 b', 'Planet 1 b', 'Planet 3 b'])
+        rows = list(CatalogRows(['planet_name', 'star_tic_id']))
+        self.assertEqual(len(rows), 3)
+
+
+class CheckpointTest(TestCase):
+
+    def test_stopped_load_resumes_after_the_last_batch(self):
+        rows = [archive_row(number, system=number // 2) for number in range(8)]
+        rows[3][79] = 'not a decimal'
+        path = write_archive(rows)
+        self.addCleanup(os.remove, path)
+        fd, rejects_path = tempfile.mkstemp(suffix='.csv')
+        os.close(fd)
+        self.addCleanup(os.remove, rejects_path)
+
+        run = start_run(path, 'full', 'bulk')
+        flush = CheckpointedLoader.flush
+        flushes = []
+
+        def stop_after_two_batches(loader):
+            flushes.append(loader)
+            if len(flushes) > 2:
+                raise RuntimeError('stopped')
+            flush(loader)
+
+        with mock.patch.object(CheckpointedLoader, 'flush', stop_after_two_batches):
+            with self.assertRaises(RuntimeError):
+                with RejectFile(rejects_path) as rejects, ArchiveReader(path, rejects=rejects) as reader:
+                    CheckpointedLoader(run, batch_size=2).load(reader)
+
+        # The rows of the two batches, Planet 3 b was rejected
+        self.assertEqual(Planet.objects.count(), 4)
+        self.assertEqual((run.line_number, run.rows_read, run.rows_rejected), (7, 5, 1))
+        self.assertEqual(resume_run(path, 'full', 'bulk'), run)
+
+        run = resume_run(path, 'full', 'bulk')
+        with RejectFile(rejects_path, resume_line=run.line_number) as rejects, \
+                ArchiveReader(path, rejects=rejects) as reader:
+            CheckpointedLoader(run, batch_size=2).load(reader)
+
+        self.assertEqual(
+            sorted(Planet.objects.values_list('name', flat=True)),
+            ['Planet %d b' % number for number in (0, 1, 2, 4, 5, 6, 7)]
+        )
+        # The planetary systems of the first batches are not inserted again
+        self.assertEqual(PlanetarySystem.objects.count(), 4)
+        self.assertEqual(Star.objects.count(), 4)
+        self.assertEqual(Planet.objects.filter(planetary_system__name='Host 2').count(), 2)
+        self.assertEqual((run.rows_read, run.rows_rejected), (8, 1))
+
+        with open(rejects_path, newline='') as fhand:
+            rejected = list(csv.reader(fhand))
+        self.assertEqual([row[:2] for row in rejected], [['line', 'column'], ['6', '79']])
+        self.assertEqual(rejected[1][3:], rows[3])
+
+    def test_parallel_load_is_not_resumed(self):
+        with self.assertRaisesMessage(CommandError, 'resume does not apply to workers'):
+            many_load.run('workers=2', 'resume')
+        self.assertFalse(LoadRun.objects.exists())
+
+
+class ValidationTest(TestCase):
+
+    def test_invalid_rows_are_rejected_with_their_reason(self):
+        rows = [archive_row(number) for number in range(6)]
+        # max_digits=23, decimal_places=10: 13 integer digits
+        rows[1][79] = '12345678901234.5'
+        # number_of_stars is a PositiveSmallIntegerField
+        rows[2][8] = '-1'
+        # SpectralType.name has 20 characters
+        rows[3][55] = 'G2 V' * 6
+        # name is required
+        rows[4][1] = ''
+        path = write_archive(rows)
+        self.addCleanup(os.remove, path)
+        fd, rejects_path = tempfile.mkstemp(suffix='.csv')
+        os.close(fd)
+        self.addCleanup(os.remove, rejects_path)
+
+        with RejectFile(rejects_path) as rejects, ArchiveReader(path, rejects=rejects, batch_size=4) as reader:
+            BulkLoader().load(reader)
+
+        self.assertEqual(
+            sorted(Planet.objects.values_list('name', flat=True)),
+            ['Planet 0 b', 'Planet 5 b']
+        )
+        with open(rejects_path, newline='') as fhand:
+            rejected = list(csv.reader(fhand))[1:]
+        self.assertEqual([row[:2] for row in rejected], [['4', '79'], ['5', '8'], ['6', '55'], ['7', '1']])
+        self.assertIn('more than 9999999999999.9999999999', rejected[0][2])
+        self.assertIn('less than 0', rejected[1][2])
+        self.assertIn('more than 20 characters', rejected[2][2])
+        self.assertIn('the column is required', rejected[3][2])
+
+        # Without a reject file the first invalid row stops the load
+        with ArchiveReader(path) as reader:
+            with self.assertRaisesMessage(DecodeError, 'Line 4, column 79'):
+                list(reader)
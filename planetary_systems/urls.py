@@ -14,9 +14,46 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 
+from django.conf import settings
 from django.urls import path
-from .views import PlanetarySystemsListView
+from .api import (
+    PlanetarySystemApiListView,
+    PlanetarySystemApiDetailView,
+    ConeSearchView,
+    StatsView,
+    StarApiListView,
+    StarApiDetailView,
+    PlanetApiListView,
+    PlanetApiDetailView
+)
+from .views import PlanetarySystemsListView, PlanetarySystemsStreamView, CatalogExportView, MetricsView
+
+if settings.ASYNC_VIEWS:
+    # Under ASGI, the same pages from the async views (see async_views.py)
+    from .async_views import (
+        AsyncPlanetarySystemsListView as PlanetarySystemsListView,
+        AsyncPlanetarySystemsStreamView as PlanetarySystemsStreamView,
+        AsyncCatalogExportView as CatalogExportView,
+        AsyncPlanetarySystemApiListView as PlanetarySystemApiListView,
+        AsyncPlanetarySystemApiDetailView as PlanetarySystemApiDetailView,
+        AsyncStarApiListView as StarApiListView,
+        AsyncStarApiDetailView as StarApiDetailView,
+        AsyncPlanetApiListView as PlanetApiListView,
+        AsyncPlanetApiDetailView as PlanetApiDetailView
+    )
 
 urlpatterns = [
-    path('planetary_systems/', PlanetarySystemsListView.as_view()),
+    path('planetary_systems/', PlanetarySystemsListView.as_view(), name='planetary_systems'),
+    path('planetary_systems/all/', PlanetarySystemsStreamView.as_view(), name='planetary_systems_all'),
+    path('planetary_systems/export.csv', CatalogExportView.as_view(format='csv'), name='export_csv'),
+    path('planetary_systems/export.jsonl', CatalogExportView.as_view(format='jsonl'), name='export_jsonl'),
+    path('api/planetary_systems/', PlanetarySystemApiListView.as_view(), name='api_planetary_systems'),
+    path('api/planetary_systems/<int:pk>/', PlanetarySystemApiDetailView.as_view(), name='api_planetary_system'),
+    path('api/planetary_systems/cone/', ConeSearchView.as_view(), name='api_cone_search'),
+    path('api/stars/', StarApiListView.as_view(), name='api_stars'),
+    path('api/stars/<int:pk>/', StarApiDetailView.as_view(), name='api_star'),
+    path('api/planets/', PlanetApiListView.as_view(), name='api_planets'),
+    path('api/planets/<int:pk>/', PlanetApiDetailView.as_view(), name='api_planet'),
+    path('api/stats/', StatsView.as_view(), name='api_stats'),
+    path('metrics', MetricsView.as_view(), name='metrics'),
 ]
\ No newline at end of file
@@ -0,0 +1,122 @@
+"""
+Dataset versions
+
+Every many_load run is a LoadRun, its id is the version of the dataset. The
+catalog rows are stamped with the run that introduced them and the run that
+retired them (introduced_in and retired_in), so what changed between two
+releases is a range on an indexed column instead of a comparison of two
+catalogs:
+
+    introduced_since(Planet, 3)   planets added after version 3
+    retired_since(Planet, 3)      planets removed or replaced after version 3
+    as_of(Planet, 3)              the planets of version 3
+
+A delta load retires the rows it removes and the old row of every changed
+planet, so the history is kept. A full or swap load writes the whole catalog
+again and starts a new history, the earlier runs stay in the LoadRun table.
+Rows loaded before the first recorded run have no introduced_in, they count
+as version 0. A run that stopped is resumed with its version (see
+loader/checkpoint.py).
+
+Every query of the current rows has a retired_in IS NULL condition. Without
+statistics, SQLite takes the retired_in index for it, which holds every
+current row, instead of the selective index of the query: the statistics are
+updated after every load.
+"""
+
+import hashlib
+
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import (
+    LoadRun,
+    PlanetarySystem,
+    Star,
+    Planet
+)
+
+# Bytes hashed at a time
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fhand:
+        for chunk in iter(lambda: fhand.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def start_run(path, mode, engine):
+    """Record a new load of the file, its id is the new version"""
+    return LoadRun.objects.create(
+        file=str(path),
+        file_sha256=file_sha256(path),
+        mode=mode,
+        engine=engine,
+        started_on=timezone.now()
+    )
+
+
+def resume_run(path, mode, engine):
+    """
+    The last run when it did not finish and loaded the same file the same
+    way, None when there is nothing to resume
+    """
+    run = LoadRun.objects.order_by('-id').first()
+    if run is None or run.finished_on is not None:
+        return None
+    if (run.mode, run.engine) != (mode, engine) or run.file_sha256 != file_sha256(path):
+        return None
+    return run
+
+
+def update_statistics():
+    """Let the query planner know how many rows every index value selects"""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute('ANALYZE TABLE ' + ', '.join(
+                connection.ops.quote_name(model._meta.db_table) for model in (PlanetarySystem, Star, Planet)
+            ))
+            cursor.fetchall()
+        else:
+            cursor.execute('ANALYZE')
+
+
+def record_load(run):
+    """Once the rows are written: the current rows and the planets the run changed"""
+    update_statistics()
+    run.loaded_on = timezone.now()
+    run.planetary_systems = PlanetarySystem.objects.count()
+    run.stars = Star.objects.count()
+    run.planets = Planet.objects.count()
+    run.planets_introduced = Planet.all_versions.filter(introduced_in=run).count()
+    run.planets_retired = Planet.all_versions.filter(retired_in=run).count()
+    run.save()
+
+
+def finish_run(run):
+    run.finished_on = timezone.now()
+    run.save(update_fields=['finished_on'])
+
+
+def current_version():
+    """The latest finished load, None before the first one"""
+    return LoadRun.objects.filter(finished_on__isnull=False).order_by('-id').first()
+
+
+def introduced_since(model, version):
+    return model.all_versions.filter(introduced_in__gt=version)
+
+
+def retired_since(model, version):
+    return model.all_versions.filter(retired_in__gt=version)
+
+
+def as_of(model, version):
+    """The rows of the model in the version"""
+    introduced = Q(introduced_in__lte=version) | Q(introduced_in__isnull=True)
+    current = Q(retired_in__gt=version) | Q(retired_in__isnull=True)
+    return model.all_versions.filter(introduced, current)
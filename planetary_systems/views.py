@@ -8,8 +8,17 @@ from .models import (
     SolutionType,
     Planet
 )
-from django.views.generic import CreateView, UpdateView, DeleteView, ListView
-from django.db.models import F, Count
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
+from django.template.loader import get_template
+from django.views.generic import CreateView, UpdateView, DeleteView, ListView, View
+from . import catalog
+from .caching import cache_page, catalog_cache, page_key
+from .exports import FORMATS
+from .filters import RESERVED, FilterError, filter_conditions
+from .metrics import render_metrics
+from .pagination import KeysetPaginator
+from .queries import planetary_system_tree, planetary_system_tree_chunks
 
 class PlanetarySystemsListView(ListView):
     """
@@ -19,239 +28,159 @@ class PlanetarySystemsListView(ListView):
     # By convention:
     template_name = "planetary_systems/planetary_system_list.html"
 
+    # Planetary systems per page, ?page_size= changes it up to max_paginate_by
+    paginate_by = 20
+    max_paginate_by = 200
+
+    # Keyset pagination order
+    keyset = ('id',)
+
+    def get(self, request, *args, **kwargs):
+        """
+        Rendered pages are cached until the next load, see caching.py:
+        a repeated page is one cache read, without queries or rendering
+        """
+        key = page_key(request)
+        content = catalog_cache().get(key)
+        if content is not None:
+            return HttpResponse(content)
+
+        try:
+            response = super().get(request, *args, **kwargs)
+        except FilterError as error:
+            return HttpResponseBadRequest(str(error))
+        # Stored once Django renders the response, the render stays inside
+        # the timing of the metrics middleware
+        if response.status_code == 200:
+            response.add_post_render_callback(lambda response: cache_page(key, response.content))
+        return response
+
+    def get_paginate_by(self, queryset):
+        try:
+            page_size = int(self.request.GET.get('page_size', self.paginate_by))
+        except ValueError:
+            page_size = self.paginate_by
+        return max(1, min(page_size, self.max_paginate_by))
+
+    def paginate_queryset(self, queryset, page_size):
+        """
+        Seek to the ?after= or ?before= cursor instead of OFFSET pages,
+        so every page costs the same whatever the size of the tables
+        """
+        paginator = KeysetPaginator(queryset, self.keyset, page_size)
+        page = paginator.page(
+            after=self.request.GET.get('after'),
+            before=self.request.GET.get('before')
+        )
+        return (paginator, page, page.object_list, page.has_other_pages())
+
     def get_queryset(self):
-        """Return all the planetary systems, with related stars and planets"""
+        """Return the planetary systems, with related stars and planets"""
 
         """
-        Denormalizing database
-        
-        INNER JOIN, source: 
-        https://stackoverflow.com/a/21360352/9655579
-        
-        Set alias for fields, source: 
-        https://stackoverflow.com/a/46471483/9655579
+        Prefetching instead of denormalizing: the systems of the page, their
+        stars and their planets are read with one query each, see queries.py
+        The filters of the query string select the planetary systems, see filters.py
         """
+        return planetary_system_tree(
+            PlanetarySystem.objects.filter(*filter_conditions(PlanetarySystem, self.request.GET))
+        )
 
-        planetary_systems = PlanetarySystem.objects.values(
-            'id',
-            'name',
-            'number_of_stars',
-            'number_of_planets',
-            'publication_reference',
-            'right_ascension_sexagesimal',
-            'right_ascension_decimal',
-            'declination_sexagesimal',
-            'declination_decimal',
-            'distance',
-            'distance_err1',
-            'distance_err2',
-            'brightness_v_magnitude',
-            'brightness_v_magnitude_err1',
-            'brightness_v_magnitude_err2',
-            'brightness_ks_magnitude',
-            'brightness_ks_magnitude_err1',
-            'brightness_ks_magnitude_err2',
-            'brightness_gaia_magnitude',
-            'brightness_gaia_magnitude_err1',
-            'brightness_gaia_magnitude_err2',
-            'brightness_gaia_magnitude_err2',
+    def get_context_data(self, **kwargs):
+        """The filters are kept by the pagination links"""
+        context = super().get_context_data(**kwargs)
+        context['filter_query'] = filter_query(self.request)
+        return context
 
+def filter_query(request):
+    """The filters of the query string, without the pagination parameters"""
+    parameters = request.GET.copy()
+    for name in RESERVED:
+        parameters.pop(name, None)
+    return parameters.urlencode()
 
-            'star_planetary_system__hd_name',
-            'star_planetary_system__hip_name',
-            'star_planetary_system__tic_id',
-            'star_planetary_system__gaia_id',
-            'star_planetary_system__publication_reference',
-            'star_planetary_system__effective_temperature',
-            'star_planetary_system__effective_temperature_err1',
-            'star_planetary_system__effective_temperature_err2',
-            'star_planetary_system__effective_temperature_limit',
-            'star_planetary_system__radius',
-            'star_planetary_system__radius_err1',
-            'star_planetary_system__radius_err2',
-            'star_planetary_system__radius_limit',
-            'star_planetary_system__mass',
-            'star_planetary_system__mass_err1',
-            'star_planetary_system__mass_err2',
-            'star_planetary_system__mass_limit',
-            'star_planetary_system__measurement',
-            'star_planetary_system__measurement_err1',
-            'star_planetary_system__measurement_err2',
-            'star_planetary_system__measurement_limit',
-            'star_planetary_system__metallicity_ratio',
-            'star_planetary_system__surface_gravity',
-            'star_planetary_system__surface_gravity_err1',
-            'star_planetary_system__surface_gravity_err2',
-            'star_planetary_system__surface_gravity_limit',
-            'star_planetary_system__planetary_system_id',
+class StreamingView(View):
+    """Base of the views that stream their body, async_views.py reads it from async code"""
 
-            'star_planetary_system__spectral_type',
+    def streaming_response(self, content, **kwargs):
+        return StreamingHttpResponse(content, **kwargs)
 
+class PlanetarySystemsStreamView(StreamingView):
+    """
+    The whole catalog in one page, sent while it is read from the database:
+    the first bytes leave right away and only chunk_size planetary systems
+    are in memory at a time.
+    """
+    template_name = "planetary_systems/planetary_system_stream.html"
+    rows_template_name = "planetary_systems/planetary_system_rows.html"
+
+    # Planetary systems read and rendered together
+    chunk_size = 200
 
-            'planet_planetary_system',
-            'planet_planetary_system__name',
-            'planet_planetary_system__planet_letter',
-            'planet_planetary_system__explicit',
-            'planet_planetary_system__discovery_year',
-            'planet_planetary_system__controversial_flag',
-            'planet_planetary_system__publication_reference',
-            'planet_planetary_system__orbital_period',
-            'planet_planetary_system__orbital_period_err1',
-            'planet_planetary_system__orbital_period_err2',
-            'planet_planetary_system__orbital_period_limit',
-            'planet_planetary_system__orbit_semi_major_axis',
-            'planet_planetary_system__orbit_semi_major_axis_err1',
-            'planet_planetary_system__orbit_semi_major_axis_err2',
-            'planet_planetary_system__orbit_semi_major_axis_limit',
-            'planet_planetary_system__earth_radius',
-            'planet_planetary_system__earth_radius_err1',
-            'planet_planetary_system__earth_radius_err2',
-            'planet_planetary_system__earth_radius_limit',
-            'planet_planetary_system__jupiter_radius',
-            'planet_planetary_system__jupiter_radius_err1',
-            'planet_planetary_system__jupiter_radius_err2',
-            'planet_planetary_system__jupiter_radius_limit',
-            'planet_planetary_system__earth_mass',
-            'planet_planetary_system__earth_mass_err1',
-            'planet_planetary_system__earth_mass_err2',
-            'planet_planetary_system__earth_mass_limit',
-            'planet_planetary_system__jupiter_mass',
-            'planet_planetary_system__jupiter_mass_err1',
-            'planet_planetary_system__jupiter_mass_err2',
-            'planet_planetary_system__jupiter_mass_limit',
-            'planet_planetary_system__mass_provenance',
-            'planet_planetary_system__eccentricity',
-            'planet_planetary_system__eccentricity_err1',
-            'planet_planetary_system__eccentricity_err2',
-            'planet_planetary_system__eccentricity_limit',
-            'planet_planetary_system__insolation_flux',
-            'planet_planetary_system__insolation_flux_err1',
-            'planet_planetary_system__insolation_flux_err2',
-            'planet_planetary_system__insolation_flux_limit',
-            'planet_planetary_system__equilibrium_temperature',
-            'planet_planetary_system__equilibrium_temperature_err1',
-            'planet_planetary_system__equilibrium_temperature_err2',
-            'planet_planetary_system__equilibrium_temperature_limit',
-            'planet_planetary_system__transit_timing_variations',
-            'planet_planetary_system__date_last_update',
-            'planet_planetary_system__reference_date_publication',
-            'planet_planetary_system__release_date',
+    # Placeholder of the rows in the rendered page
+    rows_marker = '__planetary_system_rows__'
 
-            'planet_planetary_system__discovery_method__name',
-            'planet_planetary_system__discovery_facility__name',
-            'planet_planetary_system__solution_type__name'
+    def get(self, request, *args, **kwargs):
+        return self.streaming_response(self.stream(request))
 
-        ).annotate(
+    def stream(self, request):
+        page = get_template(self.template_name).render({'rows_marker': self.rows_marker}, request)
+        head, tail = page.split(self.rows_marker)
 
-            # Set alias for fields
-            planetary_system_name=F('name'),
-            planetary_system_number_of_stars=F('number_of_stars'),
-            planetary_system_number_of_planets=F('number_of_planets'),
-            planetary_system_publication_reference=F('publication_reference'),
-            planetary_system_right_ascension_sexagesimal=F('right_ascension_sexagesimal'),
-            planetary_system_right_ascension_decimal=F('right_ascension_decimal'),
-            planetary_system_declination_sexagesimal=F('declination_sexagesimal'),
-            planetary_system_declination_decimal=F('declination_decimal'),
-            planetary_system_distance=F('distance'),
-            planetary_system_distance_err1=F('distance_err1'),
-            planetary_system_distance_err2=F('distance_err2'),
-            planetary_system_brightness_v_magnitude=F('brightness_v_magnitude'),
-            planetary_system_brightness_v_magnitude_err1=F('brightness_v_magnitude_err1'),
-            planetary_system_brightness_v_magnitude_err2=F('brightness_v_magnitude_err2'),
-            planetary_system_brightness_ks_magnitude=F('brightness_ks_magnitude'),
-            planetary_system_brightness_ks_magnitude_err1=F('brightness_ks_magnitude_err1'),
-            planetary_system_brightness_ks_magnitude_err2=F('brightness_ks_magnitude_err2'),
-            planetary_system_brightness_gaia_magnitude=F('brightness_gaia_magnitude'),
-            planetary_system_brightness_gaia_magnitude_err1=F('brightness_gaia_magnitude_err1'),
-            planetary_system_brightness_gaia_magnitude_err2=F('brightness_gaia_magnitude_err2'),
+        yield head
 
-            star_hd_name=F('star_planetary_system__hd_name'),
-            star_hip_name=F('star_planetary_system__hip_name'),
-            star_tic_id=F('star_planetary_system__tic_id'),
-            star_gaia_id=F('star_planetary_system__gaia_id'),
-            star_publication_reference=F('star_planetary_system__publication_reference'),
-            star_effective_temperature=F('star_planetary_system__effective_temperature'),
-            star_effective_temperature_err1=F('star_planetary_system__effective_temperature_err1'),
-            star_effective_temperature_err2=F('star_planetary_system__effective_temperature_err2'),
-            star_effective_temperature_limit=F('star_planetary_system__effective_temperature_limit'),
-            star_radius=F('star_planetary_system__radius'),
-            star_radius_err1=F('star_planetary_system__radius_err1'),
-            star_radius_err2=F('star_planetary_system__radius_err2'),
-            star_radius_limit=F('star_planetary_system__radius_limit'),
-            star_mass=F('star_planetary_system__mass'),
-            star_mass_err1=F('star_planetary_system__mass_err1'),
-            star_mass_err2=F('star_planetary_system__mass_err2'),
-            star_mass_limit=F('star_planetary_system__mass_limit'),
-            star_measurement=F('star_planetary_system__measurement'),
-            star_measurement_err1=F('star_planetary_system__measurement_err1'),
-            star_measurement_err2=F('star_planetary_system__measurement_err2'),
-            star_measurement_limit=F('star_planetary_system__measurement_limit'),
-            star_metallicity_ratio=F('star_planetary_system__metallicity_ratio'),
-            star_surface_gravity=F('star_planetary_system__surface_gravity'),
-            star_surface_gravity_err1=F('star_planetary_system__surface_gravity_err1'),
-            star_surface_gravity_err2=F('star_planetary_system__surface_gravity_err2'),
-            star_surface_gravity_limit=F('star_planetary_system__surface_gravity_limit'),
-            star_planetary_system_id=F('star_planetary_system__planetary_system_id'),
-            star_spectral_type=F('star_planetary_system__spectral_type'),
+        rows_template = get_template(self.rows_template_name)
+        for chunk in planetary_system_tree_chunks(self.chunk_size):
+            yield rows_template.render({'object_list': chunk}, request)
 
-            planet_id=F('planet_planetary_system'),
-            planet_name=F('planet_planetary_system__name'),
-            planet_planet_letter=F('planet_planetary_system__planet_letter'),
-            planet_explicit=F('planet_planetary_system__explicit'),
-            planet_discovery_year=F('planet_planetary_system__discovery_year'),
-            planet_controversial_flag=F('planet_planetary_system__controversial_flag'),
-            planet_publication_reference=F('planet_planetary_system__publication_reference'),
-            planet_orbital_period=F('planet_planetary_system__orbital_period'),
-            planet_orbital_period_err1=F('planet_planetary_system__orbital_period_err1'),
-            planet_orbital_period_err2=F('planet_planetary_system__orbital_period_err2'),
-            planet_orbital_period_limit=F('planet_planetary_system__orbital_period_limit'),
-            planet_orbit_semi_major_axis=F('planet_planetary_system__orbit_semi_major_axis'),
-            planet_orbit_semi_major_axis_err1=F('planet_planetary_system__orbit_semi_major_axis_err1'),
-            planet_orbit_semi_major_axis_err2=F('planet_planetary_system__orbit_semi_major_axis_err2'),
-            planet_orbit_semi_major_axis_limit=F('planet_planetary_system__orbit_semi_major_axis_limit'),
-            planet_earth_radius=F('planet_planetary_system__earth_radius'),
-            planet_earth_radius_err1=F('planet_planetary_system__earth_radius_err1'),
-            planet_earth_radius_err2=F('planet_planetary_system__earth_radius_err2'),
-            planet_earth_radius_limit=F('planet_planetary_system__earth_radius_limit'),
-            planet_jupiter_radius=F('planet_planetary_system__jupiter_radius'),
-            planet_jupiter_radius_err1=F('planet_planetary_system__jupiter_radius_err1'),
-            planet_jupiter_radius_err2=F('planet_planetary_system__jupiter_radius_err2'),
-            planet_jupiter_radius_limit=F('planet_planetary_system__jupiter_radius_limit'),
-            planet_earth_mass=F('planet_planetary_system__earth_mass'),
-            planet_earth_mass_err1=F('planet_planetary_system__earth_mass_err1'),
-            planet_earth_mass_err2=F('planet_planetary_system__earth_mass_err2'),
-            planet_earth_mass_limit=F('planet_planetary_system__earth_mass_limit'),
-            planet_jupiter_mass=F('planet_planetary_system__jupiter_mass'),
-            planet_jupiter_mass_err1=F('planet_planetary_system__jupiter_mass_err1'),
-            planet_jupiter_mass_err2=F('planet_planetary_system__jupiter_mass_err2'),
-            planet_jupiter_mass_limit=F('planet_planetary_system__jupiter_mass_limit'),
-            planet_mass_provenance=F('planet_planetary_system__mass_provenance'),
-            planet_eccentricity=F('planet_planetary_system__eccentricity'),
-            planet_eccentricity_err1=F('planet_planetary_system__eccentricity_err1'),
-            planet_eccentricity_err2=F('planet_planetary_system__eccentricity_err2'),
-            planet_eccentricity_limit=F('planet_planetary_system__eccentricity_limit'),
-            planet_insolation_flux=F('planet_planetary_system__insolation_flux'),
-            planet_insolation_flux_err1=F('planet_planetary_system__insolation_flux_err1'),
-            planet_insolation_flux_err2=F('planet_planetary_system__insolation_flux_err2'),
-            planet_insolation_flux_limit=F('planet_planetary_system__insolation_flux_limit'),
-            planet_equilibrium_temperature=F('planet_planetary_system__equilibrium_temperature'),
-            planet_equilibrium_temperature_err1=F('planet_planetary_system__equilibrium_temperature_err1'),
-            planet_equilibrium_temperature_err2=F('planet_planetary_system__equilibrium_temperature_err2'),
-            planet_equilibrium_temperature_limit=F('planet_planetary_system__equilibrium_temperature_limit'),
-            planet_transit_timing_variations=F('planet_planetary_system__transit_timing_variations'),
-            planet_date_last_update=F('planet_planetary_system__date_last_update'),
-            planet_reference_date_publication=F('planet_planetary_system__reference_date_publication'),
-            planet_release_date=F('planet_planetary_system__release_date'),
-            planet_discovery_method_name=F('planet_planetary_system__discovery_method__name'),
-            planet_discovery_facility_name=F('planet_planetary_system__discovery_facility__name'),
-            planet_solution_type_name=F('planet_planetary_system__solution_type__name'),
+        yield tail
+
+class CatalogExportView(StreamingView):
+    """
+    The denormalized catalog rows as csv or JSON lines, streamed while they are
+    read from the database.
 
-            # Group by to remove duplicated rows from query
-            # https://stackoverflow.com/a/45547675/9655579
-            count=Count('planet_id')
+    ?fields=planet_name,star_hd_name selects the columns (all of them by
+    default) and the filters of filters.py select the planets, e.g.
+    ?planet_discovery_year=2016
+    """
+    # csv or jsonl, see exports.py
+    format = 'csv'
+
+    def get(self, request, *args, **kwargs):
+        fields = request.GET.get('fields')
+        columns = fields.split(',') if fields else list(catalog.COLUMNS)
+        unknown = [column for column in columns if column not in catalog.COLUMNS]
+        if unknown:
+            return HttpResponseBadRequest('Unknown columns: %s' % ', '.join(unknown))
+
+        try:
+            rows = catalog.CatalogRows(columns, filter_conditions(Planet, request.GET))
+        except FilterError as error:
+            return HttpResponseBadRequest(str(error))
+
+        serialize, content_type = FORMATS[self.format]
+        response = self.streaming_response(
+            serialize(columns, rows),
+            content_type=content_type
         )
+        response['Content-Disposition'] = 'attachment; filename="planetary_systems.%s"' % self.format
+        return response
+
+class MetricsView(View):
+    """
+    Histograms of the requests served by this process, for Prometheus to
+    scrape. Only the addresses of settings.METRICS_ALLOWED_IPS see them, for
+    the others the page does not exist: none by default.
+    """
 
-        return planetary_systems
+    def get(self, request, *args, **kwargs):
+        if request.META.get('REMOTE_ADDR') not in getattr(settings, 'METRICS_ALLOWED_IPS', ()):
+            raise Http404
+        return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 # References
-# https://docs.djangoproject.com/en/3.0/topics/class-based-views/generic-display/
\ No newline at end of file
+# https://docs.djangoproject.com/en/3.1/ref/request-response/#streaminghttpresponse-objects
+# https://docs.djangoproject.com/en/3.0/topics/class-based-views/generic-display/
+# https://docs.djangoproject.com/en/3.1/howto/outputting-csv/
+# https://prometheus.io/docs/instrumenting/exposition_formats/
\ No newline at end of file
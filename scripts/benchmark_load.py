@@ -0,0 +1,136 @@
+# https://django-extensions.readthedocs.io/en/latest/runscript.html
+
+# python3 manage.py runscript benchmark_load
+
+import datetime
+import json
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from django.conf import settings
+from django.core.management.base import CommandError
+
+from planetary_systems.loader.bulk import DEFAULT_BATCH_SIZE
+from planetary_systems.loader.synthetic import write_synthetic_archive
+from scripts.benchmark_process import setup_database, timed_load
+from scripts.many_load import parse_script_args
+
+"""
+IMPORTANT: This file is executed where the manage.py file resides with the next command :
+python3 manage.py runscript benchmark_load
+
+Load synthetic archive files (see planetary_systems/loader/synthetic.py) into
+an empty test database and report the time of every phase of the loader:
+
+parse       read the csv file and decode the columns (ArchiveReader)
+resolve     resolve the lookup tables, planetary systems and stars in memory
+insert      write the rows to the database
+
+with the rows per second and the peak memory (RSS) of the load. Every load
+runs in a new process (see benchmark_process.py), so the peak memory is
+the one of that load only.
+The files are generated once in BENCHMARK_DIR and kept for the next runs.
+
+Options are passed as key=value pairs, for example:
+python3 manage.py runscript benchmark_load --script-args rows=10000,100000 databases=sqlite
+
+rows        comma separated sizes of the files (default 10000,100000,1000000)
+databases   sqlite: a test database in a temporary SQLite file
+            mysql: a test database on the MySQL server of the settings
+            (default sqlite,mysql, a database that can't be reached is skipped)
+engine      bulk or infile, see many_load (default bulk)
+batch_size  rows per INSERT statement (default 2000)
+seed        seed of the synthetic files (default 0)
+output      file the results are appended to, one JSON object per load
+            (default BENCHMARK_DIR/load.jsonl)
+"""
+
+DEFAULT_ROWS = '10000,100000,1000000'
+
+DATABASES = ('sqlite', 'mysql')
+
+ENGINES = ('bulk', 'infile')
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def archive_file(rows, seed):
+    """The synthetic file of the size, written the first time it is asked for"""
+    settings.BENCHMARK_DIR.mkdir(parents=True, exist_ok=True)
+    path = settings.BENCHMARK_DIR / ('archive_%d_%d.csv' % (rows, seed))
+    if not path.exists():
+        start = time.perf_counter()
+        partial = path.with_suffix('.partial')
+        write_synthetic_archive(partial, rows, seed=seed)
+        partial.rename(path)
+        print('Generated %s in %.1f s' % (path, time.perf_counter() - start))
+    return path
+
+
+def parse_list(value, choices=None):
+    items = [item for item in value.split(',') if item]
+    for item in items:
+        if choices is not None and item not in choices:
+            raise CommandError('Unknown value %r, choose from: %s' % (item, ', '.join(choices)))
+    return items
+
+
+def run(*args):
+    options = parse_script_args(args)
+
+    sizes = [int(rows) for rows in parse_list(options.get('rows', DEFAULT_ROWS))]
+    databases = parse_list(options.get('databases', ','.join(DATABASES)), DATABASES)
+    engine = options.get('engine', 'bulk')
+    if engine not in ENGINES:
+        raise CommandError('Unknown engine %r, choose one of: %s' % (engine, ', '.join(ENGINES)))
+    batch_size = int(options.get('batch_size', DEFAULT_BATCH_SIZE))
+    seed = int(options.get('seed', 0))
+    output = options.get('output') or settings.BENCHMARK_DIR / 'load.jsonl'
+
+    revision = git_revision()
+    print('%-7s %-7s %9s %8s %8s %8s %8s %10s %8s' % (
+        'db', 'engine', 'rows', 'parse', 'resolve', 'insert', 'total', 'rows/s', 'rss MB'
+    ))
+    for rows in sizes:
+        path = archive_file(rows, seed)
+        for database in databases:
+            # A new process per load, spawned so it does not inherit the memory of this one
+            with ProcessPoolExecutor(
+                1, mp_context=get_context('spawn'), initializer=setup_database, initargs=(database,)
+            ) as pool:
+                try:
+                    result = pool.submit(timed_load, database, str(path), engine, batch_size).result()
+                except Exception as error:
+                    print('%-7s skipped: %s' % (database, error))
+                    continue
+
+            phases = result['phases']
+            rss = result['peak_rss_mb']
+            print('%-7s %-7s %9d %8.2f %8.2f %8.2f %8.2f %10.0f %8s' % (
+                database, engine, rows,
+                phases['parse'], phases['resolve'], phases['insert'], result['seconds'],
+                rows / result['seconds'],
+                '-' if rss is None else '%.0f' % rss,
+            ))
+
+            with open(output, 'a') as fhand:
+                fhand.write(json.dumps(dict(
+                    result,
+                    database=database,
+                    engine=engine,
+                    rows=rows,
+                    rows_per_second=rows / result['seconds'],
+                    batch_size=batch_size,
+                    seed=seed,
+                    revision=revision,
+                    date=datetime.datetime.now().isoformat(timespec='seconds'),
+                )) + '\n')
@@ -0,0 +1,120 @@
+"""
+The load process of benchmark_load.py, spawned for every measured load
+
+The process imports this module to unpickle its initializer, before Django
+is set up: the settings are changed and django.setup() called by
+setup_database(), and the loader, which imports the models, only once
+timed_load() runs.
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import django
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.db import connection
+
+try:
+    import resource  # https://docs.python.org/3/library/resource.html
+except ImportError:
+    # Not on Windows
+    resource = None
+
+PHASES = ('parse', 'resolve', 'insert')
+
+
+class PhaseTimer:
+    """
+    Seconds spent in every phase, a phase called inside another one (a flush
+    while a row is added) is only counted in the inner one
+    """
+
+    def __init__(self, phases=PHASES):
+        self.seconds = dict.fromkeys(phases, 0.0)
+        # Seconds of the inner phases of the running ones
+        self.inner = []
+
+    def timed(self, phase, function):
+        def wrapper(*args, **kwargs):
+            self.inner.append(0.0)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                self.seconds[phase] += elapsed - self.inner.pop()
+                if self.inner:
+                    self.inner[-1] += elapsed
+        return wrapper
+
+    def iterate(self, phase, iterable):
+        """Time the next() calls of the iterable"""
+        next_item = self.timed(phase, iter(iterable).__next__)
+        while True:
+            try:
+                yield next_item()
+            except StopIteration:
+                return
+
+
+def peak_rss():
+    """Peak resident memory of the process in MB, None where it is not known"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def setup_database(database):
+    """
+    Initializer of the load process: point the default database to the
+    benchmarked one, then set up Django like the django.setup initializer of
+    loader/parallel.py (the models read the database settings when they are
+    imported)
+    """
+    if database == 'sqlite':
+        fd, path = tempfile.mkstemp(prefix='benchmark_', suffix='.sqlite3')
+        os.close(fd)
+        settings.DATABASES['default'] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': ':memory:',
+            # A file, an in-memory database would count in the peak memory
+            'TEST': {'NAME': path},
+        }
+    django.setup()
+
+
+def timed_load(database, path, engine, batch_size):
+    """Load the file into a new test database, return the measures of the load"""
+    from planetary_systems.loader.bulk import BulkLoader
+    from planetary_systems.loader.infile import infile_loader
+    from planetary_systems.loader.reader import ArchiveReader
+
+    if connection.vendor != database:
+        raise CommandError('the default database is %s' % connection.vendor)
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        timer = PhaseTimer()
+        loader = infile_loader(batch_size=batch_size) if engine == 'infile' else BulkLoader(batch_size=batch_size)
+        loader.add_row = timer.timed('resolve', loader.add_row)
+        loader.flush = timer.timed('insert', loader.flush)
+
+        start = time.perf_counter()
+        with ArchiveReader(path) as reader:
+            counts = loader.load(timer.iterate('parse', reader))
+        total = time.perf_counter() - start
+
+        # What the engine does after the last row (LOAD DATA of the staging files)
+        timer.seconds['insert'] = total - timer.seconds['parse'] - timer.seconds['resolve']
+        return {
+            'seconds': total,
+            'phases': timer.seconds,
+            'counts': counts,
+            'peak_rss_mb': peak_rss(),
+        }
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
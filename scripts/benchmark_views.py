@@ -0,0 +1,199 @@
+# https://django-extensions.readthedocs.io/en/latest/runscript.html
+
+# python3 manage.py runscript benchmark_views
+
+import datetime
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import Client, RequestFactory
+from django.test.utils import override_settings
+
+from planetary_systems.caching import catalog_cache
+from planetary_systems.loader.bulk import BulkLoader
+from planetary_systems.loader.reader import ArchiveReader
+from planetary_systems.loader.synthetic import write_synthetic_archive
+from planetary_systems.models import PlanetarySystem
+from planetary_systems.views import PlanetarySystemsListView
+from scripts.benchmark_load import git_revision
+from scripts.benchmark_process import PhaseTimer
+from scripts.many_load import parse_script_args
+
+"""
+IMPORTANT: This file is executed where the manage.py file resides with the next command :
+python3 manage.py runscript benchmark_views
+
+Seed an empty test database with a synthetic archive (see
+planetary_systems/loader/synthetic.py) or fixtures, then request pages of
+PlanetarySystemsListView and report for every scenario:
+
+total       seconds of the whole request, with the middlewares (median)
+query       seconds spent in the SQL statements
+materialize seconds building the rows of the page, without the SQL time
+render      seconds rendering the template, without the SQL time
+queries     number of SQL statements, checked against QUERY_BOUNDS
+
+The page cache is cleared before every request. The script fails when a
+scenario runs more queries than its bound, so an N+1 regression is caught.
+
+Options are passed as key=value pairs, for example:
+python3 manage.py runscript benchmark_views --script-args rows=100000 repeat=10
+
+rows        rows of the synthetic archive (default 10000)
+fixture     fixture files loaded with loaddata instead, comma separated
+repeat      requests per scenario (default 5)
+seed        seed of the synthetic archive (default 0)
+output      file the results are appended to, one JSON object per scenario
+            (default BENCHMARK_DIR/views.jsonl)
+"""
+
+PHASES = ('query', 'materialize', 'render')
+
+# Query string of every scenario, {middle} is the cursor of the middle planetary system
+SCENARIOS = {
+    'first page': 'page_size=20',
+    'deep page': 'page_size=20&after={middle}',
+    'large page': 'page_size=200',
+    'filtered page': 'page_size=20&star_effective_temperature__range=5000,6000&planet_orbital_period__lt=10',
+}
+
+# The pages cached while the benchmark runs, not the ones of the site
+BENCHMARK_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Most SQL statements of a page: the planetary systems, their stars and their planets
+QUERY_BOUNDS = {
+    'first page': 3,
+    'deep page': 3,
+    'large page': 3,
+    'filtered page': 3,
+}
+
+
+class TimedListView(PlanetarySystemsListView):
+    """The list view, with its phases timed by the timer"""
+    timer = None
+
+    def get_context_data(self, **kwargs):
+        # The page is read by the paginator
+        return self.timer.timed('materialize', super().get_context_data)(**kwargs)
+
+    def render_to_response(self, context, **response_kwargs):
+        response = super().render_to_response(context, **response_kwargs)
+        response.render = self.timer.timed('render', response.render)
+        return response
+
+
+def timed_phases(query_string):
+    """(seconds per phase, number of queries) of one request to the view"""
+    timer = PhaseTimer(PHASES)
+    queries = 0
+
+    def timed_execute(execute, sql, params, many, context):
+        nonlocal queries
+        queries += 1
+        return timer.timed('query', execute)(sql, params, many, context)
+
+    request = RequestFactory().get('/planetary_systems/?%s' % query_string)
+    with connection.execute_wrapper(timed_execute):
+        response = TimedListView.as_view(timer=timer)(request)
+        if response.status_code != 200:
+            raise CommandError('%s: status %d' % (query_string, response.status_code))
+        # Rendered here like Django does after the view, so the queries of
+        # the template are counted and timed too
+        response.render()
+    return timer.seconds, queries
+
+
+def seed_database(options):
+    """Fill the test database, return a description of the data"""
+    if options.get('fixture'):
+        call_command('loaddata', *options['fixture'].split(','), verbosity=0)
+        return {'fixture': options['fixture']}
+
+    rows = int(options.get('rows', 10000))
+    seed = int(options.get('seed', 0))
+    fd, path = tempfile.mkstemp(suffix='.csv')
+    os.close(fd)
+    try:
+        write_synthetic_archive(path, rows, seed=seed)
+        with ArchiveReader(path) as reader:
+            BulkLoader().load(reader)
+    finally:
+        os.remove(path)
+    return {'rows': rows, 'seed': seed}
+
+
+def measure(name, query_string, repeat):
+    """Median seconds of the requests of a scenario, end to end and per phase"""
+    client = Client()
+    totals = []
+    phases = []
+    queries = 0
+    for _ in range(repeat):
+        catalog_cache().clear()
+        start = time.perf_counter()
+        response = client.get('/planetary_systems/?%s' % query_string)
+        totals.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            raise CommandError('%s: status %d' % (name, response.status_code))
+
+        catalog_cache().clear()
+        seconds, queries = timed_phases(query_string)
+        phases.append(seconds)
+
+    return {
+        'scenario': name,
+        'query_string': query_string,
+        'total': statistics.median(totals),
+        'phases': {phase: statistics.median(seconds[phase] for seconds in phases) for phase in PHASES},
+        'queries': queries,
+    }
+
+
+# The test client sends the testserver host, as in the tests
+@override_settings(CACHES=BENCHMARK_CACHES, ALLOWED_HOSTS=['testserver'])
+def run(*args):
+    options = parse_script_args(args)
+    repeat = int(options.get('repeat', 5))
+    output = options.get('output') or settings.BENCHMARK_DIR / 'views.jsonl'
+
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        data = seed_database(options)
+        ids = list(PlanetarySystem.objects.order_by('id').values_list('id', flat=True))
+        middle = ids[len(ids) // 2] if ids else 0
+        results = [measure(name, query_string.format(middle=middle), repeat) for name, query_string in SCENARIOS.items()]
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    print('%-14s %8s %8s %12s %8s %8s' % ('scenario', 'total', 'query', 'materialize', 'render', 'queries'))
+    for result in results:
+        print('%-14s %8.4f %8.4f %12.4f %8.4f %8d' % (
+            result['scenario'], result['total'], result['phases']['query'],
+            result['phases']['materialize'], result['phases']['render'], result['queries']
+        ))
+
+    settings.BENCHMARK_DIR.mkdir(parents=True, exist_ok=True)
+    revision = git_revision()
+    date = datetime.datetime.now().isoformat(timespec='seconds')
+    with open(output, 'a') as fhand:
+        for result in results:
+            fhand.write(json.dumps(dict(result, data=data, repeat=repeat, revision=revision, date=date)) + '\n')
+
+    over = [
+        '%s: %d queries, at most %d' % (result['scenario'], result['queries'], QUERY_BOUNDS[result['scenario']])
+        for result in results if result['queries'] > QUERY_BOUNDS[result['scenario']]
+    ]
+    if over:
+        raise CommandError('Query bounds exceeded: %s' % '; '.join(over))
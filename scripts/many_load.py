@@ -1,9 +1,12 @@
-import csv  # https://docs.python.org/3/library/csv.html
-
 # https://django-extensions.readthedocs.io/en/latest/runscript.html
 
 # python3 manage.py runscript many_load
 
+from contextlib import nullcontext
+
+from django.core.management.base import CommandError
+from django.db import transaction
+
 from planetary_systems.models import (
     PlanetarySystem,
     SpectralType,
@@ -13,196 +16,299 @@ from planetary_systems.models import (
     SolutionType,
     Planet
 )
+from planetary_systems.loader.bulk import BulkLoader, DEFAULT_BATCH_SIZE, clear_tables
+from planetary_systems.loader.checkpoint import CheckpointedLoader, RejectFile, record_rows, reject_path
+from planetary_systems.loader.delta import DeltaLoader
+from planetary_systems.loader.dimensions import dimension_caches
+from planetary_systems.loader.infile import infile_loader
+from planetary_systems.loader.parallel import ParallelLoader
+from planetary_systems.loader.reader import ArchiveReader
+from planetary_systems.loader.swap import ShadowLoad
+from planetary_systems.caching import bump_dataset_version
+from planetary_systems.sky import sky_cell
+from planetary_systems.snapshot import build_snapshot, numpy
+from planetary_systems.summaries import refresh_summaries
+from planetary_systems.versions import finish_run, record_load, resume_run, start_run
+from planetary_systems.loader.columns import (
+    SPECTRAL_TYPE_COLUMN,
+    DISCOVERY_METHOD_COLUMN,
+    DISCOVERY_FACILITY_COLUMN,
+    SOLUTION_TYPE_COLUMN,
+    PLANETARY_SYSTEM_COLUMNS,
+    STAR_COLUMNS,
+    PLANET_COLUMNS
+)
 
 """
 IMPORTANT: This file is executed where the manage.py file resides with the next command :
 python3 manage.py runscript many_load
+
+Options are passed as key=value pairs, for example:
+python3 manage.py runscript many_load --script-args engine=bulk batch_size=5000
+
+file        csv file to load (default PS_2021.01.08_12.13.30.csv)
+mode        full: delete all data and insert every row again (default)
+            delta: insert, update or retire only the changed planets, the
+                   retired rows are kept (see planetary_systems/versions.py)
+            swap: load into shadow tables and swap them with the live tables
+                  in one atomic rename, the site never sees partial data
+engine      bulk: chunked bulk_create calls (default)
+            rows: one get_or_create per table and row
+            infile: staging files imported with LOAD DATA LOCAL INFILE on
+                    MySQL, bulk on any other database
+batch_size  rows per INSERT statement of the bulk engine and the delta mode
+workers     processes that parse the csv file in a full load with the bulk
+            engine (default 1, no process pool). The writers insert from
+            their own connections, outside any transaction and without
+            checkpoints: a load that fails leaves partial tables until the
+            next full load, and it can not be resumed. mode=swap keeps the
+            site on the previous data instead.
+writers     database connections that insert the planets when workers is
+            more than 1 (default: the number of workers)
+snapshot    0 skips the rebuild of the columnar snapshot of the numeric
+            columns after the load (see planetary_systems/snapshot.py)
+rejects     csv file of the rows that can not be decoded or do not fit the
+            constraints of their model fields, with the reasons
+            (default: the file name ending with .rejects.csv), 0 stops the
+            load at the first one
+resume      continue the last load of the file when it did not finish. A full
+            load with the bulk engine commits its rows in batches and goes on
+            after the last committed one, the other loads start again: a
+            delta or swap load never leaves partial data. Not with workers.
+
+Every run is recorded in the LoadRun table, its id is the version the new
+rows are stamped with.
 """
 
-def run():
-    # Open and read csv file
-    fhand = open('PS_2021.01.08_12.13.30.csv')
-    reader = csv.reader(fhand)
+DEFAULT_FILE = 'PS_2021.01.08_12.13.30.csv'
 
-    # next(reader)  # Advance past the header
+MODES = ('full', 'delta', 'swap')
 
-    # Skip header rows
-    # Source: https://stackoverflow.com/a/40404006/9655579
-    for skip in range(104):
-        next(reader)
+ENGINES = ('bulk', 'rows', 'infile')
 
-    # Delete all data from tables to insert them again
 
-    Planet.objects.all().delete()
+def parse_script_args(args):
+    """Turn the runscript --script-args values into a dict, a bare word is a True flag"""
+    options = {}
+    for arg in args:
+        key, separator, value = arg.partition('=')
+        options[key] = value if separator else True
+    return options
 
-    Star.objects.all().delete()
 
-    SolutionType.objects.all().delete()
+def load_row_by_row(rows, dimensions, version=None):
+    """
+    get_or_create
+    This statement search if the data already exists and if it does exist it brings the data
+    to save it with the table related foreign key or if it does not exist it save it
+    and then save the another table with the id related foreign key.
 
-    DiscoveryFacility.objects.all().delete()
+    The lookup tables are resolved through the dimension caches instead, so
+    their names are only queried once per run. The new rows are stamped with
+    the version.
+    """
+    for row in rows:
+        planetary_system_columns = {field: row[index] for field, index in PLANETARY_SYSTEM_COLUMNS}
+        planetary_system, created = PlanetarySystem.objects.get_or_create(
+            **planetary_system_columns,
+            defaults={
+                'sky_cell': sky_cell(
+                    planetary_system_columns['right_ascension_decimal'],
+                    planetary_system_columns['declination_decimal']
+                ),
+                'introduced_in': version,
+            }
+        )
 
-    DiscoveryMethod.objects.all().delete()
+        spectral_type_id = dimensions[SpectralType].get(row[SPECTRAL_TYPE_COLUMN])
+        discovery_method_id = dimensions[DiscoveryMethod].get(row[DISCOVERY_METHOD_COLUMN])
+        discovery_facility_id = dimensions[DiscoveryFacility].get(row[DISCOVERY_FACILITY_COLUMN])
+        solution_type_id = dimensions[SolutionType].get(row[SOLUTION_TYPE_COLUMN])
 
-    SpectralType.objects.all().delete()
+        # Insert the names seen for the first time before referencing them
+        for cache in dimensions.values():
+            cache.flush()
 
-    PlanetarySystem.objects.all().delete()
+        Star.objects.get_or_create(
+            planetary_system=planetary_system,
+            spectral_type_id=spectral_type_id,
+            **{field: row[index] for field, index in STAR_COLUMNS},
+            defaults={'introduced_in': version}
+        )
 
-    # Format
-    # email,role,course
-    # jane@tsugi.org,I,Python
-    # ed@tsugi.org,L,Python
+        planet = Planet(
+            planetary_system=planetary_system,
+            discovery_method_id=discovery_method_id,
+            discovery_facility_id=discovery_facility_id,
+            solution_type_id=solution_type_id,
+            introduced_in=version,
+            **{field: row[index] for field, index in PLANET_COLUMNS}
+        )
 
+        planet.save()
 
-    # Iterate over each row
-    for row in reader:
-        print(row)
 
-        """
-        get_or_create
-        This statement search if the data already exists and if it does exist it brings the data
-        to save it with the table related foreign key or if it does not exist it save it
-        and then save the another table with the id related foreign key.
-        """
+def sync(rows, batch_size, version):
+    """Delta mode, the changes are applied in one transaction so the site never sees half of them"""
+    with transaction.atomic():
+        loader = DeltaLoader(batch_size=batch_size, version=version)
+        counts = loader.load(rows)
 
-        index = 0
-        for column in row:
+    for model_name, count in counts.items():
+        print('%s: %d rows inserted' % (model_name, count))
+    for model_name, count in loader.updated.items():
+        print('%s: %d rows updated' % (model_name, count))
+    for model_name, count in loader.deleted.items():
+        print('%s: %d rows retired' % (model_name, count))
+    print('Planet: %d rows unchanged' % loader.unchanged)
+    return loader.changes
 
-            """
-            If the column is empty set none to be able to save the entire row 
-            with some null columns
-            """
-            if not column:
-                row[index] = None
-                # print(column)
-            index = index + 1
 
-        planetary_system, created = PlanetarySystem.objects.get_or_create(
-            name = row[1],
-            number_of_stars = row[8],
-            number_of_planets = row[9],
-            publication_reference = row[77],
-            right_ascension_sexagesimal = row[78],
-            right_ascension_decimal = row[79],
-            declination_sexagesimal = row[80],
-            declination_decimal = row[81],
-            distance = row[82],
-            distance_err1 = row[83],
-            distance_err2 = row[84],
-            brightness_v_magnitude = row[85],
-            brightness_v_magnitude_err1 = row[86],
-            brightness_v_magnitude_err2 = row[87],
-            brightness_ks_magnitude = row[88],
-            brightness_ks_magnitude_err1 = row[89],
-            brightness_ks_magnitude_err2 = row[90],
-            brightness_gaia_magnitude = row[91],
-            brightness_gaia_magnitude_err1 = row[92],
-            brightness_gaia_magnitude_err2 = row[93],
-        )
+def run(*args):
+    options = parse_script_args(args)
+    path = options.get('file', DEFAULT_FILE)
+    mode = options.get('mode', 'full')
+    engine = options.get('engine', 'bulk')
+
+    version = None
+    if options.get('resume', '0') != '0':
+        if int(options.get('workers', 1)) > 1:
+            raise CommandError('resume does not apply to workers, the parallel load has no checkpoints')
+        version = resume_run(path, mode, engine)
+        if version is None:
+            print('Nothing to resume, the load starts from the beginning')
+        else:
+            print('Resuming version %d after line %d' % (version.pk, version.line_number))
+    if version is None:
+        version = start_run(path, mode, engine)
+
+    changes = None
+    # A resumed run may only miss the rebuilds after the load
+    if version.loaded_on is None:
+        changes = load(options, version)
+    record_load(version)
+    after_load(options, changes)
+    finish_run(version)
+    if version.rows_rejected:
+        print('%d rows rejected, see %s' % (version.rows_rejected, version.reject_file))
+    print('Version %d: %d planets introduced, %d retired' % (
+        version.pk, version.planets_introduced, version.planets_retired
+    ))
+
+
+def after_load(options, changes=None):
+    """
+    Rebuild what is derived from the loaded tables, changes are the summary
+    groups touched by a delta load (everything is computed again without them)
+    """
+    written = refresh_summaries(changes)
+    print('Summaries: %d rows written' % written)
 
-        # Test if variable is None
-        # Source: https://stackoverflow.com/a/43934358/9655579
-        if row[55] is None:
-            spectral_type = None
+    # The cached pages show the previous data
+    bump_dataset_version()
+
+    if options.get('snapshot', '1') != '0':
+        if numpy is None:
+            print('Snapshot skipped: numpy is not installed')
         else:
-            spectral_type, created = SpectralType.objects.get_or_create(
-                name=row[55]
+            manifest = build_snapshot()
+            for name, table in manifest['tables'].items():
+                print('Snapshot %s: %d rows, %d columns' % (name, table['rows'], len(table['columns'])))
+
+
+def open_rejects(options, version=None):
+    """The reject file of the load, nothing with rejects=0: the first invalid row stops it"""
+    path = options.get('rejects') or (version and version.reject_file) or reject_path(options.get('file', DEFAULT_FILE))
+    if path == '0':
+        return nullcontext()
+
+    resume_line = None
+    if version is not None:
+        version.reject_file = path
+        version.save(update_fields=['reject_file'])
+        # The rejects before the checkpoint are not read again
+        if version.checkpointed_on is not None:
+            resume_line = version.line_number
+    return RejectFile(path, resume_line)
+
+
+def load(options, version=None):
+    """Load the csv file stamped with the version, return the summary changes of a delta load"""
+    mode = options.get('mode', 'full')
+    if mode not in MODES:
+        raise CommandError('Unknown mode %r, choose one of: %s' % (mode, ', '.join(MODES)))
+
+    engine = options.get('engine', 'bulk')
+    if engine not in ENGINES:
+        raise CommandError('Unknown engine %r, choose one of: %s' % (engine, ', '.join(ENGINES)))
+
+    batch_size = int(options.get('batch_size', DEFAULT_BATCH_SIZE))
+
+    workers = int(options.get('workers', 1))
+    if workers > 1 and (mode != 'full' or engine != 'bulk'):
+        raise CommandError('workers only applies to mode=full with engine=bulk')
+
+    changes = None
+    with open_rejects(options, version) as rejects:
+        if workers > 1:
+            clear_tables()
+            loader = ParallelLoader(
+                batch_size=batch_size,
+                workers=workers,
+                writers=int(options.get('writers', workers)),
+                version=version,
+                rejects=rejects
             )
+            counts = loader.load_file(options.get('file', DEFAULT_FILE))
+            for model_name, count in counts.items():
+                print('%s: %d rows inserted' % (model_name, count))
+            for cache in loader.dimensions.values():
+                print(cache.stats())
+            rows_read = loader.rows_read
+        else:
+            # Open and read csv file, the rows are decoded while they are loaded
+            with ArchiveReader(options.get('file', DEFAULT_FILE), rejects=rejects) as rows:
+                changes = load_rows(rows, mode, engine, batch_size, version)
+                rows_read = rows.rows_read
 
-        star, created = Star.objects.get_or_create(
-            hd_name = row[3],
-            hip_name = row[4],
-            tic_id = row[5],
-            gaia_id = row[6],
-            publication_reference = row[54],
-            effective_temperature = row[56],
-            effective_temperature_err1 = row[57],
-            effective_temperature_err2 = row[58],
-            effective_temperature_limit = row[59],
-            radius = row[60],
-            radius_err1 = row[61],
-            radius_err2 = row[62],
-            radius_limit = row[63],
-            mass = row[64],
-            mass_err1 = row[65],
-            mass_err2 = row[66],
-            mass_limit = row[67],
-            measurement = row[68],
-            measurement_err1 = row[69],
-            measurement_err2 = row[70],
-            measurement_limit = row[71],
-            metallicity_ratio = row[72],
-            surface_gravity = row[73],
-            surface_gravity_err1 = row[74],
-            surface_gravity_err2 = row[75],
-            surface_gravity_limit = row[76],
-            planetary_system = planetary_system,
-            spectral_type = spectral_type
-        )
+        if version is not None:
+            record_rows(version, rows_read, rejects)
+    return changes
 
-        discovery_method, created = DiscoveryMethod.objects.get_or_create(
-            name=row[10]
-        )
 
-        discovery_facility, created = DiscoveryFacility.objects.get_or_create(
-            name=row[12]
-        )
+def load_rows(rows, mode, engine, batch_size, version=None):
+    """Load the rows of the reader in the mode, return the summary changes of a delta load"""
+    if mode == 'delta':
+        return sync(rows, batch_size, version)
 
-        solution_type, created = SolutionType.objects.get_or_create(
-            name=row[13]
-        )
+    if mode == 'swap':
+        shadow_load = ShadowLoad(batch_size=batch_size, version=version)
+        counts = shadow_load.load(rows)
+        for model_name, count in counts.items():
+            print('%s: %d rows inserted' % (model_name, count))
+        return
 
-        planet = Planet(
-            name = row[0],
-            planet_letter = row[2],
-            explicit = row[7],
-            discovery_year = row[11],
-            controversial_flag = row[14],
-            publication_reference = row[15],
-            orbital_period = row[16],
-            orbital_period_err1 = row[17],
-            orbital_period_err2 = row[18],
-            orbital_period_limit = row[19],
-            orbit_semi_major_axis = row[20],
-            orbit_semi_major_axis_err1 = row[21],
-            orbit_semi_major_axis_err2 = row[22],
-            orbit_semi_major_axis_limit = row[23],
-            earth_radius = row[24],
-            earth_radius_err1 = row[25],
-            earth_radius_err2 = row[26],
-            earth_radius_limit = row[27],
-            jupiter_radius = row[28],
-            jupiter_radius_err1 = row[29],
-            jupiter_radius_err2 = row[30],
-            jupiter_radius_limit = row[31],
-            earth_mass = row[32],
-            earth_mass_err1 = row[33],
-            earth_mass_err2 = row[34],
-            earth_mass_limit = row[35],
-            jupiter_mass = row[36],
-            jupiter_mass_err1 = row[37],
-            jupiter_mass_err2 = row[38],
-            jupiter_mass_limit = row[39],
-            mass_provenance = row[40],
-            eccentricity = row[41],
-            eccentricity_err1 = row[42],
-            eccentricity_err2 = row[43],
-            eccentricity_limit = row[44],
-            insolation_flux = row[45],
-            insolation_flux_err1 = row[46],
-            insolation_flux_err2 = row[47],
-            insolation_flux_limit = row[48],
-            equilibrium_temperature = row[49],
-            equilibrium_temperature_err1 = row[50],
-            equilibrium_temperature_err2 = row[51],
-            equilibrium_temperature_limit = row[52],
-            transit_timing_variations = row[53],
-            date_last_update = row[94],
-            reference_date_publication = row[95],
-            release_date = row[96],
-            planetary_system = planetary_system,
-            discovery_method = discovery_method,
-            discovery_facility = discovery_facility,
-            solution_type = solution_type
-        )
+    if engine == 'bulk' and version is not None:
+        # Batches committed with a checkpoint, the loader empties the tables
+        loader = CheckpointedLoader(version, batch_size=batch_size)
+    else:
+        # Delete all data from tables to insert them again
+        clear_tables()
+        if engine == 'infile':
+            loader = infile_loader(batch_size=batch_size, version=version)
+        elif engine == 'bulk':
+            loader = BulkLoader(batch_size=batch_size, version=version)
+        else:
+            loader = None
+
+    if loader is None:
+        dimensions = dimension_caches()
+        load_row_by_row(rows, dimensions, version)
+    else:
+        counts = loader.load(rows)
+        dimensions = loader.dimensions
+        for model_name, count in counts.items():
+            print('%s: %d rows inserted' % (model_name, count))
 
-        planet.save()
\ No newline at end of file
+    for cache in dimensions.values():
+        print(cache.stats())